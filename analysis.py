@@ -0,0 +1,164 @@
+"""Batch analysis of FEN positions without a GUI.
+
+Reads one FEN per line from files or stdin and writes one result line per
+input line, so arbitrarily large inputs are processed in constant memory.
+
+Usage:
+    python chess_game.py analyze [FILE ...] [--mode count|status|perft|all] [--depth N] [--jobs N]
+    python analysis.py positions.fen --mode status --echo
+"""
+
+import argparse
+import io
+import itertools
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+from evaluation import evaluate
+from perft import perft
+from position import Position
+
+MODES = ("count", "status", "eval", "perft", "all")
+
+
+def analyze(position, mode="count", depth=1):
+    """Return the list of output fields for one position.
+    
+    count is the number of legal moves, status is "checkmate", "stalemate",
+    "fifty-move", "check" or "-", eval is the static evaluation in
+    centipawns for the side to move, and perft is the leaf count at the
+    given depth.  The count and status share a single move generation.
+    """
+    fields = []
+    if mode in ("count", "status", "all"):
+        moves = position.generate_legal_moves(position.turn)
+        if mode in ("count", "all"):
+            fields.append(str(len(moves)))
+        if mode in ("status", "all"):
+            in_check = position.is_in_check(position.turn)
+            if moves:
+                fields.append(position.draw_status() or ("check" if in_check else "-"))
+            else:
+                fields.append("checkmate" if in_check else "stalemate")
+    if mode in ("eval", "all"):
+        fields.append(str(evaluate(position)))
+    if mode in ("perft", "all"):
+        fields.append(str(perft(position, depth)))
+    return fields
+
+
+def analyze_lines(lines, out, mode="count", depth=1, echo=False):
+    """Analyze each FEN in lines and write a result line to out.
+    
+    Blank lines and lines starting with "#" are skipped.  A line that is
+    not valid FEN produces an "error: ..." result and processing carries on.
+    Returns (positions, errors).
+    """
+    positions = 0
+    errors = 0
+    write = out.write
+    for line in lines:
+        fen = line.strip()
+        if not fen or fen.startswith("#"):
+            continue
+        positions += 1
+        try:
+            result = "\t".join(analyze(Position.from_fen(fen), mode, depth))
+        except ValueError as error:
+            errors += 1
+            result = f"error: {error}"
+        write(f"{fen}\t{result}\n" if echo else result + "\n")
+    return positions, errors
+
+
+def _analyze_chunk(lines, mode, depth, echo):
+    """Process pool task: analyze a chunk of lines and return (text, positions, errors)."""
+    out = io.StringIO()
+    positions, errors = analyze_lines(lines, out, mode, depth, echo)
+    return out.getvalue(), positions, errors
+
+
+def parallel_analyze_lines(lines, out, mode="count", depth=1, echo=False, jobs=None,
+                           chunk_size=2000):
+    """analyze_lines() with chunks of lines handed out to a pool of processes.
+    
+    Results are written in input order.  At most two chunks per process are
+    in flight at once, so memory stays bounded however long the input is.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1:
+        return analyze_lines(lines, out, mode, depth, echo)
+    positions = 0
+    errors = 0
+    lines = iter(lines)
+    pending = deque()
+    with ProcessPoolExecutor(jobs) as pool:
+        while True:
+            while len(pending) < 2 * jobs:
+                chunk = list(itertools.islice(lines, chunk_size))
+                if not chunk:
+                    break
+                pending.append(pool.submit(_analyze_chunk, chunk, mode, depth, echo))
+            if not pending:
+                break
+            text, chunk_positions, chunk_errors = pending.popleft().result()
+            out.write(text)
+            positions += chunk_positions
+            errors += chunk_errors
+    return positions, errors
+
+
+def _input_lines(paths):
+    """Yield lines from each path in turn ("-" or no paths means stdin)."""
+    if not paths:
+        paths = ["-"]
+    for path in paths:
+        if path == "-":
+            yield from sys.stdin
+        else:
+            with open(path) as handle:
+                yield from handle
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Analyze FEN positions, one per line.")
+    parser.add_argument("files", nargs="*", help="FEN files to read (default: stdin)")
+    parser.add_argument("--mode", choices=MODES, default="count",
+                        help="what to report per position (default: count)")
+    parser.add_argument("--depth", type=int, default=1, help="perft depth (default: 1)")
+    parser.add_argument("--echo", action="store_true", help="prefix each result with its FEN")
+    parser.add_argument("--output", help="write results to this file instead of stdout")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="analyze in this many processes (0: one per core)")
+    parser.add_argument("--chunk-size", type=int, default=2000,
+                        help="lines handed to a process at a time (default: 2000)")
+    parser.add_argument("--quiet", action="store_true", help="don't print the summary to stderr")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args(argv)
+    instrumentation.enable_from_environment(args.profile, args.pstats)
+    
+    out = open(args.output, "w") if args.output else sys.stdout
+    start = time.perf_counter()
+    try:
+        positions, errors = parallel_analyze_lines(
+            _input_lines(args.files), out, args.mode, args.depth, args.echo,
+            args.jobs, args.chunk_size
+        )
+    finally:
+        if args.output:
+            out.close()
+    seconds = time.perf_counter() - start
+    if not args.quiet:
+        rate = f"{positions / seconds:,.0f} positions/s" if seconds > 0 else "- positions/s"
+        print(f"{positions:,} positions, {errors:,} errors in {seconds:.3f}s ({rate})",
+              file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,306 @@
+"""Benchmarks for the headless engine.
+
+Usage:
+    python bench.py scaling [--depth N] [--positions N] [--max-jobs N]
+    python bench.py tablebase [MATERIAL ...] [--jobs N] [--probes N] [--dir DIR]
+    python bench.py startup [--runs N]
+    python bench.py legality [--positions N] [--seed N]
+    python bench.py bitboard [--positions N] [--seed N]
+"""
+
+import argparse
+import io
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import bitboard
+import legality
+from analysis import parallel_analyze_lines
+from perft import SUITE, format_rate, parallel_perft
+from position import BISHOP, BLACK, KING, KNIGHT, PAWN, QUEEN, ROOK, WHITE, Position
+from tablebase import Tablebases, generate, table_pieces
+
+
+def random_fens(count, seed=0, max_plies=80):
+    """Return count FENs reached by random legal play from the start position."""
+    rng = random.Random(seed)
+    fens = []
+    for _ in range(count):
+        position = Position.initial()
+        for _ in range(rng.randrange(max_plies)):
+            moves = position.generate_legal_moves(position.turn)
+            if not moves:
+                break
+            position.make_move(rng.choice(moves))
+        fens.append(position.to_fen())
+    return fens
+
+
+def job_counts(max_jobs):
+    """Return the process counts to benchmark: powers of two up to max_jobs, and max_jobs."""
+    counts = []
+    jobs = 1
+    while jobs < max_jobs:
+        counts.append(jobs)
+        jobs *= 2
+    counts.append(max_jobs)
+    return counts
+
+
+def scaling(args, out=sys.stdout):
+    """Time parallel perft and batch analysis on the same inputs for each process count."""
+    max_jobs = args.max_jobs or os.cpu_count() or 1
+    fen = SUITE[0][1]
+    fens = random_fens(args.positions)
+    print(f"{os.cpu_count()} cores; perft depth {args.depth}, "
+          f"{len(fens):,} positions analyzed at perft depth 1", file=out)
+    
+    baseline = {}
+    for jobs in job_counts(max_jobs):
+        start = time.perf_counter()
+        nodes = parallel_perft(Position.from_fen(fen), args.depth, jobs)
+        perft_seconds = time.perf_counter() - start
+        
+        start = time.perf_counter()
+        parallel_analyze_lines(fens, io.StringIO(), "all", 1, jobs=jobs, chunk_size=args.chunk_size)
+        batch_seconds = time.perf_counter() - start
+        
+        baseline.setdefault("perft", perft_seconds)
+        baseline.setdefault("batch", batch_seconds)
+        print(
+            f"jobs {jobs:>3}  perft {perft_seconds:7.3f}s {format_rate(nodes, perft_seconds):>14} "
+            f"x{baseline['perft'] / perft_seconds:4.2f}  "
+            f"batch {batch_seconds:7.3f}s {len(fens) / batch_seconds:>10,.0f} pos/s "
+            f"x{baseline['batch'] / batch_seconds:4.2f}",
+            file=out
+        )
+    return 0
+
+
+def random_endgames(name, count, seed=0):
+    """Return count legal positions with the material of a tablebase, either side to move."""
+    rng = random.Random(seed)
+    pieces = table_pieces(name)
+    positions = []
+    while len(positions) < count:
+        squares = bytearray(64)
+        for piece, sq in zip(pieces, rng.sample(range(64), len(pieces))):
+            if piece & 7 == PAWN and sq // 8 in (0, 7):
+                break
+            squares[sq] = piece
+        else:
+            turn = rng.choice((WHITE, BLACK))
+            position = Position(squares, turn)
+            if not position.is_in_check(turn ^ BLACK):
+                positions.append(position)
+    return positions
+
+
+def tablebase(args, out=sys.stdout):
+    """Time generating tables and probing positions against them."""
+    with tempfile.TemporaryDirectory() as scratch:
+        directory = args.dir or scratch
+        jobs = args.jobs or os.cpu_count() or 1
+        print(f"{os.cpu_count()} cores, generating with {jobs} processes", file=out)
+        for name in args.material:
+            start = time.perf_counter()
+            generate(name, directory, jobs)
+            print(f"{name:<6} generated in {time.perf_counter() - start:7.2f}s", file=out)
+        
+        tablebases = Tablebases(directory)
+        for name in args.material:
+            positions = random_endgames(name, args.probes)
+            tablebases.probe(positions[0])  # Load the table outside the timing
+            timings = []
+            for position in positions:
+                start = time.perf_counter()
+                tablebases.probe(position)
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            print(f"{name:<6} probe mean {sum(timings) / len(timings) * 1e6:6.2f} us  "
+                  f"p50 {timings[len(timings) // 2] * 1e6:6.2f} us  "
+                  f"p99 {timings[len(timings) * 99 // 100] * 1e6:6.2f} us", file=out)
+    return 0
+
+
+# Run in a fresh interpreter so nothing is imported or cached beforehand
+STARTUP_SCRIPT = """
+import sys, time
+start = time.perf_counter()
+import chess_game
+imported = time.perf_counter()
+game = chess_game.ChessGame()
+built = time.perf_counter()
+game.get_legal_moves(6, 4)
+moved = time.perf_counter()
+print(imported - start, built - imported, moved - built,
+      int("tkinter" in sys.modules), int("numpy" in sys.modules))
+"""
+
+
+def startup(args, out=sys.stdout):
+    """Time importing chess_game, building a headless game and its first legal-move list."""
+    directory = os.path.dirname(os.path.abspath(__file__))
+    runs = []
+    for _ in range(args.runs):
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", STARTUP_SCRIPT], cwd=directory, capture_output=True, text=True, check=True
+        ).stdout.split()
+        runs.append([float(field) for field in output[:3]] + [time.perf_counter() - start])
+        tkinter, numpy = output[3] == "1", output[4] == "1"
+    print(f"median of {args.runs} runs; tkinter imported: {'yes' if tkinter else 'no'}, "
+          f"numpy imported: {'yes' if numpy else 'no'}", file=out)
+    for column, label in enumerate(("import chess_game", "headless ChessGame()", "first legal moves",
+                                    "whole process")):
+        timings = sorted(run[column] for run in runs)
+        print(f"{label:<22} {timings[len(timings) // 2] * 1e3:8.2f} ms", file=out)
+    return 0
+
+
+def random_boards(count, seed=0):
+    """Return count positions, without castling or en passant, rich in checks and mates.
+    
+    A third come from random play, a third are the final positions of
+    random games played to the end and a third are kings plus a few random
+    pieces scattered over the board.
+    """
+    rng = random.Random(seed)
+    positions = [Position.from_fen(fen) for fen in random_fens(count // 3, seed)]
+    while len(positions) < 2 * count // 3:
+        position = Position.initial()
+        for _ in range(300):
+            moves = position.generate_legal_moves(position.turn)
+            if not moves:
+                break
+            position.make_move(rng.choice(moves))
+        positions.append(position)
+    while len(positions) < count:
+        squares = bytearray(64)
+        extra = [rng.choice((PAWN, KNIGHT, BISHOP, ROOK, QUEEN)) | rng.choice((WHITE, BLACK))
+                 for _ in range(rng.randrange(1, 7))]
+        for piece, sq in zip([KING | WHITE, KING | BLACK] + extra, rng.sample(range(64), len(extra) + 2)):
+            if piece & 7 != PAWN or 0 < sq // 8 < 7:
+                squares[sq] = piece
+        turn = rng.choice((WHITE, BLACK))
+        position = Position(squares, turn)
+        if not position.is_in_check(turn ^ BLACK):
+            positions.append(position)
+    return [Position(position.squares, position.turn) for position in positions]
+
+
+def legality_check(args, out=sys.stdout):
+    """Cross-check batch check/mate detection against the scalar rules and time both."""
+    positions = random_boards(args.positions, args.seed)
+    start = time.perf_counter()
+    expected = [legality.status_code(position) for position in positions]
+    scalar_seconds = time.perf_counter() - start
+    counts = [expected.count(code) for code in range(len(legality.STATUS_NAMES))]
+    print(f"{len(positions):,} positions: " + ", ".join(
+        f"{count:,} {name or 'other'}" for name, count in zip(legality.STATUS_NAMES, counts)
+    ), file=out)
+    print(f"scalar  {scalar_seconds:7.3f}s {len(positions) / scalar_seconds:>12,.0f} positions/s", file=out)
+    try:
+        boards, turns = legality.boards_and_turns(positions)
+    except ImportError:
+        print("NumPy is not installed; the batch version was not run", file=out)
+        return 0
+    start = time.perf_counter()
+    codes = legality.classify_boards(boards, turns)
+    batch_seconds = time.perf_counter() - start
+    mismatches = [index for index, code in enumerate(codes) if code != expected[index]]
+    print(f"NumPy   {batch_seconds:7.3f}s {len(positions) / batch_seconds:>12,.0f} positions/s "
+          f"x{scalar_seconds / batch_seconds:.1f}", file=out)
+    for index in mismatches[:10]:
+        print(f"mismatch: {positions[index].to_fen()} batch {legality.STATUS_NAMES[codes[index]]}, "
+              f"scalar {legality.STATUS_NAMES[expected[index]]}", file=out)
+    print(f"{len(mismatches)} mismatches", file=out)
+    return 1 if mismatches else 0
+
+
+def bitboard_check(args, out=sys.stdout):
+    """Cross-check the bitboard generator against the mailbox one and time both."""
+    positions = [Position.from_fen(fen) for _, fen, _ in SUITE]
+    positions += [Position.from_fen(fen) for fen in random_fens(args.positions // 2, args.seed)]
+    positions += random_boards(args.positions - len(positions), args.seed)
+    occupied = [(position, [(sq, piece) for sq, piece in enumerate(position.squares) if piece])
+                for position in positions]
+    
+    start = time.perf_counter()
+    mailbox_moves = 0
+    for position, pieces in occupied:
+        for sq, _ in pieces:
+            mailbox_moves += len(position.get_possible_moves(*divmod(sq, 8)))
+    mailbox_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    bitboard_moves = 0
+    for position, pieces in occupied:
+        boards = bitboard.Bitboards(position)
+        for sq, piece in pieces:
+            bitboard_moves += bitboard.popcount(boards.moves_from(sq, piece))
+    bitboard_seconds = time.perf_counter() - start
+    print(f"{len(positions):,} positions, {mailbox_moves:,} pseudo-legal moves", file=out)
+    print(f"mailbox   {mailbox_seconds:7.3f}s {len(positions) / mailbox_seconds:>12,.0f} positions/s", file=out)
+    print(f"bitboard  {bitboard_seconds:7.3f}s {len(positions) / bitboard_seconds:>12,.0f} positions/s "
+          f"x{mailbox_seconds / bitboard_seconds:.1f}", file=out)
+    
+    failures = 0
+    for position in positions:
+        boards = bitboard.Bitboards(position)
+        squares = list(bitboard.mismatches(position))
+        checks = [boards.in_check(color) for color in (WHITE, BLACK)]
+        if squares or checks != [position.is_in_check(color) for color in (WHITE, BLACK)]:
+            failures += 1
+            if failures <= 10:
+                print(f"mismatch: {position.to_fen()} squares {squares} in check {checks}", file=out)
+    if bitboard_moves != mailbox_moves:
+        print(f"move totals differ: bitboard {bitboard_moves:,}", file=out)
+    print(f"{failures} mismatches", file=out)
+    return 1 if failures or bitboard_moves != mailbox_moves else 0
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Benchmark the chess engine.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    
+    command = commands.add_parser("scaling", help="speedup of parallel perft and analysis by core count")
+    command.add_argument("--depth", type=int, default=4, help="perft depth (default: 4)")
+    command.add_argument("--positions", type=int, default=20000,
+                         help="positions in the analysis batch (default: 20000)")
+    command.add_argument("--chunk-size", type=int, default=1000, help="analysis chunk size")
+    command.add_argument("--max-jobs", type=int, help="most processes to try (default: cores)")
+    command.set_defaults(run=scaling)
+    
+    command = commands.add_parser("tablebase", help="endgame table generation time and probe latency")
+    command.add_argument("material", nargs="*", default=["KQK", "KRK", "KPK"],
+                         help="material sets to build (default: KQK KRK KPK)")
+    command.add_argument("--jobs", type=int, help="generation processes (default: cores)")
+    command.add_argument("--probes", type=int, default=100000, help="positions to probe (default: 100000)")
+    command.add_argument("--dir", help="keep the tables here (default: a temporary directory)")
+    command.set_defaults(run=tablebase)
+    
+    command = commands.add_parser("startup", help="import and first-move time of a headless game")
+    command.add_argument("--runs", type=int, default=11, help="fresh interpreters to time (default: 11)")
+    command.set_defaults(run=startup)
+    
+    command = commands.add_parser("legality", help="cross-check and time batch check/mate detection")
+    command.add_argument("--positions", type=int, default=30000, help="positions to classify (default: 30000)")
+    command.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    command.set_defaults(run=legality_check)
+    
+    command = commands.add_parser("bitboard", help="cross-check and time the bitboard move generator")
+    command.add_argument("--positions", type=int, default=20000, help="positions to compare (default: 20000)")
+    command.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    command.set_defaults(run=bitboard_check)
+    
+    args = parser.parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,262 @@
+"""Bitboard move generator, kept as an independent check on position.py.
+
+Each set of squares is a 64-bit int with bit ``row * 8 + col`` standing for
+that square, the same indexing ``position.py`` uses.  Knight, king and pawn
+attacks come from precomputed tables and sliding pieces use classical ray
+tables: the ray from a square is cut at the first blocker by XOR-ing away
+the blocker's own ray in the same direction.
+
+In pure Python this is no faster than the mailbox generator: building
+Bitboards for a position costs about what the masks save.  The engine
+therefore does not use it; "python bench.py bitboard" compares the two.
+"""
+
+from position import (
+    BISHOP, BISHOP_DIRECTIONS, BLACK, KING, KING_TARGETS, KNIGHT, KNIGHT_TARGETS,
+    PAWN, PAWN_ATTACKS, QUEEN, ROOK, ROOK_DIRECTIONS, WHITE
+)
+
+FULL = (1 << 64) - 1
+RANK_MASKS = tuple(0xFF << (8 * row) for row in range(8))
+
+
+def _mask(squares):
+    """Build a bitboard from an iterable of square indexes."""
+    mask = 0
+    for sq in squares:
+        mask |= 1 << sq
+    return mask
+
+
+KNIGHT_ATTACKS = tuple(_mask(KNIGHT_TARGETS[sq]) for sq in range(64))
+KING_ATTACKS = tuple(_mask(KING_TARGETS[sq]) for sq in range(64))
+# PAWN_ATTACK_MASKS[color >> 3][sq]
+PAWN_ATTACK_MASKS = tuple(
+    tuple(_mask(table[sq]) for sq in range(64)) for table in PAWN_ATTACKS
+)
+
+# Ray tables split by whether the direction walks towards higher square
+# indexes (the first blocker is then the lowest set bit) or lower ones
+# (the first blocker is the highest set bit).
+_ROOK_POSITIVE = ((0, 1), (1, 0))
+_ROOK_NEGATIVE = ((0, -1), (-1, 0))
+_BISHOP_POSITIVE = ((1, 1), (1, -1))
+_BISHOP_NEGATIVE = ((-1, 1), (-1, -1))
+
+
+def _ray_mask(sq, dr, dc):
+    """Bitboard of the squares from sq (exclusive) to the edge in one direction."""
+    row, col = divmod(sq, 8)
+    mask = 0
+    r, c = row + dr, col + dc
+    while 0 <= r < 8 and 0 <= c < 8:
+        mask |= 1 << (r * 8 + c)
+        r += dr
+        c += dc
+    return mask
+
+
+def _ray_table(directions):
+    """RAYS[direction][sq] bitboards for each of the given directions."""
+    return tuple(
+        tuple(_ray_mask(sq, dr, dc) for sq in range(64)) for dr, dc in directions
+    )
+
+
+ROOK_POSITIVE_RAYS = _ray_table(_ROOK_POSITIVE)
+ROOK_NEGATIVE_RAYS = _ray_table(_ROOK_NEGATIVE)
+BISHOP_POSITIVE_RAYS = _ray_table(_BISHOP_POSITIVE)
+BISHOP_NEGATIVE_RAYS = _ray_table(_BISHOP_NEGATIVE)
+
+assert set(_ROOK_POSITIVE + _ROOK_NEGATIVE) == set(ROOK_DIRECTIONS)
+assert set(_BISHOP_POSITIVE + _BISHOP_NEGATIVE) == set(BISHOP_DIRECTIONS)
+
+
+def _slide(sq, occupied, positive_rays, negative_rays):
+    """Attacks along the given rays from sq, stopping at the first blocker."""
+    attacks = 0
+    for rays in positive_rays:
+        ray = rays[sq]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[(blockers & -blockers).bit_length() - 1]
+        attacks |= ray
+    for rays in negative_rays:
+        ray = rays[sq]
+        blockers = ray & occupied
+        if blockers:
+            ray ^= rays[blockers.bit_length() - 1]
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(sq, occupied):
+    """Squares a rook on sq attacks given the occupied squares."""
+    return _slide(sq, occupied, ROOK_POSITIVE_RAYS, ROOK_NEGATIVE_RAYS)
+
+
+def bishop_attacks(sq, occupied):
+    """Squares a bishop on sq attacks given the occupied squares."""
+    return _slide(sq, occupied, BISHOP_POSITIVE_RAYS, BISHOP_NEGATIVE_RAYS)
+
+
+def queen_attacks(sq, occupied):
+    """Squares a queen on sq attacks given the occupied squares."""
+    return rook_attacks(sq, occupied) | bishop_attacks(sq, occupied)
+
+
+def iter_squares(mask):
+    """Yield the square indexes of the set bits in mask, lowest first."""
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def popcount(mask):
+    """Number of set bits in mask."""
+    return bin(mask).count("1")
+
+
+def to_coords(mask):
+    """Convert a bitboard to a list of (row, col) pairs in square order."""
+    return [divmod(sq, 8) for sq in iter_squares(mask)]
+
+
+class Bitboards:
+    """Per-colour, per-type piece masks built from a Position."""
+    
+    __slots__ = ("pieces", "occupancy", "occupied", "turn", "ep_mask")
+    
+    def __init__(self, position):
+        # pieces[color >> 3][kind] and occupancy[color >> 3]
+        self.pieces = [[0] * 7, [0] * 7]
+        self.occupancy = [0, 0]
+        # Only the side to move may capture en passant, and only if the
+        # enemy pawn that made the double step is there to be taken
+        self.turn = position.turn
+        self.ep_mask = 0
+        ep = position.ep
+        if ep is not None:
+            victim_sq = ep + 8 if position.turn == WHITE else ep - 8
+            if 0 <= victim_sq < 64 and position.squares[victim_sq] == PAWN | (position.turn ^ BLACK):
+                self.ep_mask = 1 << ep
+        for sq, piece in enumerate(position.squares):
+            if piece:
+                bit = 1 << sq
+                self.pieces[piece >> 3][piece & 7] |= bit
+                self.occupancy[piece >> 3] |= bit
+        self.occupied = self.occupancy[0] | self.occupancy[1]
+    
+    def attacks_from(self, sq, piece):
+        """Squares attacked by the given piece standing on sq."""
+        kind = piece & 7
+        if kind == PAWN:
+            return PAWN_ATTACK_MASKS[piece >> 3][sq]
+        if kind == KNIGHT:
+            return KNIGHT_ATTACKS[sq]
+        if kind == KING:
+            return KING_ATTACKS[sq]
+        if kind == BISHOP:
+            return bishop_attacks(sq, self.occupied)
+        if kind == ROOK:
+            return rook_attacks(sq, self.occupied)
+        return queen_attacks(sq, self.occupied)
+    
+    def moves_from(self, sq, piece):
+        """Pseudo-legal target squares for the given piece standing on sq."""
+        color = piece & 8
+        own = self.occupancy[color >> 3]
+        if piece & 7 != PAWN:
+            return self.attacks_from(sq, piece) & ~own
+        enemy = self.occupancy[(color ^ BLACK) >> 3]
+        if color == self.turn:
+            enemy |= self.ep_mask
+        targets = PAWN_ATTACK_MASKS[color >> 3][sq] & enemy
+        empty = ~self.occupied & FULL
+        if color == WHITE:
+            single = (1 << sq >> 8) & empty
+            double = (single >> 8) & empty & RANK_MASKS[4]
+        else:
+            single = (1 << sq << 8) & empty
+            double = (single << 8) & empty & RANK_MASKS[3]
+        return targets | single | double
+    
+    def attacked_by(self, color):
+        """All squares attacked by the given colour."""
+        pieces = self.pieces[color >> 3]
+        occupied = self.occupied
+        attacks = 0
+        pawn_table = PAWN_ATTACK_MASKS[color >> 3]
+        for sq in iter_squares(pieces[PAWN]):
+            attacks |= pawn_table[sq]
+        for sq in iter_squares(pieces[KNIGHT]):
+            attacks |= KNIGHT_ATTACKS[sq]
+        for sq in iter_squares(pieces[KING]):
+            attacks |= KING_ATTACKS[sq]
+        for sq in iter_squares(pieces[BISHOP] | pieces[QUEEN]):
+            attacks |= bishop_attacks(sq, occupied)
+        for sq in iter_squares(pieces[ROOK] | pieces[QUEEN]):
+            attacks |= rook_attacks(sq, occupied)
+        return attacks
+    
+    def is_attacked(self, sq, color):
+        """Check whether sq is attacked by any piece of the given colour."""
+        pieces = self.pieces[color >> 3]
+        if PAWN_ATTACK_MASKS[(color ^ BLACK) >> 3][sq] & pieces[PAWN]:
+            return True
+        if KNIGHT_ATTACKS[sq] & pieces[KNIGHT] or KING_ATTACKS[sq] & pieces[KING]:
+            return True
+        if bishop_attacks(sq, self.occupied) & (pieces[BISHOP] | pieces[QUEEN]):
+            return True
+        return bool(rook_attacks(sq, self.occupied) & (pieces[ROOK] | pieces[QUEEN]))
+    
+    def in_check(self, color):
+        """Check whether the given colour's king is attacked."""
+        king = self.pieces[color >> 3][KING]
+        if not king:
+            return False
+        return self.is_attacked(king.bit_length() - 1, color ^ BLACK)
+    
+    def count_moves(self, color):
+        """Number of pseudo-legal moves for the given colour (promotions count once)."""
+        total = 0
+        for kind in range(PAWN, KING + 1):
+            piece = kind | color
+            for sq in iter_squares(self.pieces[color >> 3][kind]):
+                total += popcount(self.moves_from(sq, piece))
+        return total
+
+
+def get_possible_moves(position, row, col):
+    """Bitboard counterpart of Position.get_possible_moves."""
+    sq = row * 8 + col
+    piece = position.squares[sq]
+    if not piece:
+        return []
+    return to_coords(Bitboards(position).moves_from(sq, piece))
+
+
+def get_attack_squares(position, row, col):
+    """Bitboard counterpart of Position.get_attack_squares."""
+    sq = row * 8 + col
+    piece = position.squares[sq]
+    if not piece:
+        return []
+    return to_coords(Bitboards(position).attacks_from(sq, piece))
+
+
+def mismatches(position):
+    """Yield (row, col) squares where the bitboard and mailbox generators disagree.
+    
+    Results are compared as sets because the two generators list squares in
+    different orders.
+    """
+    boards = Bitboards(position)
+    for sq, piece in enumerate(position.squares):
+        if not piece:
+            continue
+        row, col = divmod(sq, 8)
+        if (set(to_coords(boards.moves_from(sq, piece))) != set(position.get_possible_moves(row, col))
+                or set(to_coords(boards.attacks_from(sq, piece))) != set(position.get_attack_squares(row, col))):
+            yield row, col
@@ -0,0 +1,197 @@
+"""Opening book: weighted moves per position, stored in a sorted binary file.
+
+A book file is a small header followed by fixed-size records of (position
+key, move, weight), sorted by key and then move.  Lookups binary-search the
+records through a memory map, so opening a book costs nothing however big
+it is and only the pages a lookup touches are ever read.
+
+Usage:
+    python book.py build BOOK GAMES.pgn [...] [--max-ply N] [--min-games N]
+    python book.py probe BOOK [--fen FEN]
+"""
+
+import argparse
+import mmap
+import os
+import random
+import struct
+import sys
+import time
+
+from pgn import read_games, san
+from position import BLACK, STARTING_FEN, WHITE, Position, move_name
+
+MAGIC = b"CHBK"
+VERSION = 1
+# magic, format version, reserved
+FILE_HEADER = struct.Struct("<4sHH")
+# position key, encoded move, weight
+RECORD = struct.Struct("<QHH")
+KEY = struct.Struct("<Q")
+MAX_WEIGHT = 0xFFFF
+
+
+class OpeningBook:
+    """Read-only view of a book file."""
+    
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        if os.fstat(self.file.fileno()).st_size < FILE_HEADER.size:
+            self.file.close()
+            raise ValueError(f"{path} is not an opening book")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, _ = FILE_HEADER.unpack_from(self.data)
+        if magic != MAGIC or version != VERSION:
+            self.close()
+            raise ValueError(f"{path} is not a version {VERSION} opening book")
+        self.count = (len(self.data) - FILE_HEADER.size) // RECORD.size
+        self.lookups = 0
+        self.hits = 0
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def __len__(self):
+        return self.count
+    
+    def close(self):
+        """Unmap and close the book file."""
+        self.data.close()
+        self.file.close()
+    
+    def _first_record(self, key):
+        """Index of the first record whose key is not less than key."""
+        data = self.data
+        low = 0
+        high = self.count
+        while low < high:
+            middle = (low + high) >> 1
+            if KEY.unpack_from(data, FILE_HEADER.size + middle * RECORD.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+    
+    def entries(self, position):
+        """Return the book's (move, weight) pairs for position, best first.
+        
+        Moves that are not legal in position (left by a key collision) are
+        dropped.
+        """
+        self.lookups += 1
+        key = position.key
+        data = self.data
+        entries = []
+        index = self._first_record(key)
+        while index < self.count:
+            found, move, weight = RECORD.unpack_from(data, FILE_HEADER.size + index * RECORD.size)
+            if found != key:
+                break
+            entries.append((move, weight))
+            index += 1
+        if entries:
+            legal = set(position.generate_legal_moves(position.turn))
+            entries = [entry for entry in entries if entry[0] in legal]
+            entries.sort(key=lambda entry: entry[1], reverse=True)
+            self.hits += bool(entries)
+        return entries
+    
+    def choose(self, position, rng=random):
+        """Pick a book move for position at random in proportion to its weight, or None."""
+        entries = self.entries(position)
+        total = sum(weight for _, weight in entries)
+        if not total:
+            return None
+        pick = rng.randrange(total)
+        for move, weight in entries:
+            pick -= weight
+            if pick < 0:
+                return move
+        return None
+    
+    def stats(self):
+        """Return a dict of lookup counters."""
+        return {"entries": self.count, "lookups": self.lookups, "hits": self.hits}
+
+
+def build_book(pgn_paths, book_path, max_ply=24, min_games=1):
+    """Write a book of the moves played in the first max_ply plies of PGN games.
+    
+    A move scores 2 for each game its side went on to win, 1 for a draw or
+    unknown result and 0 for a loss; moves seen in fewer than min_games
+    games are left out.  Returns (games read, records written).
+    """
+    weights = {}
+    counts = {}
+    games = 0
+    for path in pgn_paths:
+        with open(path, encoding="utf-8", errors="replace") as handle:
+            for game in read_games(handle):
+                if "FEN" in game.headers:
+                    continue
+                games += 1
+                winner = {"1-0": WHITE, "0-1": BLACK}.get(game.result)
+                try:
+                    for ply, (position, move) in enumerate(game.replay()):
+                        if ply >= max_ply:
+                            break
+                        entry = (position.key, move)
+                        counts[entry] = counts.get(entry, 0) + 1
+                        if winner is None:
+                            points = 1
+                        else:
+                            points = 2 if position.turn == winner else 0
+                        weights[entry] = weights.get(entry, 0) + points
+                except ValueError:
+                    continue  # Keep the moves before the bad one
+    records = sorted(
+        (key, move, min(weights[key, move], MAX_WEIGHT))
+        for (key, move), count in counts.items()
+        if count >= min_games and weights[key, move]
+    )
+    with open(book_path, "wb") as out:
+        out.write(FILE_HEADER.pack(MAGIC, VERSION, 0))
+        for record in records:
+            out.write(RECORD.pack(*record))
+    return games, len(records)
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Build and query opening books.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    command = commands.add_parser("build", help="build a book from PGN games")
+    command.add_argument("book")
+    command.add_argument("pgn", nargs="+")
+    command.add_argument("--max-ply", type=int, default=24, help="book depth in plies (default: 24)")
+    command.add_argument("--min-games", type=int, default=1,
+                         help="drop moves played in fewer games (default: 1)")
+    command = commands.add_parser("probe", help="list the book moves for a position")
+    command.add_argument("book")
+    command.add_argument("--fen", default=STARTING_FEN, help="position to look up (default: start)")
+    args = parser.parse_args(argv)
+    
+    if args.command == "build":
+        start = time.perf_counter()
+        games, records = build_book(args.pgn, args.book, args.max_ply, args.min_games)
+        print(f"{games:,} games, {records:,} book entries in {time.perf_counter() - start:.3f}s")
+        return 0
+    
+    position = Position.from_fen(args.fen)
+    with OpeningBook(args.book) as book:
+        start = time.perf_counter()
+        entries = book.entries(position)
+        seconds = time.perf_counter() - start
+        total = sum(weight for _, weight in entries)
+        for move, weight in entries:
+            print(f"{san(position, move):<8} {move_name(move):<6} {weight:>6}  {weight / total:6.1%}")
+        print(f"{len(entries)} moves from {len(book):,} entries in {seconds * 1e6:.0f} us")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
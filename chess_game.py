@@ -1,18 +1,64 @@
-import tkinter as tk
-from tkinter import messagebox, simpledialog
+import sys
+import threading
+
+import instrumentation
+from position import (
+    COLOR_CODES, COLOR_NAMES, PIECE_CODES, PIECE_NAMES, Position, decode_move, encode_move
+)
+from book import OpeningBook
+from gamefile import GameWriter
+from pgn import format_game, san
+from search import Searcher
+from transposition import MoveCache
+from worker import BackgroundWorker, InlineWorker
+
+PROMOTION_PIECES = ("queen", "rook", "bishop", "knight")
 
 class ChessGame:
-    def __init__(self, root):
-        """Initialize the chess game with GUI and game logic."""
-        self.root = root
-        self.root.title("Chess Game")
-        self.root.resizable(False, False)
+    def __init__(self, root=None, engine_color=None, engine_time=1.0, archive=None, book=None,
+                 tablebases=None, notify=None, ask_promotion=None):
+        """Initialize the chess game logic, and the GUI if root is given.
+        
+        engine_color ("white" or "black") lets the built-in engine play that
+        side, thinking for up to engine_time seconds per move, or playing
+        from the opening book file at path book while the game is in it and
+        probing the endgame tables in directory tablebases.
+        Games are appended to the binary game archive at path archive, if
+        given, when they end or are reset.
+        
+        With a Tk root the board is drawn in it straight away.  Without one
+        the game is headless: tkinter is not imported and no widget exists
+        until show() is called, and move lists, status checks and engine
+        moves are worked out synchronously.  notify(title, message) is
+        called for check, mate and draw announcements (default: a message
+        box once shown) and ask_promotion() names the piece a pawn promotes
+        to (default: a dialog once shown, otherwise a queen).
+        """
+        self.root = None
+        self.canvas = None
+        self.on_notify = notify
+        self.on_promotion = ask_promotion
         
         # Game state
         self.selected_piece = None
-        self.turn = "white"  # white or black
-        self.board = self.initialize_board()
+        self.selected_moves = None  # Legal targets of the selected piece, once computed
+        self.position = self.initialize_board()
         self.check_status = {"white": False, "black": False}
+        self.move_history = []
+        
+        # Legal moves of the current position, shared by highlighting, move
+        # validation and the check/mate/stalemate status
+        self.move_cache = MoveCache()
+        
+        # Until there is a Tk event loop, jobs run as soon as they are submitted
+        self.worker = InlineWorker()
+        self.engine_color = engine_color
+        self.engine_time = engine_time
+        if tablebases:
+            from tablebase import Tablebases  # Only loaded when asked for: it pulls in multiprocessing
+            tablebases = Tablebases(tablebases)
+        self.searcher = Searcher(book=OpeningBook(book) if book else None, tablebases=tablebases or None)
+        self.archive = archive
         
         # Constants
         self.SQUARE_SIZE = 80
@@ -33,17 +79,50 @@ class ChessGame:
             "black_bishop": "\u265d", "black_queen": "\u265b", "black_king": "\u265a"
         }
         
+        # Canvas items are created once and then reconfigured in place, so the
+        # item count stays the same however long the game runs
+        self.square_items = []      # One rectangle per square
+        self.piece_items = []       # One text item per square, hidden when empty
+        self.drawn_pieces = bytearray(64)  # Piece code each text item currently shows
+        self.move_markers = []      # One possible-move overlay per square
+        self.selection_marker = None
+        self.check_markers = {}     # Check outline per color
+        
+        # Markers currently shown, hidden again by clear_highlights
+        self.highlighted_squares = []
+        
+        if root is not None:
+            self.show(root)
+        else:
+            self.start_engine_if_needed()
+    
+    def show(self, root=None):
+        """Build the board and controls in root (default: a new Tk window) and return root.
+        
+        Does nothing if the game is already shown.
+        """
+        if self.canvas is not None:
+            return self.root
+        import tkinter as tk
+        
+        if root is None:
+            root = tk.Tk()
+        self.root = root
+        self.root.title("Chess Game")
+        self.root.resizable(False, False)
+        
         # GUI Setup
         self.canvas = tk.Canvas(root, width=self.SQUARE_SIZE * self.BOARD_SIZE, 
                               height=self.SQUARE_SIZE * self.BOARD_SIZE)
         self.canvas.pack()
         
-        # Dictionary to keep track of highlighted possible moves
-        self.highlighted_squares = []
-        
         # Draw initial board
         self.draw_board()
         self.draw_pieces()
+        self.create_markers()
+        for color, in_check in self.check_status.items():
+            if in_check:
+                self.highlight_king_in_check(color)
         
         # Bind click events
         self.canvas.bind("<Button-1>", self.handle_click)
@@ -69,41 +148,73 @@ class ChessGame:
         
         self.history_text = tk.Text(self.history_frame, width=30, height=5, font=("Arial", 9))
         self.history_text.pack()
-        self.move_history = []
-        
+        for ply in range(len(self.move_history)):
+            self.history_text.insert(tk.END, self.history_entry(ply))
+        
+        # Move lists, game status and engine searches are computed on a
+        # background worker so the Tk event loop never blocks on them
+        self.worker = BackgroundWorker(root)
+        self.start_engine_if_needed()
+        return root
+    
+    @property
+    def shown(self):
+        """Whether the GUI has been built."""
+        return self.canvas is not None
+    
+    def notify(self, title, message):
+        """Announce check, mate or a draw through the notify callback or a message box."""
+        if self.on_notify is not None:
+            self.on_notify(title, message)
+        elif self.shown:
+            from tkinter import messagebox
+            messagebox.showinfo(title, message)
+    
+    def choose_promotion(self):
+        """Return the piece name a pawn promotes to, asking the callback or the player."""
+        if self.on_promotion is not None:
+            choice = self.on_promotion()
+        elif self.shown:
+            from tkinter import simpledialog
+            choice = simpledialog.askstring(
+                "Pawn Promotion",
+                "Choose promotion piece (queen, rook, bishop, knight):",
+                initialvalue="queen"
+            )
+        else:
+            choice = None
+        if choice is None or choice.lower() not in PROMOTION_PIECES:
+            return "queen"  # Default to queen
+        return choice.lower()
+    
+    def set_status(self, text):
+        """Show text in the status label, if the GUI is shown."""
+        if self.shown:
+            self.status_label.config(text=text)
+    
+    def history_entry(self, ply):
+        """Text of one move for the history box: "N. move " for White, "move\\n" for Black."""
+        if ply % 2 == 0:
+            return f"{ply // 2 + 1}. {self.move_history[ply]} "
+        return f"{self.move_history[ply]}\n"
+    
     def initialize_board(self):
         """Initialize the chess board with pieces in starting positions."""
-        board = [[None for _ in range(8)] for _ in range(8)]
-        
-        # Place pawns
-        for col in range(8):
-            board[1][col] = {"type": "pawn", "color": "black", "has_moved": False}
-            board[6][col] = {"type": "pawn", "color": "white", "has_moved": False}
-            
-        # Place rooks
-        board[0][0] = board[0][7] = {"type": "rook", "color": "black", "has_moved": False}
-        board[7][0] = board[7][7] = {"type": "rook", "color": "white", "has_moved": False}
-        
-        # Place knights
-        board[0][1] = board[0][6] = {"type": "knight", "color": "black"}
-        board[7][1] = board[7][6] = {"type": "knight", "color": "white"}
-        
-        # Place bishops
-        board[0][2] = board[0][5] = {"type": "bishop", "color": "black"}
-        board[7][2] = board[7][5] = {"type": "bishop", "color": "white"}
-        
-        # Place queens
-        board[0][3] = {"type": "queen", "color": "black"}
-        board[7][3] = {"type": "queen", "color": "white"}
-        
-        # Place kings
-        board[0][4] = {"type": "king", "color": "black", "has_moved": False}
-        board[7][4] = {"type": "king", "color": "white", "has_moved": False}
-        
-        return board
-        
+        return Position.initial()
+    
+    @property
+    def turn(self):
+        """Colour to move, "white" or "black"."""
+        return COLOR_NAMES[self.position.turn]
+    
     def draw_board(self):
-        """Draw the chess board with alternating square colors."""
+        """Draw the chess board with alternating square colors.
+        
+        The squares and coordinate labels never change, so they are only
+        created on the first call.
+        """
+        if self.square_items:
+            return
         for row in range(8):
             for col in range(8):
                 # Calculate position
@@ -117,9 +228,11 @@ class ChessGame:
                     color = self.LIGHT_SQUARE_COLOR
                 else:
                     color = self.DARK_SQUARE_COLOR
-                    
+                
                 # Draw the square
-                self.canvas.create_rectangle(x0, y0, x1, y1, fill=color, outline="")
+                self.square_items.append(
+                    self.canvas.create_rectangle(x0, y0, x1, y1, fill=color, outline="")
+                )
                 
                 # Add coordinate labels on the edges of the board
                 if col == 0:  # Add row numbers on the left edge
@@ -141,387 +254,285 @@ class ChessGame:
                     )
     
     def draw_pieces(self):
-        """Draw all pieces on the board with proper icons."""
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece:
+        """Draw all pieces on the board with proper icons.
+        
+        Each square has one text item, created on the first call; after that
+        only squares whose piece changed since the last call are updated.
+        Does nothing while the game is headless.
+        """
+        if not self.shown:
+            return
+        if not self.piece_items:
+            for row in range(8):
+                for col in range(8):
                     x = col * self.SQUARE_SIZE + self.SQUARE_SIZE // 2
                     y = row * self.SQUARE_SIZE + self.SQUARE_SIZE // 2
-                    piece_symbol = self.PIECES[f"{piece['color']}_{piece['type']}"]
                     
                     # Use a standard font size
                     font_size = 40
                     
-                    self.canvas.create_text(
-                        x, y, text=piece_symbol, fill="black", 
-                        font=("Arial", font_size, "bold")
-                    )
-                    
-    def highlight_possible_moves(self, row, col):
+                    self.piece_items.append(self.canvas.create_text(
+                        x, y, text="", fill="black", state="hidden",
+                        font=("Arial", font_size, "bold"), tags=("piece",)
+                    ))
+        
+        squares = self.position.squares
+        drawn = self.drawn_pieces
+        for sq in range(64):
+            piece = squares[sq]
+            if piece == drawn[sq]:
+                continue
+            drawn[sq] = piece
+            if piece:
+                self.canvas.itemconfig(
+                    self.piece_items[sq], text=self.PIECES[self.piece_key(piece)], state="normal"
+                )
+            else:
+                self.canvas.itemconfig(self.piece_items[sq], state="hidden")
+    
+    def create_markers(self):
+        """Create the hidden highlight overlays that are later shown and hidden."""
+        for row in range(8):
+            for col in range(8):
+                x0 = col * self.SQUARE_SIZE
+                y0 = row * self.SQUARE_SIZE
+                self.move_markers.append(self.canvas.create_rectangle(
+                    x0, y0, x0 + self.SQUARE_SIZE, y0 + self.SQUARE_SIZE,
+                    fill=self.POSSIBLE_MOVE_COLOR, stipple="gray50", state="hidden"
+                ))
+        self.selection_marker = self.canvas.create_rectangle(
+            0, 0, self.SQUARE_SIZE, self.SQUARE_SIZE,
+            outline=self.HIGHLIGHT_COLOR, width=3, state="hidden"
+        )
+        for color in ("white", "black"):
+            self.check_markers[color] = self.canvas.create_rectangle(
+                0, 0, self.SQUARE_SIZE, self.SQUARE_SIZE,
+                outline=self.CHECK_COLOR, width=3, state="hidden"
+            )
+    
+    def show_marker(self, item, row=None, col=None):
+        """Show a highlight marker, moving it to (row, col) if given."""
+        if row is not None:
+            x0 = col * self.SQUARE_SIZE
+            y0 = row * self.SQUARE_SIZE
+            self.canvas.coords(item, x0, y0, x0 + self.SQUARE_SIZE, y0 + self.SQUARE_SIZE)
+        self.canvas.itemconfig(item, state="normal")
+        self.highlighted_squares.append(item)
+    
+    def highlight_possible_moves(self, row, col, possible_moves=None):
         """Highlight squares where selected piece can move."""
         # Clear any previous highlights
         self.clear_highlights()
         
-        piece = self.board[row][col]
-        if not piece or piece["color"] != self.turn:
+        piece = self.position.piece_at(row, col)
+        if not piece or self.piece_color(piece) != self.turn:
             return []
         
-        possible_moves = self.get_legal_moves(row, col)
+        if possible_moves is None:
+            possible_moves = self.get_legal_moves(row, col)
+        if not self.shown:
+            return possible_moves
         
         # Highlight the possible moves
         for move_row, move_col in possible_moves:
-            x0 = move_col * self.SQUARE_SIZE
-            y0 = move_row * self.SQUARE_SIZE
-            x1 = x0 + self.SQUARE_SIZE
-            y1 = y0 + self.SQUARE_SIZE
-            
-            # Highlight with a different color
-            highlight = self.canvas.create_rectangle(
-                x0, y0, x1, y1, fill=self.POSSIBLE_MOVE_COLOR, stipple="gray50"
-            )
-            self.highlighted_squares.append(highlight)
+            self.show_marker(self.move_markers[move_row * 8 + move_col])
         
         # Also highlight the selected piece
-        x0 = col * self.SQUARE_SIZE
-        y0 = row * self.SQUARE_SIZE
-        x1 = x0 + self.SQUARE_SIZE
-        y1 = y0 + self.SQUARE_SIZE
-        highlight = self.canvas.create_rectangle(
-            x0, y0, x1, y1, outline=self.HIGHLIGHT_COLOR, width=3
-        )
-        self.highlighted_squares.append(highlight)
-            
-        return possible_moves
+        self.show_marker(self.selection_marker, row, col)
         
+        return possible_moves
+    
     def clear_highlights(self):
         """Clear all highlighted squares."""
         for highlight in self.highlighted_squares:
-            self.canvas.delete(highlight)
+            self.canvas.itemconfig(highlight, state="hidden")
         self.highlighted_squares = []
-        
+    
+    def piece_color(self, piece):
+        """Return "white" or "black" for a piece code."""
+        return COLOR_NAMES[piece & 8]
+    
+    def piece_key(self, piece):
+        """Return the "<color>_<type>" key used by PIECES for a piece code."""
+        return f"{COLOR_NAMES[piece & 8]}_{PIECE_NAMES[piece & 7]}"
+    
     def get_possible_moves(self, row, col):
         """Get all possible moves for a piece at the given position without checking for check."""
-        piece = self.board[row][col]
-        if not piece:
-            return []
-            
-        moves = []
-        piece_type = piece["type"]
-        color = piece["color"]
-        
-        # Pawns
-        if piece_type == "pawn":
-            direction = -1 if color == "white" else 1
-            
-            # Move forward one square
-            if 0 <= row + direction < 8 and not self.board[row + direction][col]:
-                moves.append((row + direction, col))
-                
-                # Can move two squares from starting position if both squares are empty
-                if not piece.get("has_moved", True):  # Check if pawn hasn't moved
-                    if (0 <= row + 2*direction < 8 and 
-                        not self.board[row + direction][col] and  # Check first square
-                        not self.board[row + 2*direction][col]):  # Check second square
-                        moves.append((row + 2*direction, col))
-            
-            # Capture diagonally
-            for dx in [-1, 1]:
-                capture_row, capture_col = row + direction, col + dx
-                if (0 <= capture_row < 8 and 0 <= capture_col < 8 and 
-                    self.board[capture_row][capture_col] and 
-                    self.board[capture_row][capture_col]["color"] != color):
-                    moves.append((capture_row, capture_col))
-        
-        # Rooks (and part of queen movement)
-        if piece_type in ["rook", "queen"]:
-            # Horizontal and vertical movement
-            for dr, dc in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
-                r, c = row + dr, col + dc
-                while 0 <= r < 8 and 0 <= c < 8:
-                    if not self.board[r][c]:  # Empty square
-                        moves.append((r, c))
-                    else:  # Occupied square
-                        if self.board[r][c]["color"] != color:  # Can capture
-                            moves.append((r, c))
-                        break  # Stop after hitting a piece
-                    r += dr
-                    c += dc
-        
-        # Bishops (and part of queen movement)
-        if piece_type in ["bishop", "queen"]:
-            # Diagonal movement
-            for dr, dc in [(1, 1), (1, -1), (-1, 1), (-1, -1)]:
-                r, c = row + dr, col + dc
-                while 0 <= r < 8 and 0 <= c < 8:
-                    if not self.board[r][c]:  # Empty square
-                        moves.append((r, c))
-                    else:  # Occupied square
-                        if self.board[r][c]["color"] != color:  # Can capture
-                            moves.append((r, c))
-                        break  # Stop after hitting a piece
-                    r += dr
-                    c += dc
-        
-        # Knights
-        if piece_type == "knight":
-            knight_moves = [
-                (-2, -1), (-2, 1), (-1, -2), (-1, 2),
-                (1, -2), (1, 2), (2, -1), (2, 1)
-            ]
-            for dr, dc in knight_moves:
-                r, c = row + dr, col + dc
-                if (0 <= r < 8 and 0 <= c < 8 and 
-                    (not self.board[r][c] or self.board[r][c]["color"] != color)):
-                    moves.append((r, c))
-        
-        # King
-        if piece_type == "king":
-            king_moves = [
-                (-1, -1), (-1, 0), (-1, 1),
-                (0, -1),           (0, 1),
-                (1, -1),  (1, 0),  (1, 1)
-            ]
-            for dr, dc in king_moves:
-                r, c = row + dr, col + dc
-                if (0 <= r < 8 and 0 <= c < 8 and 
-                    (not self.board[r][c] or self.board[r][c]["color"] != color)):
-                    moves.append((r, c))
-        
-        return moves
+        return self.position.get_possible_moves(row, col)
     
     def get_legal_moves(self, row, col):
         """Get all legal moves for a piece considering check rules."""
-        piece = self.board[row][col]
-        if not piece:
-            return []
-        
-        color = piece["color"]
-        possible_moves = self.get_possible_moves(row, col)
-        legal_moves = []
-        
-        # Check each move to see if it would leave the king in check
-        for move_row, move_col in possible_moves:
-            # Make a temporary move
-            temp_board = [row[:] for row in self.board]
-            temp_board[move_row][move_col] = temp_board[row][col]
-            temp_board[row][col] = None
-            
-            # Check if the king is in check after this move
-            if not self.would_be_in_check(color, temp_board):
-                legal_moves.append((move_row, move_col))
-        
-        return legal_moves
+        return self.move_cache.legal_moves(self.position, row, col)
     
     def would_be_in_check(self, color, board):
         """Check if the given color's king would be in check with the given board state."""
-        # Find king position
-        king_row, king_col = None, None
-        for row in range(8):
-            for col in range(8):
-                piece = board[row][col]
-                if piece and piece["type"] == "king" and piece["color"] == color:
-                    king_row, king_col = row, col
-                    break
-            if king_row is not None:
-                break
-        
-        # If king not found, return False
-        if king_row is None:
-            return False
-        
-        # Check if any opponent's piece can capture the king
-        opponent_color = "black" if color == "white" else "white"
-        for row in range(8):
-            for col in range(8):
-                piece = board[row][col]
-                if piece and piece["color"] == opponent_color:
-                    # Get possible moves for this opponent piece
-                    for dr, dc in self.get_attack_squares(row, col, board):
-                        if (dr, dc) == (king_row, king_col):
-                            return True
-        
-        return False
+        return board.would_be_in_check(COLOR_CODES[color])
     
     def get_attack_squares(self, row, col, board):
         """Get squares that a piece can attack, used for check detection."""
-        piece = board[row][col]
-        if not piece:
-            return []
-            
-        attack_squares = []
-        piece_type = piece["type"]
-        color = piece["color"]
-        
-        # Pawns attack diagonally
-        if piece_type == "pawn":
-            direction = -1 if color == "white" else 1
-            for dx in [-1, 1]:
-                attack_row, attack_col = row + direction, col + dx
-                if 0 <= attack_row < 8 and 0 <= attack_col < 8:
-                    attack_squares.append((attack_row, attack_col))
-        
-        # Rooks (and part of queen)
-        if piece_type in ["rook", "queen"]:
-            for dr, dc in [(0, 1), (1, 0), (0, -1), (-1, 0)]:
-                r, c = row + dr, col + dc
-                while 0 <= r < 8 and 0 <= c < 8:
-                    attack_squares.append((r, c))
-                    if board[r][c]:  # Stop at any piece (friend or foe)
-                        break
-                    r += dr
-                    c += dc
-        
-        # Bishops (and part of queen)
-        if piece_type in ["bishop", "queen"]:
-            for dr, dc in [(1, 1), (1, -1), (-1, 1), (-1, -1)]:
-                r, c = row + dr, col + dc
-                while 0 <= r < 8 and 0 <= c < 8:
-                    attack_squares.append((r, c))
-                    if board[r][c]:  # Stop at any piece
-                        break
-                    r += dr
-                    c += dc
-        
-        # Knights
-        if piece_type == "knight":
-            knight_moves = [
-                (-2, -1), (-2, 1), (-1, -2), (-1, 2),
-                (1, -2), (1, 2), (2, -1), (2, 1)
-            ]
-            for dr, dc in knight_moves:
-                r, c = row + dr, col + dc
-                if 0 <= r < 8 and 0 <= c < 8:
-                    attack_squares.append((r, c))
-        
-        # King
-        if piece_type == "king":
-            king_moves = [
-                (-1, -1), (-1, 0), (-1, 1),
-                (0, -1),           (0, 1),
-                (1, -1),  (1, 0),  (1, 1)
-            ]
-            for dr, dc in king_moves:
-                r, c = row + dr, col + dc
-                if 0 <= r < 8 and 0 <= c < 8:
-                    attack_squares.append((r, c))
-        
-        return attack_squares
-        
+        return board.get_attack_squares(row, col)
+    
     def handle_click(self, event):
         """Handle click events on the chess board."""
-        col = event.x // self.SQUARE_SIZE
-        row = event.y // self.SQUARE_SIZE
+        self.click(event.y // self.SQUARE_SIZE, event.x // self.SQUARE_SIZE)
+    
+    def click(self, row, col):
+        """Select a piece, or move the selected one, as a click on (row, col) would."""
+        # Ignore clicks while it is the engine's move
+        if self.turn == self.engine_color:
+            return
         
         # If a piece is already selected
         if self.selected_piece:
             selected_row, selected_col = self.selected_piece
-            possible_moves = self.get_legal_moves(selected_row, selected_col)
+            possible_moves = self.selected_moves
+            if possible_moves is None:
+                # The worker has not answered yet; this one is needed right now
+                possible_moves = self.get_legal_moves(selected_row, selected_col)
             
             # If clicked on a possible move
             if (row, col) in possible_moves:
-                # Move the piece
+                # Move the piece (this also passes the turn to the opponent)
+                mover = self.turn
                 self.move_piece(selected_row, selected_col, row, col)
-                self.selected_piece = None
-                self.clear_highlights()
-                
-                # Check for check status after move
-                opponent = "black" if self.turn == "white" else "white"
-                
-                # Check if opponent is in check
-                if self.is_in_check(opponent):
-                    self.check_status[opponent] = True
-                    if self.is_checkmate(opponent):
-                        messagebox.showinfo("Checkmate", f"{opponent.capitalize()} is in checkmate! {self.turn.capitalize()} wins!")
-                        self.reset_game()
-                        return
-                    else:
-                        messagebox.showinfo("Check", f"{opponent.capitalize()} is in check!")
-                else:
-                    self.check_status[opponent] = False
-                
-                # Switch turns
-                self.turn = opponent
-                self.status_label.config(text=f"Current turn: {self.turn.capitalize()}")
-                
-                # Check for stalemate
-                if self.is_stalemate(self.turn):
-                    messagebox.showinfo("Stalemate", f"Stalemate! The game is a draw.")
-                    self.reset_game()
-                    return
-                
+                self.deselect_piece()
+                self.request_status(mover)
+            
             else:
                 # If clicked on another piece of same color, select that piece instead
-                piece = self.board[row][col]
-                if piece and piece["color"] == self.turn:
-                    self.selected_piece = (row, col)
-                    self.highlight_possible_moves(row, col)
+                piece = self.position.piece_at(row, col)
+                if piece and self.piece_color(piece) == self.turn:
+                    self.select_piece(row, col)
                 else:
                     # Deselect if clicked elsewhere
-                    self.selected_piece = None
-                    self.clear_highlights()
+                    self.deselect_piece()
         else:
             # Select a piece
-            piece = self.board[row][col]
-            if piece and piece["color"] == self.turn:
-                self.selected_piece = (row, col)
-                self.highlight_possible_moves(row, col)
+            piece = self.position.piece_at(row, col)
+            if piece and self.piece_color(piece) == self.turn:
+                self.select_piece(row, col)
     
-    def move_piece(self, from_row, from_col, to_row, to_col):
-        """Move a piece on the board and handle special cases like pawn promotion."""
-        piece = self.board[from_row][from_col]
+    def select_piece(self, row, col):
+        """Select a piece and ask the worker for its legal moves."""
+        self.selected_piece = (row, col)
+        self.selected_moves = None
+        self.clear_highlights()
+        position = self.position.copy()
         
-        # Record the move in algebraic notation
-        from_coord = chr(97 + from_col) + str(8 - from_row)
-        to_coord = chr(97 + to_col) + str(8 - to_row)
+        def show(possible_moves):
+            if self.selected_piece == (row, col):
+                self.selected_moves = possible_moves
+                self.highlight_possible_moves(row, col, possible_moves)
         
-        piece_letter = ""
-        if piece["type"] != "pawn":
-            piece_letter = piece["type"][0].upper()
-            if piece["type"] == "knight":  # Knight uses 'N' instead of 'K'
-                piece_letter = "N"
+        # Replaces (and cancels) any move-list request for an earlier selection
+        self.worker.submit(
+            self.move_cache.legal_moves, position, row, col, callback=show, tag="moves"
+        )
+    
+    def deselect_piece(self):
+        """Drop the current selection and any pending move-list request for it."""
+        self.worker.cancel("moves")
+        self.selected_piece = None
+        self.selected_moves = None
+        self.clear_highlights()
+    
+    def request_status(self, mover):
+        """Work out check, checkmate and stalemate on the worker after mover's move."""
+        position = self.position.copy()
         
-        captured = "x" if self.board[to_row][to_col] else ""
-        move_text = f"{piece_letter}{from_coord}{captured}{to_coord}"
+        def report(status):
+            if self.finish_move(mover, status):
+                self.start_engine_if_needed()
         
-        # Handle pawn promotion
-        is_promotion = False
-        if piece["type"] == "pawn" and (to_row == 0 or to_row == 7):
-            is_promotion = True
-            promotion_options = ["queen", "rook", "bishop", "knight"]
-            promotion_piece = simpledialog.askstring(
-                "Pawn Promotion",
-                "Choose promotion piece (queen, rook, bishop, knight):",
-                initialvalue="queen"
-            )
-            
-            if promotion_piece is None or promotion_piece.lower() not in promotion_options:
-                promotion_piece = "queen"  # Default to queen
-            
-            # Update the piece type
-            piece["type"] = promotion_piece.lower()
-            move_text += f"={promotion_piece[0].upper()}"
+        self.worker.submit(
+            self.move_cache.status, position, position.turn, callback=report, tag="status"
+        )
+    
+    def finish_move(self, mover, status):
+        """Report check, checkmate, stalemate and draws after mover's move.
+        
+        status is the opponent's game_status. Returns False if the game
+        ended (and was reset), True otherwise.
+        """
+        # Check for check status after move
+        opponent = self.turn
+        
+        # Check if opponent is in check
+        self.check_status[opponent] = status in ("check", "checkmate")
+        if status == "checkmate":
+            self.notify("Checkmate", f"{opponent.capitalize()} is in checkmate! {mover.capitalize()} wins!")
+            self.reset_game("1-0" if mover == "white" else "0-1")
+            return False
+        elif status == "check":
+            self.notify("Check", f"{opponent.capitalize()} is in check!")
+        
+        self.set_status(f"Current turn: {self.turn.capitalize()}")
+        
+        # Check for stalemate and drawn positions
+        if status == "stalemate":
+            self.notify("Stalemate", f"Stalemate! The game is a draw.")
+            self.reset_game("1/2-1/2")
+            return False
+        elif status == "repetition":
+            self.notify("Draw", "Threefold repetition! The game is a draw.")
+            self.reset_game("1/2-1/2")
+            return False
+        elif status == "fifty-move":
+            self.notify("Draw", "Fifty moves without a capture or pawn move! The game is a draw.")
+            self.reset_game("1/2-1/2")
+            return False
+        return True
+    
+    def start_engine_if_needed(self):
+        """Start an engine search on the worker if it is the engine's turn."""
+        if self.turn != self.engine_color or self.worker.busy("engine"):
+            return
+        self.set_status(f"Current turn: {self.turn.capitalize()} (thinking...)")
+        # Cancelling sets this search's own event, so it holds even if the
+        # worker has taken the job but not yet started searching
+        stop_event = threading.Event()
+        self.worker.submit(
+            self.searcher.search, self.position.copy(), 64, self.engine_time, None, stop_event,
+            callback=self.play_engine_move, tag="engine", on_cancel=stop_event.set
+        )
+    
+    def play_engine_move(self, result):
+        """Play the move found by an engine search."""
+        if result.move is None:
+            return
+        from_sq, to_sq, promotion = decode_move(result.move)
+        mover = self.turn
+        self.move_piece(*divmod(from_sq, 8), *divmod(to_sq, 8), promotion=PIECE_NAMES[promotion])
+        self.request_status(mover)
+    
+    def move_piece(self, from_row, from_col, to_row, to_col, promotion=None):
+        """Move a piece on the board and handle special cases like pawn promotion.
         
-        # Mark the piece as having moved
-        piece["has_moved"] = True
+        promotion names the piece a pawn reaching the last rank becomes; if
+        it is not given choose_promotion() decides.
+        """
+        piece = PIECE_NAMES[self.position.piece_at(from_row, from_col) & 7]
         
-        # Move piece in the board data structure
-        self.board[to_row][to_col] = self.board[from_row][from_col]
-        self.board[from_row][from_col] = None
+        # Handle pawn promotion
+        if piece == "pawn" and (to_row == 0 or to_row == 7):
+            if promotion is None:
+                promotion = self.choose_promotion()
+            move = encode_move(from_row * 8 + from_col, to_row * 8 + to_col, PIECE_CODES[promotion])
+        else:
+            move = encode_move(from_row * 8 + from_col, to_row * 8 + to_col)
+        
+        # Record the move in standard algebraic notation, then make it
+        move_text = san(self.position, move)
+        self.position.make_move(move)
+        self.move_cache.invalidate()
         
         # Update move history
         self.move_history.append(move_text)
-        move_number = (len(self.move_history) + 1) // 2
-        if len(self.move_history) % 2 == 1:  # White's move
-            history_entry = f"{move_number}. {move_text}"
-        else:  # Black's move
-            history_entry = f"{move_text}\n"
-            
-        self.history_text.insert(tk.END, history_entry)
-        self.history_text.see(tk.END)  # Scroll to see the latest move
+        if self.shown:
+            self.history_text.insert("end", self.history_entry(len(self.move_history) - 1))
+            self.history_text.see("end")  # Scroll to see the latest move
         
-        # Redraw the board
-        self.draw_board()
+        # Update the squares the move changed
         self.draw_pieces()
         
         # If king or opponent is in check, highlight the king
@@ -531,77 +542,87 @@ class ChessGame:
     
     def highlight_king_in_check(self, color):
         """Highlight the king that is in check."""
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece and piece["type"] == "king" and piece["color"] == color:
-                    x0 = col * self.SQUARE_SIZE
-                    y0 = row * self.SQUARE_SIZE
-                    x1 = x0 + self.SQUARE_SIZE
-                    y1 = y0 + self.SQUARE_SIZE
-                    highlight = self.canvas.create_rectangle(
-                        x0, y0, x1, y1, outline=self.CHECK_COLOR, width=3
-                    )
-                    self.highlighted_squares.append(highlight)
-                    return
+        king = self.position.find_king(COLOR_CODES[color])
+        if king is None or not self.shown:
+            return
+        self.show_marker(self.check_markers[color], *divmod(king, 8))
     
     def is_in_check(self, color):
         """Check if the given color's king is in check."""
-        return self.would_be_in_check(color, self.board)
+        return self.would_be_in_check(color, self.position)
     
     def is_checkmate(self, color):
         """Check if the given color is in checkmate."""
-        # If not in check, can't be checkmate
-        if not self.is_in_check(color):
-            return False
-        
-        # Check if any piece has legal moves
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece and piece["color"] == color:
-                    legal_moves = self.get_legal_moves(row, col)
-                    if legal_moves:
-                        return False
-        
-        # No legal moves and king is in check = checkmate
-        return True
+        return self.game_status(color) == "checkmate"
     
     def is_stalemate(self, color):
         """Check if the given color is in stalemate (not in check but no legal moves)."""
-        # If in check, can't be stalemate
-        if self.is_in_check(color):
-            return False
-        
-        # Check if any piece has legal moves
-        for row in range(8):
-            for col in range(8):
-                piece = self.board[row][col]
-                if piece and piece["color"] == color:
-                    legal_moves = self.get_legal_moves(row, col)
-                    if legal_moves:
-                        return False
-        
-        # No legal moves and king is not in check = stalemate
-        return True
+        return self.game_status(color) == "stalemate"
+    
+    def game_status(self, color):
+        """Return "checkmate", "stalemate", "repetition", "fifty-move", "check" or None for color."""
+        return self.move_cache.status(self.position, COLOR_CODES[color])
+    
+    def pgn_text(self, result="*"):
+        """Return the moves played so far as a PGN game."""
+        return format_game({}, self.move_history, result)
     
-    def reset_game(self):
-        """Reset the game to initial state."""
-        self.board = self.initialize_board()
-        self.turn = "white"
+    def save_game(self, result="*"):
+        """Append the current game to the archive, if there is one and a move was made."""
+        if self.archive and self.position.stack:
+            with GameWriter(self.archive) as writer:
+                writer.append_position(self.position, result)
+    
+    def reset_game(self, result="*"):
+        """Reset the game to initial state, archiving the game that ended with result."""
+        self.worker.cancel_all()
+        self.save_game(result)
+        self.position = self.initialize_board()
+        self.move_cache.invalidate()
         self.selected_piece = None
+        self.selected_moves = None
         self.check_status = {"white": False, "black": False}
         self.clear_highlights()
-        self.draw_board()
         self.draw_pieces()
-        self.status_label.config(text=f"Current turn: {self.turn.capitalize()}")
+        self.set_status(f"Current turn: {self.turn.capitalize()}")
         
         # Clear move history
-        self.history_text.delete("1.0", tk.END)
+        if self.shown:
+            self.history_text.delete("1.0", "end")
         self.move_history = []
+        
+        self.start_engine_if_needed()
+
+instrumentation.register(
+    ChessGame, "get_legal_moves", "would_be_in_check", "get_attack_squares", "handle_click", "click",
+    "move_piece", "finish_move", "draw_board", "draw_pieces", "highlight_possible_moves",
+)
 
 # Run the game
 if __name__ == "__main__":
+    if sys.argv[1:2] == ["analyze"]:
+        import analysis
+        sys.exit(analysis.main(sys.argv[2:]))
+    if sys.argv[1:2] == ["uci"]:
+        import uci
+        sys.exit(uci.main(sys.argv[2:]))
+    
+    import argparse
+    import tkinter as tk
+    
+    parser = argparse.ArgumentParser(description="Play chess in a Tk window.")
+    parser.add_argument("--engine", choices=["white", "black"], help="let the engine play this colour")
+    parser.add_argument("--think", type=float, default=1.0, help="engine seconds per move (default: 1)")
+    parser.add_argument("--archive", help="append finished games to this binary game archive")
+    parser.add_argument("--book", help="opening book file for the engine (see book.py)")
+    parser.add_argument("--tablebases", help="endgame table directory for the engine (see tablebase.py)")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+    instrumentation.enable_from_environment(args.profile, args.pstats)
+    
     root = tk.Tk()
-    game = ChessGame(root)
+    game = ChessGame(
+        root, engine_color=args.engine, engine_time=args.think, archive=args.archive, book=args.book,
+        tablebases=args.tablebases,
+    )
     root.mainloop()
@@ -0,0 +1,173 @@
+"""Static evaluation: material plus piece-square tables.
+
+Scores are in centipawns, positive for White.  SQUARE_SCORES holds the
+combined material and piece-square value of every (piece code, square)
+pair, so a position's score is the sum of one table entry per piece.
+Position keeps that sum up to date in make/unmake (``Position.score``),
+the same way it keeps its Zobrist key, so evaluating is a lookup rather
+than a pass over the board.
+
+Piece codes and squares follow position.py: the piece type (1-6, pawn to
+king) in the low three bits, 8 for Black, and square 0 = a8.  This module
+does not import position.py so that position.py can import the tables.
+
+evaluate_many scores a whole batch of positions at once with NumPy when
+it is installed, and falls back to a plain loop when it is not.  NumPy is
+only imported by the first batch call, so importing position.py (and so
+the GUI and every pool worker) does not pay for it.
+"""
+
+# Set by _numpy() on first use; NumPy is optional
+numpy = None
+_numpy_missing = False
+_SQUARE_ARRAY = _SQUARE_INDEX = None
+
+# Material values indexed by piece type
+PIECE_VALUES = (0, 100, 320, 330, 500, 900, 0)
+
+# Piece-square bonuses by piece type, from White's point of view with the
+# first row being the 8th rank (Black mirrors them vertically)
+PIECE_SQUARE_TABLES = (
+    (0,) * 64,
+    (  # Pawn
+        0, 0, 0, 0, 0, 0, 0, 0,
+        50, 50, 50, 50, 50, 50, 50, 50,
+        10, 10, 20, 30, 30, 20, 10, 10,
+        5, 5, 10, 25, 25, 10, 5, 5,
+        0, 0, 0, 20, 20, 0, 0, 0,
+        5, -5, -10, 0, 0, -10, -5, 5,
+        5, 10, 10, -20, -20, 10, 10, 5,
+        0, 0, 0, 0, 0, 0, 0, 0,
+    ),
+    (  # Knight
+        -50, -40, -30, -30, -30, -30, -40, -50,
+        -40, -20, 0, 0, 0, 0, -20, -40,
+        -30, 0, 10, 15, 15, 10, 0, -30,
+        -30, 5, 15, 20, 20, 15, 5, -30,
+        -30, 0, 15, 20, 20, 15, 0, -30,
+        -30, 5, 10, 15, 15, 10, 5, -30,
+        -40, -20, 0, 5, 5, 0, -20, -40,
+        -50, -40, -30, -30, -30, -30, -40, -50,
+    ),
+    (  # Bishop
+        -20, -10, -10, -10, -10, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 10, 10, 5, 0, -10,
+        -10, 5, 5, 10, 10, 5, 5, -10,
+        -10, 0, 10, 10, 10, 10, 0, -10,
+        -10, 10, 10, 10, 10, 10, 10, -10,
+        -10, 5, 0, 0, 0, 0, 5, -10,
+        -20, -10, -10, -10, -10, -10, -10, -20,
+    ),
+    (  # Rook
+        0, 0, 0, 0, 0, 0, 0, 0,
+        5, 10, 10, 10, 10, 10, 10, 5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        -5, 0, 0, 0, 0, 0, 0, -5,
+        0, 0, 0, 5, 5, 0, 0, 0,
+    ),
+    (  # Queen
+        -20, -10, -10, -5, -5, -10, -10, -20,
+        -10, 0, 0, 0, 0, 0, 0, -10,
+        -10, 0, 5, 5, 5, 5, 0, -10,
+        -5, 0, 5, 5, 5, 5, 0, -5,
+        0, 0, 5, 5, 5, 5, 0, -5,
+        -10, 5, 5, 5, 5, 5, 0, -10,
+        -10, 0, 5, 0, 0, 0, 0, -10,
+        -20, -10, -10, -5, -5, -10, -10, -20,
+    ),
+    (  # King: stay sheltered behind the pawns
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -30, -40, -40, -50, -50, -40, -40, -30,
+        -20, -30, -30, -40, -40, -30, -30, -20,
+        -10, -20, -20, -20, -20, -20, -20, -10,
+        20, 20, 0, 0, 0, 0, 20, 20,
+        20, 30, 10, 0, 0, 10, 30, 20,
+    ),
+)
+
+
+def _square_score(piece, sq):
+    """Signed material and piece-square value of piece standing on sq."""
+    kind = piece & 7
+    if not 1 <= kind <= 6:
+        return 0
+    if piece & 8:
+        return -(PIECE_VALUES[kind] + PIECE_SQUARE_TABLES[kind][sq ^ 56])
+    return PIECE_VALUES[kind] + PIECE_SQUARE_TABLES[kind][sq]
+
+
+# SQUARE_SCORES[piece * 64 + sq], indexed like the Zobrist piece keys
+SQUARE_SCORES = tuple(_square_score(piece, sq) for piece in range(16) for sq in range(64))
+
+
+def score_squares(squares):
+    """Score a 64-square board from scratch (White positive)."""
+    return sum(SQUARE_SCORES[piece * 64 + sq] for sq, piece in enumerate(squares) if piece)
+
+
+def evaluate(position):
+    """Static score of position from the point of view of the side to move."""
+    return -position.score if position.turn else position.score
+
+
+def _numpy():
+    """Import NumPy and build the NumPy score table on first use; None without NumPy."""
+    global numpy, _numpy_missing, _SQUARE_ARRAY, _SQUARE_INDEX
+    if numpy is None and not _numpy_missing:
+        try:
+            import numpy as module
+        except ImportError:  # evaluate_many falls back to a loop
+            _numpy_missing = True
+            return None
+        _SQUARE_ARRAY = module.array(SQUARE_SCORES, dtype=module.int32).reshape(16, 64)
+        _SQUARE_INDEX = module.arange(64)
+        numpy = module
+    return numpy
+
+
+def _require_numpy():
+    """Return NumPy, raising ImportError if it is not installed."""
+    numpy = _numpy()
+    if numpy is None:
+        raise ImportError("NumPy is needed for batch boards; evaluate_many works without it")
+    return numpy
+
+
+def stack_boards(positions):
+    """Return the boards of positions as an (N, 64) uint8 NumPy array (NumPy required)."""
+    numpy = _require_numpy()
+    data = b"".join(bytes(position.squares) for position in positions)
+    return numpy.frombuffer(data, dtype=numpy.uint8).reshape(-1, 64)
+
+
+def evaluate_boards(boards):
+    """Score an (N, 64) array of boards at once; returns White-positive int32 scores (NumPy required)."""
+    numpy = _require_numpy()
+    return _SQUARE_ARRAY[boards, _SQUARE_INDEX].sum(axis=1, dtype=numpy.int32)
+
+
+def evaluate_many(positions):
+    """Score a batch of positions, each from the point of view of its side to move.
+    
+    With NumPy the boards are stacked into one array and scored in a
+    single vectorized pass from the tables (the positions' incremental
+    scores are not consulted), returning an int32 array.  Without NumPy
+    this returns a list built with evaluate().
+    """
+    numpy = _numpy()
+    if numpy is None:
+        return [evaluate(position) for position in positions]
+    positions = list(positions)
+    if not positions:
+        return numpy.zeros(0, dtype=numpy.int32)
+    scores = evaluate_boards(stack_boards(positions))
+    black = numpy.fromiter((position.turn for position in positions), dtype=numpy.uint8,
+                           count=len(positions)) != 0
+    return numpy.where(black, -scores, scores)
+
@@ -0,0 +1,296 @@
+"""Compact binary archive of played games.
+
+An archive is a pair of append-only files: the game data and an index of
+where each game starts.  Both begin with a small file header.  Each game
+is a fixed header (move count, result, length of its starting FEN) followed
+by the FEN, if the game did not start from the initial position, and one
+little-endian 16-bit word per move in the usual move encoding.  The index
+is one 64-bit offset per game, so game N is found without reading any of
+the games before it.
+
+Usage:
+    python gamefile.py info ARCHIVE
+    python gamefile.py scan ARCHIVE              # replay every game
+    python gamefile.py show ARCHIVE N            # print game N as PGN
+    python gamefile.py import ARCHIVE FILE.pgn   # append games from PGN
+"""
+
+import argparse
+import mmap
+import os
+import struct
+import sys
+import time
+from array import array
+
+from pgn import format_game, read_games, san
+from position import STARTING_FEN, Position
+
+DATA_MAGIC = b"CHGD"
+INDEX_MAGIC = b"CHGI"
+VERSION = 1
+# magic, format version, reserved
+FILE_HEADER = struct.Struct("<4sHH")
+# move count, result code, reserved, starting FEN length (0: initial position)
+GAME_HEADER = struct.Struct("<HBBH")
+OFFSET = struct.Struct("<Q")
+RESULTS = ("*", "1-0", "0-1", "1/2-1/2")
+
+
+def index_path(path):
+    """Return the path of the index file that goes with an archive."""
+    return path + ".idx"
+
+
+def encode_game(moves, result="*", start_fen=None):
+    """Return the bytes of one game record."""
+    fen = b"" if start_fen in (None, STARTING_FEN) else start_fen.encode("ascii")
+    words = array("H", moves)
+    if sys.byteorder == "big":
+        words.byteswap()
+    return GAME_HEADER.pack(len(words), RESULTS.index(result), 0, len(fen)) + fen + words.tobytes()
+
+
+class GameWriter:
+    """Appends games to an archive, creating it if needed.
+    
+    Use as a context manager, or call close() when done; the games are only
+    guaranteed to be on disk after close() or flush().
+    """
+    
+    def __init__(self, path):
+        self.path = path
+        _trim(path)
+        self.data = open(path, "ab")
+        self.index = open(index_path(path), "ab")
+        if self.data.tell() == 0:
+            self.data.write(FILE_HEADER.pack(DATA_MAGIC, VERSION, 0))
+        if self.index.tell() == 0:
+            self.index.write(FILE_HEADER.pack(INDEX_MAGIC, VERSION, 0))
+        self.offset = self.data.tell()
+        self.count = (self.index.tell() - FILE_HEADER.size) // OFFSET.size
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def append(self, moves, result="*", start_fen=None):
+        """Append one game given its encoded moves and return its game number."""
+        record = encode_game(moves, result, start_fen)
+        self.data.write(record)
+        # The two files are buffered separately, so after a crash the index
+        # may run ahead of the data; GameReader skips such entries and the
+        # next GameWriter cuts them off
+        self.index.write(OFFSET.pack(self.offset))
+        self.offset += len(record)
+        self.count += 1
+        return self.count - 1
+    
+    def append_position(self, position, result="*", start_fen=None):
+        """Append the game that led to position, taken from its undo stack."""
+        return self.append([record[0] for record in position.stack], result, start_fen)
+    
+    def flush(self):
+        """Push buffered games and offsets to disk."""
+        self.data.flush()
+        self.index.flush()
+    
+    def close(self):
+        """Flush and close both files."""
+        self.data.close()
+        self.index.close()
+
+
+class GameReader:
+    """Random access to the games of an archive through memory maps."""
+    
+    def __init__(self, path):
+        self.path = path
+        self._files = []
+        self.data = self._map(path, DATA_MAGIC)
+        self.index = self._map(index_path(path), INDEX_MAGIC)
+        self.count = (len(self.index) - FILE_HEADER.size) // OFFSET.size
+        # Games are appended in order, so only the last few can be cut short
+        while self.count and self._record_end(self.count - 1) is None:
+            self.count -= 1
+    
+    def _map(self, path, magic):
+        """Memory-map one archive file and check its header."""
+        handle = open(path, "rb")
+        self._files.append(handle)
+        if os.fstat(handle.fileno()).st_size < FILE_HEADER.size:
+            raise ValueError(f"{path} is not a game archive")
+        mapped = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        found, version, _ = FILE_HEADER.unpack_from(mapped)
+        if found != magic or version != VERSION:
+            raise ValueError(f"{path} is not a version {VERSION} game archive")
+        return mapped
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc_info):
+        self.close()
+    
+    def __len__(self):
+        return self.count
+    
+    def close(self):
+        """Unmap and close the archive files."""
+        for mapped in (self.data, self.index):
+            mapped.close()
+        for handle in self._files:
+            handle.close()
+    
+    def _record_end(self, number):
+        """Offset just past the record of game number, or None if the data file cuts it short."""
+        offset, = OFFSET.unpack_from(self.index, FILE_HEADER.size + number * OFFSET.size)
+        if offset + GAME_HEADER.size > len(self.data):
+            return None
+        count, _, _, fen_length = GAME_HEADER.unpack_from(self.data, offset)
+        end = offset + GAME_HEADER.size + fen_length + 2 * count
+        return end if end <= len(self.data) else None
+    
+    def _record(self, number):
+        """Return (offset of the moves, move count, result code, starting FEN) of a game."""
+        if not 0 <= number < self.count:
+            raise IndexError(f"game {number} out of range (archive has {self.count})")
+        offset, = OFFSET.unpack_from(self.index, FILE_HEADER.size + number * OFFSET.size)
+        count, result, _, fen_length = GAME_HEADER.unpack_from(self.data, offset)
+        offset += GAME_HEADER.size
+        fen = self.data[offset:offset + fen_length].decode("ascii") if fen_length else STARTING_FEN
+        return offset + fen_length, count, result, fen
+    
+    def _moves_at(self, offset, count):
+        """Decode count moves stored at offset."""
+        words = array("H")
+        words.frombytes(self.data[offset:offset + 2 * count])
+        if sys.byteorder == "big":
+            words.byteswap()
+        return words
+    
+    def move_count(self, number):
+        """Return the number of moves (plies) in game number, without decoding them."""
+        return self._record(number)[1]
+    
+    def moves(self, number):
+        """Return the encoded moves of game number as an array of ints."""
+        offset, count, _, _ = self._record(number)
+        return self._moves_at(offset, count)
+    
+    def game(self, number):
+        """Return (start_fen, result, moves) of game number."""
+        offset, count, result, fen = self._record(number)
+        return fen, RESULTS[result], self._moves_at(offset, count)
+    
+    def replay(self, number, position=None):
+        """Play game number onto position (default: its starting position) and return it.
+        
+        The moves are trusted, not checked for legality, so replaying is as
+        fast as make_move itself.
+        """
+        fen, _, moves = self.game(number)
+        if position is None:
+            position = Position.from_fen(fen)
+        make_move = position.make_move
+        for move in moves:
+            make_move(move)
+        return position
+    
+    def __iter__(self):
+        """Yield (start_fen, result, moves) for every game in order."""
+        for number in range(self.count):
+            yield self.game(number)
+
+
+def _trim(path):
+    """Cut an archive back to its last complete game, so appends follow on from it.
+    
+    After a crash the index may list games the data file never got, and the
+    data file may end in part of a record; both are dropped.
+    """
+    paths = (path, index_path(path))
+    if not all(os.path.exists(name) and os.path.getsize(name) >= FILE_HEADER.size for name in paths):
+        return
+    with GameReader(path) as reader:
+        count = reader.count
+        end = reader._record_end(count - 1) if count else FILE_HEADER.size
+    for name, size in zip(paths, (end, FILE_HEADER.size + count * OFFSET.size)):
+        if os.path.getsize(name) > size:
+            os.truncate(name, size)
+
+
+def import_pgn(archive, paths):
+    """Append the games of PGN files to an archive; return (games, skipped)."""
+    games = 0
+    skipped = 0
+    with GameWriter(archive) as writer:
+        for path in paths:
+            with open(path, encoding="utf-8", errors="replace") as handle:
+                for game in read_games(handle):
+                    try:
+                        moves = [move for _, move in game.replay()]
+                    except ValueError:
+                        skipped += 1
+                        continue
+                    result = game.result if game.result in RESULTS else "*"
+                    writer.append(moves, result, game.headers.get("FEN"))
+                    games += 1
+    return games, skipped
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Inspect and build binary game archives.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    command = commands.add_parser("info", help="print the number of games and moves")
+    command.add_argument("archive")
+    command = commands.add_parser("scan", help="replay every game and report the rate")
+    command.add_argument("archive")
+    command = commands.add_parser("show", help="print one game as PGN")
+    command.add_argument("archive")
+    command.add_argument("number", type=int)
+    command = commands.add_parser("import", help="append the games of PGN files")
+    command.add_argument("archive")
+    command.add_argument("pgn", nargs="+")
+    args = parser.parse_args(argv)
+    
+    if args.command == "import":
+        start = time.perf_counter()
+        games, skipped = import_pgn(args.archive, args.pgn)
+        print(f"{games:,} games imported, {skipped:,} invalid skipped "
+              f"in {time.perf_counter() - start:.3f}s")
+        return 0
+    
+    with GameReader(args.archive) as reader:
+        if args.command == "show":
+            fen, result, moves = reader.game(args.number)
+            position = Position.from_fen(fen)
+            sans = []
+            for move in moves:
+                sans.append(san(position, move))
+                position.make_move(move)
+            headers = {"FEN": fen, "SetUp": "1"} if fen != STARTING_FEN else {}
+            print(format_game(headers, sans, result), end="")
+            return 0
+        
+        start = time.perf_counter()
+        games = 0
+        moves = 0
+        for number in range(len(reader)):
+            if args.command == "scan":
+                moves += len(reader.replay(number).stack)
+            else:
+                moves += reader.move_count(number)
+            games += 1
+        seconds = time.perf_counter() - start
+        rate = (f" ({games / seconds:,.0f} games/s, {moves / seconds:,.0f} moves/s)"
+                if args.command == "scan" and seconds > 0 else "")
+        print(f"{args.archive}: {games:,} games, {moves:,} moves{rate}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
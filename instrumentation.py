@@ -0,0 +1,207 @@
+"""Optional timing of the engine's hot paths.
+
+Nothing is wrapped until enable() is called, so instrumentation that is
+switched off costs nothing.  Once enabled, every function in HOT_PATHS (and
+anything added with register()) is replaced by a wrapper that counts calls
+and times each one.  A report of calls, total time and percentiles per
+function is printed when the program exits, and a cProfile run of the
+enabling thread can be dumped to a pstats file alongside it.
+
+Switch it on for any of the command-line tools with the environment:
+    CHESS_PROFILE=1 python perft.py --depth 4
+    CHESS_PSTATS=perft.pstats python perft.py --depth 4
+or with --profile / --pstats FILE where a tool takes them (chess_game.py,
+perft.py, analysis.py).  Times are inclusive: a wrapped function that calls
+another includes its time.
+"""
+
+import atexit
+import functools
+import importlib
+import os
+import random
+import sys
+import time
+
+PROFILE_ENV = "CHESS_PROFILE"
+PSTATS_ENV = "CHESS_PSTATS"
+# Durations kept per function for the percentiles (a uniform sample beyond this)
+SAMPLE_LIMIT = 10000
+
+# "module.Class": method names timed by enable()
+HOT_PATHS = {
+    "position.Position": (
+        "get_legal_moves", "generate_legal_moves", "would_be_in_check", "is_in_check",
+        "get_attack_squares", "status", "make_move", "unmake_move",
+    ),
+    "transposition.MoveCache": ("legal_moves", "status"),
+    "search.Searcher": ("search",),
+}
+
+
+class FunctionStats:
+    """Call count, total time and a sample of call durations for one function."""
+    
+    __slots__ = ("name", "calls", "total", "longest", "nodes", "samples")
+    
+    def __init__(self, name):
+        self.name = name
+        self.calls = 0
+        self.total = 0
+        self.longest = 0
+        self.nodes = 0
+        self.samples = []
+    
+    def add(self, elapsed):
+        """Record one call that took elapsed nanoseconds."""
+        self.calls += 1
+        self.total += elapsed
+        if elapsed > self.longest:
+            self.longest = elapsed
+        if len(self.samples) < SAMPLE_LIMIT:
+            self.samples.append(elapsed)
+        else:
+            # Reservoir sampling keeps every call equally likely to be in the sample
+            slot = random.randrange(self.calls)
+            if slot < SAMPLE_LIMIT:
+                self.samples[slot] = elapsed
+    
+    def percentile(self, fraction):
+        """Duration in nanoseconds below which fraction of the sampled calls finished."""
+        if not self.samples:
+            return 0
+        ordered = sorted(self.samples)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+stats = {}
+enabled = False
+_registered = []
+_patched = []
+_profiler = None
+_pstats_path = None
+_started = None
+
+
+def register(owner, *names):
+    """Add methods of a class (or functions of a module) to what enable() times."""
+    _registered.append((owner, names))
+    if _patched:
+        _patch(owner, names)
+
+
+def _wrap(label, function):
+    """Return a timing wrapper around function that records into stats[label]."""
+    record = stats.setdefault(label, FunctionStats(label))
+    clock = time.perf_counter_ns
+    
+    @functools.wraps(function)
+    def timed(*args, **kwargs):
+        start = clock()
+        try:
+            result = function(*args, **kwargs)
+        finally:
+            record.add(clock() - start)
+        nodes = getattr(result, "nodes", None)
+        if nodes is not None:
+            record.nodes += nodes  # Searches report how many nodes they visited
+        return result
+    
+    return timed
+
+
+def _patch(owner, names):
+    """Replace the named attributes of owner with timing wrappers."""
+    for name in names:
+        original = owner.__dict__[name]
+        if isinstance(original, (staticmethod, classmethod)):
+            wrapped = type(original)(_wrap(f"{owner.__name__}.{name}", original.__func__))
+        else:
+            wrapped = _wrap(f"{owner.__name__}.{name}", original)
+        setattr(owner, name, wrapped)
+        _patched.append((owner, name, original))
+
+
+def enable(report=True, pstats_path=None):
+    """Start timing the hot paths and/or cProfile.
+    
+    With report, the hot paths are wrapped and their timing table is
+    printed to stderr at exit.  With pstats_path, a cProfile run is written
+    there at exit; asked for on its own, nothing is wrapped so the profile
+    only shows the engine's own functions.
+    """
+    global enabled, _profiler, _pstats_path, _started
+    if enabled:
+        return
+    enabled = True
+    _started = time.perf_counter_ns()
+    if report:
+        for path, names in HOT_PATHS.items():
+            module_name, class_name = path.rsplit(".", 1)
+            _patch(getattr(importlib.import_module(module_name), class_name), names)
+        for owner, names in _registered:
+            _patch(owner, names)
+    if pstats_path:
+        import cProfile
+        
+        _pstats_path = pstats_path
+        _profiler = cProfile.Profile()
+        _profiler.enable()
+    atexit.register(_at_exit, report)
+
+
+def disable():
+    """Put the original functions back and stop profiling; the stats are kept."""
+    global enabled
+    while _patched:
+        owner, name, original = _patched.pop()
+        setattr(owner, name, original)
+    if _profiler is not None:
+        _profiler.disable()
+    enabled = False
+
+
+def enable_from_environment(profile=False, pstats_path=None):
+    """Enable if asked to by the arguments or by the CHESS_PROFILE / CHESS_PSTATS variables."""
+    profile = profile or os.environ.get(PROFILE_ENV, "") not in ("", "0")
+    pstats_path = pstats_path or os.environ.get(PSTATS_ENV) or None
+    if profile or pstats_path:
+        enable(report=profile, pstats_path=pstats_path)
+
+
+def add_arguments(parser):
+    """Add the --profile and --pstats options to an argparse parser."""
+    parser.add_argument("--profile", action="store_true",
+                        help=f"time the engine's hot paths and report at exit (or set {PROFILE_ENV}=1)")
+    parser.add_argument("--pstats", metavar="FILE",
+                        help=f"write a cProfile stats file at exit (or set {PSTATS_ENV}=FILE)")
+
+
+def report(out=None):
+    """Print the timing table, slowest total first."""
+    out = out or sys.stderr
+    wall = (time.perf_counter_ns() - _started) if _started else 0
+    print(f"{'function':<34} {'calls':>10} {'total ms':>10} {'%wall':>6} {'mean us':>9} "
+          f"{'p50 us':>8} {'p90 us':>8} {'p99 us':>8} {'max us':>9}", file=out)
+    for record in sorted(stats.values(), key=lambda record: record.total, reverse=True):
+        if not record.calls:
+            continue
+        print(
+            f"{record.name:<34} {record.calls:>10,} {record.total / 1e6:>10.1f} "
+            f"{record.total / wall if wall else 0:>6.1%} {record.total / record.calls / 1e3:>9.2f} "
+            f"{record.percentile(0.5) / 1e3:>8.2f} {record.percentile(0.9) / 1e3:>8.2f} "
+            f"{record.percentile(0.99) / 1e3:>8.2f} {record.longest / 1e3:>9.1f}",
+            file=out
+        )
+        if record.nodes:
+            print(f"{'':<34} {record.nodes:>10,} nodes, "
+                  f"{record.nodes / (record.total / 1e9):,.0f} nodes/s", file=out)
+
+
+def _at_exit(show_report):
+    if _profiler is not None:
+        _profiler.disable()
+        _profiler.dump_stats(_pstats_path)
+        print(f"profile written to {_pstats_path}", file=sys.stderr)
+    if show_report:
+        report()
@@ -0,0 +1,271 @@
+"""Batch check, checkmate and stalemate detection over many boards with NumPy.
+
+classify_boards takes an (N, 64) array of boards (piece codes as in
+position.py, square 0 = a8) and the side to move of each, and works out
+attack maps and check flags for the whole batch with array operations.
+Each piece type becomes an (N,) array of 64-bit bitboards, so its attacks
+are a few shifts and masks across the batch, and sliding attacks are
+extended one step at a time through empty squares.
+
+Mate and stalemate need to know whether any legal move exists.  Most
+boards are settled in bulk as well: a king step to a safe square is always
+legal, and so is any move by an unpinned piece when not in check.  Only
+the boards left over (in check with the king boxed in, or every mobile
+piece pinned) are handed to Position.has_legal_moves one at a time.
+
+A bare board has no castling rights or en passant square, so results are
+those of Position(board, turn), which has neither.  Without NumPy,
+classify_many falls back to that scalar check position by position.  NumPy
+is only imported by the first batch call, as in evaluation.py.
+"""
+
+from position import (
+    BISHOP, BISHOP_DIRECTIONS, BLACK, KING, KING_OFFSETS, KNIGHT, KNIGHT_OFFSETS, PAWN, QUEEN, ROOK,
+    ROOK_DIRECTIONS, WHITE, Position,
+)
+
+# Status codes returned per board
+NONE, CHECK, CHECKMATE, STALEMATE = 0, 1, 2, 3
+STATUS_NAMES = (None, "check", "checkmate", "stalemate")
+
+# Set by _numpy() on first use; NumPy is optional
+numpy = None
+_numpy_missing = False
+
+
+def _numpy():
+    """Import NumPy on first use; None without NumPy."""
+    global numpy, _numpy_missing
+    if numpy is None and not _numpy_missing:
+        try:
+            import numpy as module
+        except ImportError:  # classify_many falls back to a loop
+            _numpy_missing = True
+            return None
+        numpy = module
+    return numpy
+
+
+def _require_numpy():
+    """Return NumPy, raising ImportError if it is not installed."""
+    numpy = _numpy()
+    if numpy is None:
+        raise ImportError("NumPy is needed for batch boards; classify_many works without it")
+    return numpy
+
+
+def status_code(position, color=None):
+    """Scalar reference: the status code of color (default: the side to move) in position."""
+    color = position.turn if color is None else color
+    check = position.would_be_in_check(color)
+    if position.has_legal_moves(color):
+        return CHECK if check else NONE
+    return CHECKMATE if check else STALEMATE
+
+
+def boards_and_turns(positions):
+    """Return the boards of positions as an (N, 64) int8 array and their turns as (N,) uint8."""
+    numpy = _require_numpy()
+    positions = list(positions)
+    data = b"".join(bytes(position.squares) for position in positions)
+    boards = numpy.frombuffer(data, dtype=numpy.int8).reshape(-1, 64)
+    turns = numpy.fromiter((position.turn for position in positions), dtype=numpy.uint8,
+                           count=len(positions))
+    return boards, turns
+
+
+def _keep_masks():
+    """Per column offset, the squares a shifted bitboard may land on without wrapping a row."""
+    masks = {}
+    for dc in range(-2, 3):
+        masks[dc] = sum(1 << sq for sq in range(64) if 0 <= sq % 8 - dc <= 7)
+    return masks
+
+
+KEEP = _keep_masks()
+
+
+def _shift(bitboards, dr, dc):
+    """Move every set square of (N,) uint64 bitboards by dr rows and dc columns."""
+    offset = 8 * dr + dc
+    if offset > 0:
+        moved = bitboards << numpy.uint64(offset)
+    else:
+        moved = bitboards >> numpy.uint64(-offset)
+    return moved & numpy.uint64(KEEP[dc])
+
+
+def _bitboards(boards, code):
+    """Return the (N,) uint64 bitboards of the squares holding code (bit n = square n)."""
+    packed = numpy.packbits(boards == code, axis=1, bitorder="little")
+    return packed.view("<u8").reshape(-1).astype(numpy.uint64)
+
+
+def _pieces(boards):
+    """Return {piece code: (N,) uint64 bitboard} for every piece of either colour."""
+    return {kind | color: _bitboards(boards, kind | color)
+            for kind in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING) for color in (WHITE, BLACK)}
+
+
+def _slide(sliders, steps, empty):
+    """Squares attacked by sliders along steps, stopping at the first occupied square."""
+    attacks = numpy.zeros_like(sliders)
+    for dr, dc in steps:
+        ray = _shift(sliders, dr, dc)
+        while ray.any():
+            attacks |= ray
+            ray = _shift(ray & empty, dr, dc)
+    return attacks
+
+
+def _attacks(pieces, color, empty, pawn_forward):
+    """Bitboards of the squares attacked by pieces[kind | color] for each kind.
+    
+    color is a colour code or an (N,) array of them; pawn_forward is the
+    row step of those pawns (-1 for White, 1 for Black), possibly per board.
+    empty marks the squares sliding attacks pass through.
+    """
+    def select(kind):
+        if numpy.isscalar(color):
+            return pieces[kind | color]
+        return numpy.where(color == WHITE, pieces[kind | WHITE], pieces[kind | BLACK])
+    
+    pawns = select(PAWN)
+    up = numpy.where(pawn_forward < 0, pawns, numpy.uint64(0))
+    down = pawns ^ up
+    attacks = (_shift(up, -1, -1) | _shift(up, -1, 1)) | (_shift(down, 1, -1) | _shift(down, 1, 1))
+    knights = select(KNIGHT)
+    for dr, dc in KNIGHT_OFFSETS:
+        attacks |= _shift(knights, dr, dc)
+    kings = select(KING)
+    for dr, dc in KING_OFFSETS:
+        attacks |= _shift(kings, dr, dc)
+    queens = select(QUEEN)
+    attacks |= _slide(select(ROOK) | queens, ROOK_DIRECTIONS, empty)
+    attacks |= _slide(select(BISHOP) | queens, BISHOP_DIRECTIONS, empty)
+    return attacks
+
+
+def _unpack(bitboards):
+    """Turn (N,) uint64 bitboards into an (N, 64) bool array."""
+    data = bitboards.astype("<u8").view(numpy.uint8).reshape(-1, 8)
+    return numpy.unpackbits(data, axis=1, bitorder="little").astype(bool)
+
+
+def attack_maps(boards, color):
+    """Return an (N, 64) bool array of the squares the pieces of color attack on each board."""
+    numpy = _require_numpy()
+    boards = numpy.asarray(boards, dtype=numpy.int8).reshape(-1, 64)
+    empty = _bitboards(boards, 0)
+    forward = numpy.full(len(boards), -1 if color == WHITE else 1)
+    return _unpack(_attacks(_pieces(boards), color, empty, forward))
+
+
+def _pinned(king, own, occupied, rooks, bishops):
+    """Bitboard of own pieces pinned to king by the enemy rook-likes or bishop-likes given."""
+    zero = numpy.uint64(0)
+    pinned = numpy.zeros_like(king)
+    for steps, sliders in ((ROOK_DIRECTIONS, rooks), (BISHOP_DIRECTIONS, bishops)):
+        for dr, dc in steps:
+            # Walk out from the king: remember the first piece met if it is
+            # our own, and it is pinned if the next piece met is a slider
+            square = _shift(king, dr, dc)
+            candidate = numpy.zeros_like(king)
+            searching = numpy.ones(len(king), dtype=bool)
+            for _ in range(7):
+                hit = searching & ((square & occupied) != zero)
+                first = hit & (candidate == zero)
+                first_own = first & ((square & own) != zero)
+                second = hit & ~first
+                pinned |= numpy.where(second & ((square & sliders) != zero), candidate, zero)
+                candidate |= numpy.where(first_own, square, zero)
+                searching &= ~second & ~(first & ~first_own)
+                if not searching.any():
+                    break
+                square = _shift(square, dr, dc)
+    return pinned
+
+
+def classify_boards(boards, turns):
+    """Return an (N,) int8 array of status codes (NONE, CHECK, CHECKMATE, STALEMATE).
+    
+    boards is an (N, 64) array of piece codes (int8 or any integer type)
+    and turns the side to move of each board, as colour codes or booleans
+    (true for Black).
+    """
+    numpy = _require_numpy()
+    boards = numpy.asarray(boards, dtype=numpy.int8).reshape(-1, 64)
+    black = numpy.asarray(turns).reshape(-1) != 0
+    enemy = numpy.where(black, WHITE, BLACK)
+    zero = numpy.uint64(0)
+    pieces = _pieces(boards)
+    
+    def own_and_enemy(kind):
+        white, black_pieces = pieces[kind | WHITE], pieces[kind | BLACK]
+        return numpy.where(black, black_pieces, white), numpy.where(black, white, black_pieces)
+    
+    own = {kind: own_and_enemy(kind) for kind in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING)}
+    own_all = numpy.zeros(len(boards), dtype=numpy.uint64)
+    enemy_all = numpy.zeros_like(own_all)
+    for own_pieces, enemy_pieces in own.values():
+        own_all |= own_pieces
+        enemy_all |= enemy_pieces
+    empty = ~(own_all | enemy_all)
+    king = own[KING][0]
+    
+    # With the king lifted off the board, squares behind it along a slider's
+    # line count as attacked, which is what a king step away needs; the
+    # king's own square is attacked either way
+    attacked = _attacks(pieces, enemy, empty | king, numpy.where(black, -1, 1))
+    check = (king & attacked) != zero
+    escapes = numpy.zeros_like(king)
+    for dr, dc in KING_OFFSETS:
+        escapes |= _shift(king, dr, dc)
+    can_move = (escapes & ~own_all & ~attacked) != zero
+    
+    quiet = ~check & ~can_move
+    if quiet.any():
+        # Not in check, any move of an unpinned piece is legal
+        rooks = own[ROOK][1] | own[QUEEN][1]
+        bishops = own[BISHOP][1] | own[QUEEN][1]
+        free = ~_pinned(king, own_all, ~empty, rooks, bishops)
+        open_squares = empty | enemy_all
+        found = numpy.zeros_like(king)
+        knights = own[KNIGHT][0] & free
+        for dr, dc in KNIGHT_OFFSETS:
+            found |= _shift(knights, dr, dc) & open_squares
+        for steps, sliders in ((ROOK_DIRECTIONS, own[ROOK][0] | own[QUEEN][0]),
+                               (BISHOP_DIRECTIONS, own[BISHOP][0] | own[QUEEN][0])):
+            for dr, dc in steps:
+                found |= _shift(sliders & free, dr, dc) & open_squares
+        pawns = own[PAWN][0] & free
+        up = numpy.where(black, zero, pawns)
+        down = pawns ^ up
+        found |= (_shift(up, -1, 0) | _shift(down, 1, 0)) & empty
+        for dc in (-1, 1):
+            found |= (_shift(up, -1, dc) | _shift(down, 1, dc)) & enemy_all
+        can_move |= quiet & (found != zero)
+    
+    for index in numpy.flatnonzero(~can_move):
+        turn = BLACK if black[index] else WHITE
+        position = Position(boards[index].astype(numpy.uint8).tobytes(), turn)
+        can_move[index] = position.has_legal_moves(turn)
+    
+    codes = numpy.where(check, CHECK, NONE).astype(numpy.int8)
+    codes[~can_move] = numpy.where(check[~can_move], CHECKMATE, STALEMATE)
+    return codes
+
+
+def classify_many(positions):
+    """Return the status code of the side to move in each position.
+    
+    With NumPy this is classify_boards over the stacked boards (an int8
+    array); without it a list built with status_code().  Castling rights
+    and en passant squares are ignored either way.
+    """
+    positions = list(positions)
+    if _numpy() is None:
+        return [status_code(Position(position.squares, position.turn)) for position in positions]
+    if not positions:
+        return numpy.zeros(0, dtype=numpy.int8)
+    return classify_boards(*boards_and_turns(positions))
@@ -0,0 +1,212 @@
+"""Perft: count leaf nodes of the legal move tree to verify and time move generation.
+
+Usage:
+    python perft.py --suite [--max-depth N]
+    python perft.py [--fen FEN] [--depth N] [--divide] [--hash BITS] [--jobs N]
+"""
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import instrumentation
+from position import STARTING_FEN, Position, move_name
+from transposition import TranspositionTable
+
+# Standard perft positions with their published node counts
+SUITE = [
+    ("startpos", STARTING_FEN,
+     {1: 20, 2: 400, 3: 8902, 4: 197281, 5: 4865609}),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+     {1: 48, 2: 2039, 3: 97862, 4: 4085603}),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+     {1: 14, 2: 191, 3: 2812, 4: 43238, 5: 674624}),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+     {1: 6, 2: 264, 3: 9467, 4: 422333}),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+     {1: 44, 2: 1486, 3: 62379, 4: 2103487}),
+    ("position 6", "r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+     {1: 46, 2: 2079, 3: 89890, 4: 3894594}),
+    # The en passant square has no pawn behind it, so from_fen must drop it
+    ("phantom ep", "4k3/8/8/3P4/8/8/8/4K3 w - e6 0 1",
+     {1: 6, 2: 29, 3: 218, 4: 1274, 5: 9906}),
+]
+
+
+def perft(position, depth):
+    """Count the leaf nodes of the legal move tree below position to the given depth."""
+    if depth == 0:
+        return 1
+    moves = position.generate_legal_moves(position.turn)
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    make_move = position.make_move
+    unmake_move = position.unmake_move
+    for move in moves:
+        make_move(move)
+        nodes += perft(position, depth - 1)
+        unmake_move()
+    return nodes
+
+
+def hashed_perft(position, depth, table):
+    """Perft that reuses subtree counts from a TranspositionTable.
+    
+    Counts are stored with their depth, so an entry only answers a query
+    for the same depth.
+    """
+    if depth <= 1:
+        return perft(position, depth)
+    key = position.key
+    entry = table.probe(key)
+    if entry is not None and entry[0] == depth:
+        return entry[1]
+    nodes = 0
+    make_move = position.make_move
+    unmake_move = position.unmake_move
+    for move in position.generate_legal_moves(position.turn):
+        make_move(move)
+        nodes += hashed_perft(position, depth - 1, table)
+        unmake_move()
+    table.put(key, nodes, depth)
+    return nodes
+
+
+def divide(position, depth):
+    """Return a list of (move, nodes) pairs: the perft count below each root move."""
+    results = []
+    for move in position.generate_legal_moves(position.turn):
+        position.make_move(move)
+        results.append((move, perft(position, depth - 1)))
+        position.unmake_move()
+    return results
+
+
+def _divide_moves(fen, moves, depth):
+    """Process pool task: divide counts for some of the root moves of fen."""
+    position = Position.from_fen(fen)
+    results = []
+    for move in moves:
+        position.make_move(move)
+        results.append((move, perft(position, depth - 1)))
+        position.unmake_move()
+    return results
+
+
+def parallel_divide(position, depth, jobs=None):
+    """divide() with the root moves shared out over a pool of processes.
+    
+    Each worker rebuilds the position from its FEN and takes every jobs-th
+    root move, so expensive and cheap subtrees are spread evenly.  Results
+    come back in the same order as divide() returns them.
+    """
+    jobs = jobs or os.cpu_count() or 1
+    moves = position.generate_legal_moves(position.turn)
+    if depth < 2 or jobs == 1 or len(moves) < 2:
+        return divide(position, depth)
+    fen = position.to_fen()
+    jobs = min(jobs, len(moves))
+    with ProcessPoolExecutor(jobs) as pool:
+        futures = [pool.submit(_divide_moves, fen, moves[i::jobs], depth) for i in range(jobs)]
+        counts = {}
+        for future in futures:
+            counts.update(future.result())
+    return [(move, counts[move]) for move in moves]
+
+
+def parallel_perft(position, depth, jobs=None):
+    """perft() split at the root moves over a pool of processes."""
+    if depth == 0:
+        return 1
+    return sum(nodes for _, nodes in parallel_divide(position, depth, jobs))
+
+
+def timed_perft(position, depth):
+    """Run perft and return (nodes, seconds)."""
+    start = time.perf_counter()
+    nodes = perft(position, depth)
+    return nodes, time.perf_counter() - start
+
+
+def format_rate(nodes, seconds):
+    """Format a nodes-per-second figure."""
+    return f"{nodes / seconds:,.0f} nps" if seconds > 0 else "- nps"
+
+
+def run_suite(max_depth=None, out=sys.stdout):
+    """Run every SUITE position up to max_depth, printing one line per depth.
+    
+    Returns (failures, total_nodes, total_seconds).
+    """
+    failures = 0
+    total_nodes = 0
+    total_seconds = 0.0
+    for name, fen, expected in SUITE:
+        position = Position.from_fen(fen)
+        for depth, count in sorted(expected.items()):
+            if max_depth is not None and depth > max_depth:
+                break
+            nodes, seconds = timed_perft(position, depth)
+            total_nodes += nodes
+            total_seconds += seconds
+            ok = nodes == count
+            failures += not ok
+            print(
+                f"{name:<12} depth {depth}  {nodes:>10,} nodes  "
+                f"{'ok' if ok else f'FAIL (expected {count:,})':<8}  "
+                f"{seconds:7.3f}s  {format_rate(nodes, seconds)}",
+                file=out
+            )
+    print(
+        f"total: {total_nodes:,} nodes in {total_seconds:.3f}s "
+        f"({format_rate(total_nodes, total_seconds)}), {failures} failed",
+        file=out
+    )
+    return failures, total_nodes, total_seconds
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Count move-generation leaf nodes (perft).")
+    parser.add_argument("--fen", default=STARTING_FEN, help="position to search (default: start)")
+    parser.add_argument("--depth", type=int, default=4, help="search depth (default: 4)")
+    parser.add_argument("--divide", action="store_true", help="print the count below each root move")
+    parser.add_argument("--suite", action="store_true", help="run the bundled correctness suite")
+    parser.add_argument("--max-depth", type=int, help="deepest suite depth to run")
+    parser.add_argument("--hash", type=int, metavar="BITS",
+                        help="reuse subtree counts from a transposition table of 2**BITS buckets")
+    parser.add_argument("--jobs", type=int, default=1,
+                        help="split the root moves over this many processes (0: one per core)")
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args(argv)
+    instrumentation.enable_from_environment(args.profile, args.pstats)
+    
+    if args.suite:
+        failures, _, _ = run_suite(args.max_depth)
+        return 1 if failures else 0
+    
+    position = Position.from_fen(args.fen)
+    start = time.perf_counter()
+    if args.divide:
+        results = parallel_divide(position, args.depth, args.jobs)
+        for move, nodes in results:
+            print(f"{move_name(move)}: {nodes}")
+        nodes = sum(count for _, count in results)
+    elif args.jobs != 1:
+        nodes = parallel_perft(position, args.depth, args.jobs)
+    elif args.hash:
+        table = TranspositionTable(args.hash)
+        nodes = hashed_perft(position, args.depth, table)
+        print(f"hash: {table.stats()}")
+    else:
+        nodes = perft(position, args.depth)
+    seconds = time.perf_counter() - start
+    print(f"depth {args.depth}: {nodes:,} nodes in {seconds:.3f}s ({format_rate(nodes, seconds)})")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
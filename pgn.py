@@ -0,0 +1,323 @@
+"""Standard algebraic notation and streaming PGN reading and writing.
+
+Games are read one at a time from any iterable of lines, so a collection
+of any size can be replayed or validated without holding it in memory.
+
+Usage:
+    python pgn.py games.pgn [more.pgn ...] [--output normalized.pgn]
+"""
+
+import argparse
+import re
+import sys
+import time
+
+from position import (
+    BISHOP, KING, KNIGHT, PAWN, QUEEN, ROOK, STARTING_FEN, Position, parse_square, square_name
+)
+
+SAN_LETTERS = {KNIGHT: "N", BISHOP: "B", ROOK: "R", QUEEN: "Q", KING: "K"}
+SAN_PIECES = {letter: piece for piece, letter in SAN_LETTERS.items()}
+SAN_PATTERN = re.compile(r"([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQ]))?")
+CASTLING_SAN = {"O-O": 1, "0-0": 1, "O-O-O": -1, "0-0-0": -1}
+
+RESULTS = ("1-0", "0-1", "1/2-1/2", "*")
+# The tags every PGN game carries, in their required order
+SEVEN_TAG_ROSTER = (
+    ("Event", "?"), ("Site", "?"), ("Date", "????.??.??"), ("Round", "?"),
+    ("White", "?"), ("Black", "?"), ("Result", "*"),
+)
+TAG_PATTERN = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+# Move numbers come first so that "1.e4" splits into "1." and "e4"
+TOKEN_PATTERN = re.compile(r"\d+\.+|\{[^}]*\}?|;.*|\$\d+|[()]|[^\s{}();$.]+")
+
+
+def san(position, move, legal_moves=None):
+    """Return the SAN text ("Nbd7", "exd8=Q+", "O-O") of a legal move in position.
+    
+    legal_moves may be passed in to save regenerating them when naming
+    several moves from the same position.
+    """
+    squares = position.squares
+    from_sq = move & 63
+    to_sq = move >> 6 & 63
+    piece = squares[from_sq] & 7
+    if piece == KING and abs(to_sq - from_sq) == 2:
+        text = "O-O" if to_sq > from_sq else "O-O-O"
+    else:
+        # A pawn changing file always captures, even onto an empty en passant square
+        capture = squares[to_sq] or (piece == PAWN and (to_sq - from_sq) % 8)
+        if piece == PAWN:
+            text = square_name(from_sq)[0] + "x" if capture else ""
+        else:
+            text = SAN_LETTERS[piece]
+            if legal_moves is None:
+                legal_moves = position.generate_legal_moves(position.turn)
+            rivals = [
+                other & 63 for other in legal_moves
+                if other >> 6 & 63 == to_sq and other & 63 != from_sq
+                and squares[other & 63] & 7 == piece
+            ]
+            if rivals:
+                if all(rival % 8 != from_sq % 8 for rival in rivals):
+                    text += square_name(from_sq)[0]
+                elif all(rival // 8 != from_sq // 8 for rival in rivals):
+                    text += square_name(from_sq)[1]
+                else:
+                    text += square_name(from_sq)
+            if capture:
+                text += "x"
+        text += square_name(to_sq)
+        if move >> 12:
+            text += "=" + SAN_LETTERS[move >> 12]
+    position.make_move(move)
+    if position.is_in_check(position.turn):
+        text += "+" if position.has_legal_moves(position.turn) else "#"
+    position.unmake_move()
+    return text
+
+
+def parse_san(position, text, legal_moves=None):
+    """Return the legal move in position that the SAN text names.
+    
+    Check marks and annotations ("+", "#", "!", "?") are ignored.  Raises
+    ValueError if the text names no legal move or more than one.
+    """
+    if legal_moves is None:
+        legal_moves = position.generate_legal_moves(position.turn)
+    squares = position.squares
+    stripped = text.rstrip("+#!?")
+    if stripped in CASTLING_SAN:
+        side = CASTLING_SAN[stripped]
+        matches = [
+            move for move in legal_moves
+            if squares[move & 63] & 7 == KING and (move >> 6 & 63) - (move & 63) == 2 * side
+        ]
+    else:
+        match = SAN_PATTERN.fullmatch(stripped)
+        if match is None:
+            raise ValueError(f"Not a SAN move: {text!r}")
+        letter, from_file, from_rank, target, promotion = match.groups()
+        piece = SAN_PIECES[letter] if letter else PAWN
+        to_sq = parse_square(target)
+        promotion = SAN_PIECES[promotion] if promotion else 0
+        matches = [
+            move for move in legal_moves
+            if move >> 6 & 63 == to_sq and move >> 12 == promotion
+            and squares[move & 63] & 7 == piece
+            and (from_file is None or square_name(move & 63)[0] == from_file)
+            and (from_rank is None or square_name(move & 63)[1] == from_rank)
+        ]
+    if not matches:
+        raise ValueError(f"Illegal move {text!r} in {position.to_fen()}")
+    if len(matches) > 1:
+        raise ValueError(f"Ambiguous move {text!r} in {position.to_fen()}")
+    return matches[0]
+
+
+class Game:
+    """A game read from PGN: its tag pairs, SAN moves and result."""
+    
+    __slots__ = ("headers", "moves", "result")
+    
+    def __init__(self, headers=None, moves=None, result="*"):
+        self.headers = {} if headers is None else headers
+        self.moves = [] if moves is None else moves
+        self.result = result
+    
+    def __repr__(self):
+        return (f"Game({self.headers.get('White', '?')} - {self.headers.get('Black', '?')}, "
+                f"{len(self.moves)} moves, {self.result})")
+    
+    def start_position(self):
+        """Return the position the game starts from (its FEN tag, if any)."""
+        return Position.from_fen(self.headers.get("FEN", STARTING_FEN))
+    
+    def replay(self):
+        """Yield (position, move) for each move, making the move after each yield.
+        
+        The same Position object is yielded every time.  Raises ValueError
+        naming the move number if a move is illegal.
+        """
+        position = self.start_position()
+        for text in self.moves:
+            try:
+                move = parse_san(position, text)
+            except ValueError as error:
+                number = f"{position.fullmove}{'.' if position.turn == 0 else '...'}"
+                raise ValueError(f"move {number} {error}") from None
+            yield position, move
+            position.make_move(move)
+    
+    def final_position(self):
+        """Play through every move and return the resulting position."""
+        position = self.start_position()
+        for position, _ in self.replay():
+            pass
+        return position
+
+
+def read_games(lines):
+    """Yield a Game for each game in an iterable of PGN lines (such as an open file).
+    
+    Comments, NAGs and variations are skipped; only the main line is kept.
+    """
+    game = None
+    in_comment = False
+    depth = 0
+    for line in lines:
+        if in_comment:
+            end = line.find("}")
+            if end < 0:
+                continue
+            line = line[end + 1:]
+            in_comment = False
+        elif line.startswith("["):
+            tag = TAG_PATTERN.match(line)
+            if tag:
+                if game is not None and game.moves:
+                    yield game
+                    game = None
+                if game is None:
+                    game = Game()
+                game.headers[tag.group(1)] = tag.group(2).replace('\\"', '"').replace("\\\\", "\\")
+                continue
+        elif line.startswith("%"):
+            continue  # Escaped line
+        for token in TOKEN_PATTERN.findall(line):
+            first = token[0]
+            if first == "{":
+                in_comment = not token.endswith("}")
+            elif first == "(":
+                depth += 1
+            elif first == ")":
+                depth = max(depth - 1, 0)
+            elif first in ";$" or depth or token[-1] == ".":
+                continue
+            elif token in RESULTS:
+                if game is None:
+                    game = Game()
+                game.result = token
+                yield game
+                game = None
+            else:
+                if game is None:
+                    game = Game()
+                game.moves.append(token)
+    if game is not None and (game.moves or game.headers):
+        yield game
+
+
+def format_game(headers, moves, result=None, width=79):
+    """Return the PGN text of a game given its tags, SAN moves and result.
+    
+    The seven standard tags come first, filled with "?" where missing, and
+    the movetext is wrapped at width columns.
+    """
+    headers = dict(headers)
+    result = result or headers.get("Result", "*")
+    headers["Result"] = result
+    lines = []
+    for name, default in SEVEN_TAG_ROSTER:
+        lines.append(_tag(name, headers.pop(name, default)))
+    lines.extend(_tag(name, value) for name, value in headers.items())
+    lines.append("")
+    
+    fen = headers.get("FEN")
+    ply = 0
+    if fen is not None:
+        position = Position.from_fen(fen)
+        ply = 2 * (position.fullmove - 1) + (position.turn != 0)
+    tokens = []
+    for i, text in enumerate(moves, ply):
+        if i % 2 == 0:
+            tokens.append(f"{i // 2 + 1}. {text}")
+        elif i == ply:
+            tokens.append(f"{i // 2 + 1}... {text}")
+        else:
+            tokens.append(text)
+    tokens.append(result)
+    
+    line = ""
+    for token in tokens:
+        if line and len(line) + 1 + len(token) > width:
+            lines.append(line)
+            line = token
+        else:
+            line = f"{line} {token}" if line else token
+    lines.append(line)
+    return "\n".join(lines) + "\n\n"
+
+
+def _tag(name, value):
+    """Return a PGN tag pair line."""
+    value = str(value).replace("\\", "\\\\").replace('"', '\\"')
+    return f'[{name} "{value}"]'
+
+
+def write_games(out, games):
+    """Write each Game to out, replaying it to normalize its SAN.
+    
+    Returns the number of games written.
+    """
+    count = 0
+    for game in games:
+        sans = [san(position, move) for position, move in game.replay()]
+        out.write(format_game(game.headers, sans, game.result))
+        count += 1
+    return count
+
+
+def _input_lines(paths):
+    """Yield lines from each path in turn ("-" or no paths means stdin)."""
+    if not paths:
+        paths = ["-"]
+    for path in paths:
+        if path == "-":
+            yield from sys.stdin
+        else:
+            with open(path, encoding="utf-8", errors="replace") as handle:
+                yield from handle
+
+
+def main(argv=None):
+    """Command-line entry point: replay every game and report throughput."""
+    parser = argparse.ArgumentParser(description="Validate and normalize PGN game collections.")
+    parser.add_argument("files", nargs="*", help="PGN files to read (default: stdin)")
+    parser.add_argument("--output", help="write the valid games here with normalized SAN")
+    parser.add_argument("--quiet", action="store_true", help="don't report invalid games")
+    args = parser.parse_args(argv)
+    
+    out = open(args.output, "w") if args.output else None
+    games = 0
+    moves = 0
+    errors = 0
+    start = time.perf_counter()
+    try:
+        for number, game in enumerate(read_games(_input_lines(args.files)), 1):
+            games += 1
+            try:
+                if out is not None:
+                    sans = [san(position, move) for position, move in game.replay()]
+                    out.write(format_game(game.headers, sans, game.result))
+                else:
+                    sans = [move for _, move in game.replay()]
+            except ValueError as error:
+                errors += 1
+                if not args.quiet:
+                    print(f"game {number} ({game!r}): {error}", file=sys.stderr)
+                continue
+            moves += len(sans)
+    finally:
+        if out is not None:
+            out.close()
+    seconds = time.perf_counter() - start
+    rates = (f"{games / seconds:,.1f} games/s, {moves / seconds:,.0f} moves/s"
+             if seconds > 0 else "- games/s, - moves/s")
+    print(f"{games:,} games ({errors:,} invalid), {moves:,} moves in {seconds:.3f}s ({rates})",
+          file=sys.stderr)
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
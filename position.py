@@ -0,0 +1,836 @@
+"""Headless chess rules engine.
+
+A position is stored as a 64-entry ``bytearray`` indexed by ``row * 8 + col``,
+with row 0 being Black's back rank (the same orientation the GUI draws), so
+the rules can be imported and run without tkinter.
+"""
+
+import random
+
+from evaluation import SQUARE_SCORES, score_squares
+
+# Piece codes: the low three bits hold the piece type, bit 3 holds the colour
+EMPTY = 0
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 1, 2, 3, 4, 5, 6
+WHITE, BLACK = 0, 8
+
+PIECE_NAMES = (None, "pawn", "knight", "bishop", "rook", "queen", "king")
+PIECE_CODES = {name: code for code, name in enumerate(PIECE_NAMES) if name}
+COLOR_NAMES = {WHITE: "white", BLACK: "black"}
+COLOR_CODES = {"white": WHITE, "black": BLACK}
+
+BACK_RANK = (ROOK, KNIGHT, BISHOP, QUEEN, KING, BISHOP, KNIGHT, ROOK)
+
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+FEN_PIECES = {"p": PAWN, "n": KNIGHT, "b": BISHOP, "r": ROOK, "q": QUEEN, "k": KING}
+FEN_LETTERS = " pnbrqk"
+# King and rook squares behind each FEN castling letter
+CASTLING_SQUARES = {"K": (60, 63), "Q": (60, 56), "k": (4, 7), "q": (4, 0)}
+# (rights bit, unmoved mask) per castling letter, in KQkq order
+CASTLING_MASKS = tuple(
+    (1 << i, 1 << king | 1 << rook) for i, (king, rook) in enumerate(CASTLING_SQUARES.values())
+)
+# Castling moves per king square: (rook square, king target, squares that
+# must be empty, squares the king crosses that must not be attacked)
+CASTLING_PATHS = {
+    60: ((63, 62, (61, 62), (61, 62)), (56, 58, (57, 58, 59), (59, 58))),
+    4: ((7, 6, (5, 6), (5, 6)), (0, 2, (1, 2, 3), (3, 2))),
+}
+
+ROOK_DIRECTIONS = ((0, 1), (1, 0), (0, -1), (-1, 0))
+BISHOP_DIRECTIONS = ((1, 1), (1, -1), (-1, 1), (-1, -1))
+KNIGHT_OFFSETS = (
+    (-2, -1), (-2, 1), (-1, -2), (-1, 2),
+    (1, -2), (1, 2), (2, -1), (2, 1)
+)
+KING_OFFSETS = (
+    (-1, -1), (-1, 0), (-1, 1),
+    (0, -1),           (0, 1),
+    (1, -1),  (1, 0),  (1, 1)
+)
+
+
+def _targets(sq, offsets):
+    """Squares reachable from sq by a single step of each offset."""
+    row, col = divmod(sq, 8)
+    return tuple(
+        (row + dr) * 8 + col + dc
+        for dr, dc in offsets
+        if 0 <= row + dr < 8 and 0 <= col + dc < 8
+    )
+
+
+def _ray(sq, dr, dc):
+    """Squares from sq (exclusive) to the board edge in one direction."""
+    row, col = divmod(sq, 8)
+    ray = []
+    r, c = row + dr, col + dc
+    while 0 <= r < 8 and 0 <= c < 8:
+        ray.append(r * 8 + c)
+        r += dr
+        c += dc
+    return tuple(ray)
+
+
+def _rays(sq, directions):
+    """Non-empty rays from sq for each of the given directions."""
+    return tuple(ray for ray in (_ray(sq, dr, dc) for dr, dc in directions) if ray)
+
+
+# Per-square lookup tables, built once at import time
+KNIGHT_TARGETS = tuple(_targets(sq, KNIGHT_OFFSETS) for sq in range(64))
+KING_TARGETS = tuple(_targets(sq, KING_OFFSETS) for sq in range(64))
+ROOK_RAYS = tuple(_rays(sq, ROOK_DIRECTIONS) for sq in range(64))
+BISHOP_RAYS = tuple(_rays(sq, BISHOP_DIRECTIONS) for sq in range(64))
+QUEEN_RAYS = tuple(ROOK_RAYS[sq] + BISHOP_RAYS[sq] for sq in range(64))
+SLIDER_RAYS = {BISHOP: BISHOP_RAYS, ROOK: ROOK_RAYS, QUEEN: QUEEN_RAYS}
+
+# PAWN_ATTACKS[color >> 3][sq]: squares attacked by a pawn of that colour on sq
+PAWN_ATTACKS = (
+    tuple(_targets(sq, ((-1, -1), (-1, 1))) for sq in range(64)),
+    tuple(_targets(sq, ((1, -1), (1, 1))) for sq in range(64)),
+)
+
+
+# Zobrist keys: one random 64-bit number per (piece code, square) pair,
+# indexed as ZOBRIST_PIECES[piece * 64 + sq], one for Black to move, one per
+# set of castling rights (see castling_rights) and one per en passant file.
+# The generator is seeded so keys are stable between runs and processes.
+_zobrist_random = random.Random(0x5EED)
+ZOBRIST_PIECES = tuple(
+    _zobrist_random.getrandbits(64) if piece & 7 else 0
+    for piece in range(16) for sq in range(64)
+)
+ZOBRIST_BLACK = _zobrist_random.getrandbits(64)
+ZOBRIST_CASTLING = (0,) + tuple(_zobrist_random.getrandbits(64) for _ in range(15))
+ZOBRIST_EP = tuple(_zobrist_random.getrandbits(64) for _ in range(8))
+
+
+def piece_type(piece):
+    """Return the type code (PAWN..KING) of a piece code."""
+    return piece & 7
+
+
+def piece_color(piece):
+    """Return the colour code (WHITE or BLACK) of a piece code."""
+    return piece & 8
+
+
+def opponent(color):
+    """Return the other colour code."""
+    return color ^ BLACK
+
+
+def square_name(sq):
+    """Return the algebraic name ("e4") of a square index."""
+    return chr(97 + sq % 8) + str(8 - sq // 8)
+
+
+def parse_square(name):
+    """Return the square index of an algebraic name ("e4")."""
+    return (8 - int(name[1])) * 8 + ord(name[0]) - 97
+
+
+def castling_rights(unmoved):
+    """Return the castling rights in an unmoved mask as bits (K=1, Q=2, k=4, q=8)."""
+    rights = 0
+    for bit, mask in CASTLING_MASKS:
+        if unmoved & mask == mask:
+            rights |= bit
+    return rights
+
+
+# Moves are plain ints: from square in bits 0-5, to square in bits 6-11 and
+# the promotion piece type (0 for none) in bits 12-14.
+def encode_move(from_sq, to_sq, promotion=0):
+    """Pack a move into an int."""
+    return from_sq | to_sq << 6 | promotion << 12
+
+
+def decode_move(move):
+    """Unpack a move into (from_sq, to_sq, promotion)."""
+    return move & 63, move >> 6 & 63, move >> 12
+
+
+def move_name(move):
+    """Return the long algebraic name ("e7e8q") of a move."""
+    name = square_name(move & 63) + square_name(move >> 6 & 63)
+    if move >> 12:
+        name += "nbrq"[(move >> 12) - KNIGHT]
+    return name
+
+
+def parse_move(name):
+    """Return the move for a long algebraic name ("e7e8q"), raising ValueError if malformed."""
+    if (len(name) not in (4, 5) or name[4:] not in ("", "n", "b", "r", "q")
+            or not all(name[i] in "abcdefgh" and name[i + 1] in "12345678" for i in (0, 2))):
+        raise ValueError(f"Bad move {name!r}")
+    promotion = "nbrq".index(name[4]) + KNIGHT if name[4:] else 0
+    return encode_move(parse_square(name[:2]), parse_square(name[2:4]), promotion)
+
+
+class Position:
+    """A chess position: piece placement, side to move and moved-piece flags.
+    
+    ``unmoved`` is a bitmask of squares whose king or rook has never moved.
+    Pawns need no flag of their own, since a pawn that has not moved is
+    always still on its starting rank.
+    
+    Moves are applied in place with ``make_move`` and taken back with
+    ``unmake_move``; ``stack`` holds one undo record per move made.
+    ``kings`` holds each side's king square (indexed by ``color >> 3``) and
+    is kept up to date by make/unmake, so check detection never has to
+    search the board for a king.  ``key`` is the Zobrist hash of the
+    placement, side to move, castling rights and en passant file, likewise
+    updated move by move.  The en passant file only counts when a pawn can
+    actually capture there, so repeated positions hash alike.
+    
+    ``ep`` is the square a pawn skipped with its last double step (or None),
+    and ``halfmove``/``fullmove`` are the FEN move counters.  ``score`` is the
+    material and piece-square evaluation (see evaluation.py), also kept up
+    to date incrementally.
+    
+    Castling is encoded as the king moving two squares, and en passant as
+    the pawn moving to ``ep``; make/unmake move the rook or remove the
+    captured pawn themselves.
+    """
+    
+    __slots__ = (
+        "squares", "turn", "unmoved", "stack", "kings", "key", "ep", "halfmove", "fullmove",
+        "score"
+    )
+    
+    def __init__(self, squares=None, turn=WHITE, unmoved=0, ep=None, halfmove=0, fullmove=1):
+        self.squares = bytearray(64) if squares is None else bytearray(squares)
+        self.turn = turn
+        self.unmoved = unmoved
+        self.ep = ep
+        self.halfmove = halfmove
+        self.fullmove = fullmove
+        self.stack = []
+        self.kings = [self._locate_king(WHITE), self._locate_king(BLACK)]
+        self.key = self.compute_key()
+        self.score = score_squares(self.squares)
+    
+    @classmethod
+    def initial(cls):
+        """Return the standard starting position."""
+        squares = bytearray(64)
+        for col, kind in enumerate(BACK_RANK):
+            squares[col] = kind | BLACK
+            squares[8 + col] = PAWN | BLACK
+            squares[48 + col] = PAWN | WHITE
+            squares[56 + col] = kind | WHITE
+        unmoved = 0
+        for sq in (0, 4, 7, 56, 60, 63):
+            unmoved |= 1 << sq
+        return cls(squares, WHITE, unmoved)
+    
+    @classmethod
+    def from_fen(cls, fen):
+        """Build a position from a FEN string.
+        
+        Castling rights are recorded as unmoved kings and rooks.  The side
+        to move, castling, en passant and counter fields may be omitted and
+        default to those of a fresh game.  Raises ValueError on bad input.
+        """
+        fields = fen.split()
+        if not fields or len(fields) > 6:
+            raise ValueError(f"FEN needs 1 to 6 fields: {fen!r}")
+        squares = bytearray(64)
+        rows = fields[0].split("/")
+        if len(rows) != 8:
+            raise ValueError(f"FEN placement needs 8 rows: {fen!r}")
+        for row, text in enumerate(rows):
+            col = 0
+            for char in text:
+                if char in "12345678":
+                    col += int(char)
+                    continue
+                if col > 7 or char.lower() not in FEN_PIECES:
+                    raise ValueError(f"Bad FEN row {text!r}: {fen!r}")
+                squares[row * 8 + col] = FEN_PIECES[char.lower()] | (WHITE if char.isupper() else BLACK)
+                col += 1
+            if col != 8:
+                raise ValueError(f"Bad FEN row {text!r}: {fen!r}")
+        
+        side = fields[1] if len(fields) > 1 else "w"
+        if side not in ("w", "b"):
+            raise ValueError(f"Bad FEN side to move {side!r}: {fen!r}")
+        
+        unmoved = 0
+        castling = fields[2] if len(fields) > 2 else "-"
+        if castling != "-":
+            for char in castling:
+                if char not in CASTLING_SQUARES:
+                    raise ValueError(f"Bad FEN castling field {castling!r}: {fen!r}")
+                king_sq, rook_sq = CASTLING_SQUARES[char]
+                color = WHITE if char.isupper() else BLACK
+                # Rights without the king and rook at home cannot be used; drop them
+                if squares[king_sq] == KING | color and squares[rook_sq] == ROOK | color:
+                    unmoved |= 1 << king_sq | 1 << rook_sq
+        
+        ep = None
+        ep_field = fields[3] if len(fields) > 3 else "-"
+        if ep_field != "-":
+            if (len(ep_field) != 2 or ep_field[0] not in "abcdefgh"
+                    or ep_field[1] != ("6" if side == "w" else "3")):
+                raise ValueError(f"Bad FEN en passant square {ep_field!r}: {fen!r}")
+            ep = parse_square(ep_field)
+            # Like castling rights, a square no double step can have produced
+            # is dropped: the pawn that made it must stand just past it
+            behind, victim_sq = (ep - 8, ep + 8) if side == "w" else (ep + 8, ep - 8)
+            victim = PAWN | (BLACK if side == "w" else WHITE)
+            if squares[ep] or squares[behind] or squares[victim_sq] != victim:
+                ep = None
+        
+        try:
+            halfmove = int(fields[4]) if len(fields) > 4 else 0
+            fullmove = int(fields[5]) if len(fields) > 5 else 1
+        except ValueError:
+            raise ValueError(f"Bad FEN move counters: {fen!r}") from None
+        return cls(squares, BLACK if side == "b" else WHITE, unmoved, ep, halfmove, fullmove)
+    
+    def to_fen(self):
+        """Return the FEN string of this position."""
+        rows = []
+        squares = self.squares
+        for row in range(8):
+            text = ""
+            empty = 0
+            for sq in range(row * 8, row * 8 + 8):
+                piece = squares[sq]
+                if not piece:
+                    empty += 1
+                    continue
+                if empty:
+                    text += str(empty)
+                    empty = 0
+                letter = FEN_LETTERS[piece & 7]
+                text += letter.upper() if piece & 8 == WHITE else letter
+            if empty:
+                text += str(empty)
+            rows.append(text)
+        castling = "".join(
+            char for char, (king_sq, rook_sq) in CASTLING_SQUARES.items()
+            if self.unmoved >> king_sq & 1 and self.unmoved >> rook_sq & 1
+        ) or "-"
+        ep = square_name(self.ep) if self.ep is not None else "-"
+        side = "w" if self.turn == WHITE else "b"
+        return f"{'/'.join(rows)} {side} {castling} {ep} {self.halfmove} {self.fullmove}"
+    
+    def copy(self):
+        """Return an independent copy of this position.
+        
+        The undo stack is copied too, so the copy can still spot repetitions
+        of earlier positions and take moves back.
+        """
+        position = Position(
+            self.squares, self.turn, self.unmoved, self.ep, self.halfmove, self.fullmove
+        )
+        position.stack = list(self.stack)
+        return position
+    
+    def compute_key(self):
+        """Compute the Zobrist key of this position from scratch."""
+        key = ZOBRIST_BLACK if self.turn == BLACK else 0
+        for sq, piece in enumerate(self.squares):
+            if piece:
+                key ^= ZOBRIST_PIECES[piece * 64 + sq]
+        key ^= ZOBRIST_CASTLING[castling_rights(self.unmoved)]
+        if self.ep is not None:
+            key ^= self._ep_key()
+        return key
+    
+    def _ep_key(self):
+        """Zobrist term for the en passant square: nonzero only if a pawn can capture there."""
+        ep = self.ep
+        pawn = PAWN | self.turn
+        for source in PAWN_ATTACKS[(self.turn >> 3) ^ 1][ep]:
+            if self.squares[source] == pawn:
+                return ZOBRIST_EP[ep & 7]
+        return 0
+    
+    def piece_at(self, row, col):
+        """Return the piece code on the given square (EMPTY if none)."""
+        return self.squares[row * 8 + col]
+    
+    def has_moved(self, row, col):
+        """Check whether the piece on the given square has moved."""
+        sq = row * 8 + col
+        piece = self.squares[sq]
+        if piece & 7 == PAWN:
+            return row != (6 if piece & 8 == WHITE else 1)
+        return not self.unmoved >> sq & 1
+    
+    def _locate_king(self, color):
+        """Search the board for the given colour's king."""
+        sq = self.squares.find(KING | color)
+        return None if sq < 0 else sq
+    
+    def find_king(self, color):
+        """Return the square index of the given colour's king, or None."""
+        return self.kings[color >> 3]
+    
+    def _pseudo_targets(self, sq):
+        """Target squares for the piece on sq, ignoring check."""
+        squares = self.squares
+        piece = squares[sq]
+        kind = piece & 7
+        color = piece & 8
+        targets = []
+        
+        if kind == PAWN:
+            step = -8 if color == WHITE else 8
+            ahead = sq + step
+            if 0 <= ahead < 64 and not squares[ahead]:
+                targets.append(ahead)
+                # Double step from the starting rank if both squares are empty
+                start_row = 6 if color == WHITE else 1
+                if sq // 8 == start_row and not squares[ahead + step]:
+                    targets.append(ahead + step)
+            for target in PAWN_ATTACKS[color >> 3][sq]:
+                victim = squares[target]
+                if victim:
+                    if victim & 8 != color:
+                        targets.append(target)
+                elif (target == self.ep and color == self.turn
+                        and squares[target + 8 if color == WHITE else target - 8] == PAWN | (color ^ BLACK)):
+                    targets.append(target)
+        elif kind == KNIGHT or kind == KING:
+            table = KNIGHT_TARGETS if kind == KNIGHT else KING_TARGETS
+            for target in table[sq]:
+                victim = squares[target]
+                if not victim or victim & 8 != color:
+                    targets.append(target)
+        else:
+            for ray in SLIDER_RAYS[kind][sq]:
+                for target in ray:
+                    victim = squares[target]
+                    if not victim:
+                        targets.append(target)
+                    else:
+                        if victim & 8 != color:
+                            targets.append(target)
+                        break
+        return targets
+    
+    def _attack_targets(self, sq):
+        """Squares attacked by the piece on sq, including defended friends."""
+        squares = self.squares
+        piece = squares[sq]
+        kind = piece & 7
+        if kind == PAWN:
+            return list(PAWN_ATTACKS[(piece & 8) >> 3][sq])
+        if kind == KNIGHT:
+            return list(KNIGHT_TARGETS[sq])
+        if kind == KING:
+            return list(KING_TARGETS[sq])
+        targets = []
+        for ray in SLIDER_RAYS[kind][sq]:
+            for target in ray:
+                targets.append(target)
+                if squares[target]:  # Stop at any piece (friend or foe)
+                    break
+        return targets
+    
+    def get_possible_moves(self, row, col):
+        """Get (row, col) targets for the piece on a square without checking for check."""
+        if not self.squares[row * 8 + col]:
+            return []
+        return [divmod(target, 8) for target in self._pseudo_targets(row * 8 + col)]
+    
+    def get_attack_squares(self, row, col):
+        """Get (row, col) squares that the piece on a square attacks."""
+        if not self.squares[row * 8 + col]:
+            return []
+        return [divmod(target, 8) for target in self._attack_targets(row * 8 + col)]
+    
+    def is_square_attacked(self, sq, by_color):
+        """Check whether any piece of by_color attacks sq.
+        
+        Rather than generating every enemy piece's attacks, this looks
+        outwards from sq: along the eight lines for sliders and at the few
+        squares a pawn, knight or king could attack it from.
+        """
+        squares = self.squares
+        pawn = PAWN | by_color
+        for source in PAWN_ATTACKS[(by_color >> 3) ^ 1][sq]:
+            if squares[source] == pawn:
+                return True
+        knight = KNIGHT | by_color
+        for source in KNIGHT_TARGETS[sq]:
+            if squares[source] == knight:
+                return True
+        king = KING | by_color
+        for source in KING_TARGETS[sq]:
+            if squares[source] == king:
+                return True
+        queen = QUEEN | by_color
+        rook = ROOK | by_color
+        for ray in ROOK_RAYS[sq]:
+            for source in ray:
+                piece = squares[source]
+                if piece:
+                    if piece == rook or piece == queen:
+                        return True
+                    break
+        bishop = BISHOP | by_color
+        for ray in BISHOP_RAYS[sq]:
+            for source in ray:
+                piece = squares[source]
+                if piece:
+                    if piece == bishop or piece == queen:
+                        return True
+                    break
+        return False
+    
+    def would_be_in_check(self, color):
+        """Check if the given colour's king is attacked in this position."""
+        king = self.kings[color >> 3]
+        if king is None:
+            return False
+        return self.is_square_attacked(king, color ^ BLACK)
+    
+    def is_in_check(self, color):
+        """Check if the given colour's king is in check."""
+        return self.would_be_in_check(color)
+    
+    def make_move(self, move):
+        """Apply an encoded move in place and pass the turn.
+        
+        The undo record saved on ``stack`` holds the move, the captured piece,
+        the previous moved-piece flags, key, en passant square, halfmove
+        counter and score, which is everything ``unmake_move`` needs to
+        restore the position exactly.
+        """
+        squares = self.squares
+        from_sq = move & 63
+        to_sq = move >> 6 & 63
+        piece = squares[from_sq]
+        captured = squares[to_sq]
+        key = self.key
+        unmoved = self.unmoved
+        ep = self.ep
+        score = self.score
+        self.stack.append((move, captured, unmoved, key, ep, self.halfmove, score))
+        key ^= ZOBRIST_PIECES[piece * 64 + from_sq] ^ ZOBRIST_BLACK
+        score -= SQUARE_SCORES[piece * 64 + from_sq]
+        halfmove = self.halfmove + 1
+        if ep is not None:
+            key ^= self._ep_key()
+            self.ep = None
+        kind = piece & 7
+        if kind == KING:
+            self.kings[piece >> 3] = to_sq
+            if to_sq - from_sq == 2 or from_sq - to_sq == 2:
+                # Castling: bring the rook over to the square the king crossed
+                rook_from = to_sq + 1 if to_sq > from_sq else to_sq - 2
+                rook_to = (from_sq + to_sq) >> 1
+                rook = squares[rook_from]
+                squares[rook_from] = EMPTY
+                squares[rook_to] = rook
+                key ^= ZOBRIST_PIECES[rook * 64 + rook_from] ^ ZOBRIST_PIECES[rook * 64 + rook_to]
+                score += SQUARE_SCORES[rook * 64 + rook_to] - SQUARE_SCORES[rook * 64 + rook_from]
+        elif kind == PAWN:
+            halfmove = 0
+            if move >> 12:
+                piece = move >> 12 | (piece & 8)
+            elif to_sq == ep:
+                victim_sq = to_sq + 8 if piece & 8 == WHITE else to_sq - 8
+                key ^= ZOBRIST_PIECES[squares[victim_sq] * 64 + victim_sq]
+                score -= SQUARE_SCORES[squares[victim_sq] * 64 + victim_sq]
+                squares[victim_sq] = EMPTY
+            elif to_sq - from_sq == 16 or from_sq - to_sq == 16:
+                self.ep = (from_sq + to_sq) >> 1
+        if captured:
+            halfmove = 0
+            key ^= ZOBRIST_PIECES[captured * 64 + to_sq]
+            score -= SQUARE_SCORES[captured * 64 + to_sq]
+            if captured & 7 == KING:
+                self.kings[captured >> 3] = None
+        key ^= ZOBRIST_PIECES[piece * 64 + to_sq]
+        self.score = score + SQUARE_SCORES[piece * 64 + to_sq]
+        squares[to_sq] = piece
+        squares[from_sq] = EMPTY
+        if unmoved >> from_sq & 1 or unmoved >> to_sq & 1:
+            self.unmoved = unmoved & ~((1 << from_sq) | (1 << to_sq))
+            key ^= ZOBRIST_CASTLING[castling_rights(unmoved)] ^ ZOBRIST_CASTLING[castling_rights(self.unmoved)]
+        self.halfmove = halfmove
+        if self.turn == BLACK:
+            self.fullmove += 1
+        self.turn ^= BLACK
+        if self.ep is not None:
+            key ^= self._ep_key()
+        self.key = key
+    
+    def unmake_move(self):
+        """Take back the last move made with make_move."""
+        move, captured, self.unmoved, self.key, self.ep, self.halfmove, self.score = self.stack.pop()
+        squares = self.squares
+        from_sq = move & 63
+        to_sq = move >> 6 & 63
+        piece = squares[to_sq]
+        kind = piece & 7
+        if kind == KING:
+            self.kings[piece >> 3] = from_sq
+            if to_sq - from_sq == 2 or from_sq - to_sq == 2:
+                rook_from = to_sq + 1 if to_sq > from_sq else to_sq - 2
+                rook_to = (from_sq + to_sq) >> 1
+                squares[rook_from] = squares[rook_to]
+                squares[rook_to] = EMPTY
+        elif move >> 12:
+            piece = PAWN | (piece & 8)
+        elif kind == PAWN and to_sq == self.ep:
+            # En passant: put back the pawn that was taken beside the target
+            if piece & 8 == WHITE:
+                squares[to_sq + 8] = PAWN | BLACK
+            else:
+                squares[to_sq - 8] = PAWN | WHITE
+        if captured & 7 == KING:
+            self.kings[captured >> 3] = to_sq
+        squares[from_sq] = piece
+        squares[to_sq] = captured
+        self.turn ^= BLACK
+        if self.turn == BLACK:
+            self.fullmove -= 1
+    
+    def move(self, from_sq, to_sq, promotion=QUEEN):
+        """Move a piece, promoting pawns that reach the last rank, and pass the turn."""
+        if self.squares[from_sq] & 7 != PAWN or to_sq // 8 not in (0, 7):
+            promotion = 0
+        self.make_move(encode_move(from_sq, to_sq, promotion))
+    
+    def generate_moves(self, color):
+        """Return encoded pseudo-legal moves for every piece of the given colour."""
+        squares = self.squares
+        moves = []
+        for sq in range(64):
+            piece = squares[sq]
+            if not piece or piece & 8 != color:
+                continue
+            promoting = piece & 7 == PAWN and sq // 8 == (1 if color == WHITE else 6)
+            for target in self._pseudo_targets(sq):
+                if promoting:
+                    for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                        moves.append(sq | target << 6 | promotion << 12)
+                else:
+                    moves.append(sq | target << 6)
+        return moves
+    
+    def _pins_and_checks(self, color):
+        """Find what restricts the given colour's moves in this position.
+        
+        Returns ``(checks, block, pins)``: the number of pieces giving check,
+        the squares a non-king move must land on to answer a single check
+        (the checker and the squares between it and the king), and a dict
+        mapping each pinned piece's square to the line it may move along.
+        """
+        squares = self.squares
+        king = self.kings[color >> 3]
+        if king is None:
+            return 0, None, {}
+        enemy = color ^ BLACK
+        queen = QUEEN | enemy
+        checks = 0
+        block = None
+        pins = {}
+        for rays, slider in ((ROOK_RAYS[king], ROOK | enemy), (BISHOP_RAYS[king], BISHOP | enemy)):
+            for ray in rays:
+                shield = None
+                for i, sq in enumerate(ray):
+                    piece = squares[sq]
+                    if not piece:
+                        continue
+                    if piece & 8 == color:
+                        if shield is not None:
+                            break  # Two friendly pieces: nothing is pinned here
+                        shield = sq
+                        continue
+                    if piece == slider or piece == queen:
+                        line = set(ray[:i + 1])
+                        if shield is None:
+                            checks += 1
+                            block = line
+                        else:
+                            pins[shield] = line
+                    break
+        pawn = PAWN | enemy
+        for sq in PAWN_ATTACKS[color >> 3][king]:
+            if squares[sq] == pawn:
+                checks += 1
+                block = {sq}
+        knight = KNIGHT | enemy
+        for sq in KNIGHT_TARGETS[king]:
+            if squares[sq] == knight:
+                checks += 1
+                block = {sq}
+        return checks, block, pins
+    
+    def _king_targets(self, king, color):
+        """Legal target squares for the king on the given square, castling included."""
+        squares = self.squares
+        enemy = color ^ BLACK
+        targets = []
+        # Lift the king off the board so sliders attack through its square
+        squares[king] = EMPTY
+        for target in KING_TARGETS[king]:
+            victim = squares[target]
+            if (not victim or victim & 8 != color) and not self.is_square_attacked(target, enemy):
+                targets.append(target)
+        unmoved = self.unmoved
+        if unmoved >> king & 1 and king in CASTLING_PATHS and not self.is_square_attacked(king, enemy):
+            for rook, target, empty, crossed in CASTLING_PATHS[king]:
+                if (unmoved >> rook & 1
+                        and not any(squares[sq] for sq in empty)
+                        and not any(self.is_square_attacked(sq, enemy) for sq in crossed)):
+                    targets.append(target)
+        squares[king] = KING | color
+        return targets
+    
+    def _en_passant_is_legal(self, sq):
+        """Check whether the pawn on sq may capture en passant without exposing its king.
+        
+        Two pawns leave the board's rank at once, which pin detection does not
+        model, so the capture is simply tried on the squares and undone.
+        """
+        squares = self.squares
+        pawn = squares[sq]
+        color = pawn & 8
+        king = self.kings[color >> 3]
+        if king is None:
+            return True
+        ep = self.ep
+        victim_sq = ep + 8 if color == WHITE else ep - 8
+        victim = squares[victim_sq]
+        squares[sq] = squares[victim_sq] = EMPTY
+        squares[ep] = pawn
+        legal = not self.is_square_attacked(king, color ^ BLACK)
+        squares[ep] = EMPTY
+        squares[sq] = pawn
+        squares[victim_sq] = victim
+        return legal
+    
+    def _legal_targets(self, sq, restrictions=None):
+        """Target squares for the piece on sq that do not leave its king in check."""
+        squares = self.squares
+        color = squares[sq] & 8
+        if sq == self.kings[color >> 3]:
+            return self._king_targets(sq, color)
+        checks, block, pins = restrictions or self._pins_and_checks(color)
+        if checks > 1:
+            return []
+        targets = self._pseudo_targets(sq)
+        ep = self.ep
+        en_passant = ep is not None and squares[sq] & 7 == PAWN and ep in targets
+        if en_passant:
+            targets.remove(ep)  # Judged on its own below
+        if block is not None:
+            targets = [target for target in targets if target in block]
+        if sq in pins:
+            line = pins[sq]
+            targets = [target for target in targets if target in line]
+        if en_passant and self._en_passant_is_legal(sq):
+            targets.append(ep)
+        return targets
+    
+    def get_legal_moves(self, row, col):
+        """Get (row, col) targets for the piece on a square, considering check rules."""
+        if not self.squares[row * 8 + col]:
+            return []
+        return [divmod(target, 8) for target in self._legal_targets(row * 8 + col)]
+    
+    def generate_legal_moves(self, color):
+        """Return encoded legal moves for the given colour in a single pass.
+        
+        Pins and checks are worked out once up front, so no candidate move
+        has to be tried on the board.
+        """
+        squares = self.squares
+        king = self.kings[color >> 3]
+        checks, block, pins = restrictions = self._pins_and_checks(color)
+        moves = []
+        if king is not None:
+            moves = [king | target << 6 for target in self._king_targets(king, color)]
+            if checks > 1:
+                return moves
+        last_rank = 1 if color == WHITE else 6
+        for sq in range(64):
+            piece = squares[sq]
+            if not piece or piece & 8 != color or sq == king:
+                continue
+            targets = self._legal_targets(sq, restrictions)
+            if piece & 7 == PAWN and sq // 8 == last_rank:
+                for target in targets:
+                    for promotion in (QUEEN, ROOK, BISHOP, KNIGHT):
+                        moves.append(sq | target << 6 | promotion << 12)
+            else:
+                for target in targets:
+                    moves.append(sq | target << 6)
+        return moves
+    
+    def has_legal_moves(self, color):
+        """Check whether the given colour has any legal move, stopping at the first one."""
+        squares = self.squares
+        king = self.kings[color >> 3]
+        if king is not None and self._king_targets(king, color):
+            return True
+        restrictions = self._pins_and_checks(color)
+        if restrictions[0] > 1:
+            return False
+        for sq in range(64):
+            piece = squares[sq]
+            if piece and piece & 8 == color and sq != king and self._legal_targets(sq, restrictions):
+                return True
+        return False
+    
+    def status(self, color):
+        """Return "checkmate", "stalemate", "repetition", "fifty-move", "check" or None.
+        
+        Check and move availability are each worked out once, so callers that
+        need both the mate and stalemate answers should use this.  The draw
+        results only apply when color is the side to move.
+        """
+        in_check = self.is_in_check(color)
+        if self.has_legal_moves(color):
+            return self.draw_status(color) or ("check" if in_check else None)
+        return "checkmate" if in_check else "stalemate"
+    
+    def draw_status(self, color=None):
+        """Return "repetition" or "fifty-move" if the side to move may claim a draw, else None."""
+        if color is not None and color != self.turn:
+            return None
+        if self.halfmove >= 100:
+            return "fifty-move"
+        if self.is_repetition():
+            return "repetition"
+        return None
+    
+    def is_repetition(self, times=3):
+        """Check whether the current position has occurred times times (counting now).
+        
+        Earlier positions are found through the keys on the undo stack.  Only
+        positions since the last capture or pawn move can match, and only
+        every other one has the same side to move.
+        """
+        key = self.key
+        stack = self.stack
+        count = 1
+        for i in range(len(stack) - 2, max(len(stack) - self.halfmove, 0) - 1, -2):
+            if stack[i][3] == key:
+                count += 1
+                if count >= times:
+                    return True
+        return False
+    
+    def is_fifty_move_draw(self):
+        """Check whether fifty moves by each side have passed without a capture or pawn move."""
+        return self.halfmove >= 100
+    
+    def is_checkmate(self, color):
+        """Check if the given colour is in checkmate."""
+        return self.is_in_check(color) and not self.has_legal_moves(color)
+    
+    def is_stalemate(self, color):
+        """Check if the given colour is in stalemate (not in check but no legal moves)."""
+        return not self.is_in_check(color) and not self.has_legal_moves(color)
@@ -0,0 +1,297 @@
+"""Alpha-beta game tree search for the built-in engine player.
+
+The searcher is a negamax alpha-beta with iterative deepening, a
+transposition table, quiescence search over captures and move ordering by
+hash move, MVV-LVA, killer moves and the history heuristic.  It works on a
+Position in place with make/unmake, so callers that keep using their
+position elsewhere (such as the GUI thread) should hand it a copy.
+"""
+
+import threading
+import time
+
+from evaluation import PIECE_VALUES, evaluate
+from position import QUEEN, move_name
+from transposition import TranspositionTable
+
+MATE = 100000
+# Scores beyond this are mates, stored in the table relative to the node
+MATE_BOUND = MATE - 1000
+INFINITY = MATE + 1
+
+EXACT, LOWER, UPPER = 0, 1, 2
+MAX_PLY = 128
+
+
+class SearchAborted(Exception):
+    """Raised inside the search when the time budget runs out or stop() is called."""
+
+
+class SearchResult:
+    """Outcome of a search: best move, its score and search statistics."""
+    
+    __slots__ = ("move", "score", "depth", "nodes", "seconds", "pv")
+    
+    def __init__(self, move, score, depth, nodes, seconds, pv):
+        self.move = move
+        self.score = score
+        self.depth = depth
+        self.nodes = nodes
+        self.seconds = seconds
+        self.pv = pv
+    
+    @property
+    def nps(self):
+        """Nodes searched per second."""
+        return self.nodes / self.seconds if self.seconds > 0 else 0.0
+    
+    def __repr__(self):
+        move = move_name(self.move) if self.move is not None else None
+        return (f"SearchResult(move={move}, score={self.score}, depth={self.depth}, "
+                f"nodes={self.nodes}, nps={self.nps:.0f})")
+
+
+class Searcher:
+    """Iterative-deepening negamax searcher with its own transposition table.
+    
+    If an OpeningBook is given, positions found in it are answered with a
+    book move (a result of depth 0) instead of being searched.  With
+    Tablebases, nodes below the root that a table covers are scored
+    exactly from it instead of being searched further.
+    """
+    
+    def __init__(self, table=None, book=None, tablebases=None):
+        self.table = table if table is not None else TranspositionTable(16)
+        self.book = book
+        self.tablebases = tablebases
+        self.position = None
+        self.nodes = 0
+        self.deadline = None
+        self.stop_event = threading.Event()  # That of the current (or last) search
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = {}
+    
+    def stop(self):
+        """Ask a running search to finish as soon as possible.
+        
+        Safe to call from another thread; the best move of the last
+        completed iteration is still returned.  A search that has not
+        started yet is not affected: give it a stop_event to cancel it
+        before it begins.
+        """
+        self.stop_event.set()
+    
+    def search(self, position, max_depth=64, time_limit=None, on_iteration=None, stop_event=None):
+        """Search position and return a SearchResult.
+        
+        Deepens one ply at a time until max_depth or time_limit (seconds) is
+        reached.  on_iteration, if given, is called with the SearchResult of
+        every completed depth.  stop_event, a threading.Event made when the
+        search is requested, stops it once set, even if set before the
+        search got to run.
+        """
+        self.position = position
+        self.nodes = 0
+        self.stop_event = stop_event if stop_event is not None else threading.Event()
+        self.killers = [[None, None] for _ in range(MAX_PLY)]
+        self.history = {}
+        self.table.new_generation()
+        start = time.perf_counter()
+        self.deadline = start + time_limit if time_limit else None
+        root_moves = position.generate_legal_moves(position.turn)
+        root_ply = len(position.stack)
+        result = SearchResult(root_moves[0] if root_moves else None, 0, 0, 0, 0.0, [])
+        if len(root_moves) <= 1:
+            return result
+        if self.book is not None:
+            move = self.book.choose(position)
+            if move is not None:
+                return SearchResult(move, 0, 0, 0, time.perf_counter() - start, [move])
+        
+        for depth in range(1, max_depth + 1):
+            try:
+                score = self._negamax(depth, -INFINITY, INFINITY, 0)
+            except SearchAborted:
+                while len(position.stack) > root_ply:
+                    position.unmake_move()
+                break
+            pv = self._principal_variation(depth)
+            elapsed = time.perf_counter() - start
+            if pv:
+                result = SearchResult(pv[0], score, depth, self.nodes, elapsed, pv)
+            if on_iteration is not None:
+                on_iteration(result)
+            if abs(score) > MATE_BOUND:
+                break  # A forced mate will not get any shorter by searching deeper
+            # Another iteration costs several times this one; don't start what can't finish
+            if self.deadline is not None and elapsed * 2 > time_limit:
+                break
+        result.nodes = self.nodes
+        result.seconds = time.perf_counter() - start
+        return result
+    
+    def _check_limits(self):
+        if self.stop_event.is_set() or (self.deadline is not None and time.perf_counter() > self.deadline):
+            raise SearchAborted()
+    
+    def _principal_variation(self, depth):
+        """Follow hash moves from the root to recover the principal variation."""
+        position = self.position
+        pv = []
+        for _ in range(depth):
+            entry = self.table.get(position.key)
+            if entry is None or entry[3] is None:
+                break
+            move = entry[3]
+            if move not in position.generate_legal_moves(position.turn):
+                break
+            pv.append(move)
+            position.make_move(move)
+        for _ in pv:
+            position.unmake_move()
+        return pv
+    
+    def _order(self, moves, hash_move, ply):
+        """Sort moves: hash move, captures by MVV-LVA, killers, then history."""
+        squares = self.position.squares
+        killers = self.killers[ply]
+        history = self.history
+        
+        def score(move):
+            if move == hash_move:
+                return 1 << 30
+            victim = squares[move >> 6 & 63]
+            if victim or move >> 12:
+                attacker = squares[move & 63] & 7
+                return (1 << 20) + PIECE_VALUES[victim & 7] * 16 - attacker + PIECE_VALUES[move >> 12 & 7]
+            if move == killers[0]:
+                return 1 << 19
+            if move == killers[1]:
+                return (1 << 19) - 1
+            return history.get(move, 0)
+        
+        moves.sort(key=score, reverse=True)
+        return moves
+    
+    def _negamax(self, depth, alpha, beta, ply):
+        position = self.position
+        self.nodes += 1
+        if not self.nodes & 1023:
+            self._check_limits()
+        if ply and (position.halfmove >= 100 or position.is_repetition(2)):
+            return 0  # Treat a repetition as a draw: the side ahead won't repeat
+        if ply and self.tablebases is not None:
+            found = self.tablebases.probe(position)
+            if found is not None:
+                return _tablebase_score(found, ply)
+        if depth <= 0:
+            return self._quiescence(alpha, beta, ply)
+        
+        key = position.key
+        original_alpha = alpha
+        hash_move = None
+        entry = self.table.get(key)
+        if entry is not None:
+            stored_depth, stored_score, flag, hash_move = entry
+            if stored_depth >= depth and ply > 0:
+                stored_score = _score_from_table(stored_score, ply)
+                if flag == EXACT:
+                    return stored_score
+                if flag == LOWER and stored_score >= beta:
+                    return stored_score
+                if flag == UPPER and stored_score <= alpha:
+                    return stored_score
+        
+        moves = position.generate_legal_moves(position.turn)
+        if not moves:
+            return -MATE + ply if position.is_in_check(position.turn) else 0
+        
+        best_score = -INFINITY
+        best_move = None
+        squares = position.squares
+        for move in self._order(moves, hash_move, ply):
+            quiet = not squares[move >> 6 & 63] and not move >> 12
+            position.make_move(move)
+            score = -self._negamax(depth - 1, -beta, -alpha, ply + 1)
+            position.unmake_move()
+            if score > best_score:
+                best_score = score
+                best_move = move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        if quiet:
+                            killers = self.killers[ply]
+                            if killers[0] != move:
+                                killers[1] = killers[0]
+                                killers[0] = move
+                            self.history[move] = self.history.get(move, 0) + depth * depth
+                        break
+        
+        if best_score <= original_alpha:
+            flag = UPPER
+        elif best_score >= beta:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.table.put(key, (depth, _score_to_table(best_score, ply), flag, best_move), depth)
+        return best_score
+    
+    def _quiescence(self, alpha, beta, ply):
+        """Search captures and promotions only, until the position is quiet."""
+        position = self.position
+        self.nodes += 1
+        if not self.nodes & 1023:
+            self._check_limits()
+        stand_pat = evaluate(position)
+        if stand_pat >= beta or ply >= MAX_PLY - 1:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+        squares = position.squares
+        captures = [
+            move for move in position.generate_legal_moves(position.turn)
+            if squares[move >> 6 & 63] or move >> 12 == QUEEN
+        ]
+        for move in self._order(captures, None, ply):
+            position.make_move(move)
+            score = -self._quiescence(-beta, -alpha, ply + 1)
+            position.unmake_move()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+
+def _tablebase_score(found, ply):
+    """Turn a tablebase (wdl, plies to mate) into a search score at ply."""
+    wdl, plies = found
+    if wdl > 0:
+        return MATE - ply - plies
+    if wdl < 0:
+        return -MATE + ply + plies
+    return 0
+
+
+def _score_to_table(score, ply):
+    """Make mate scores relative to the current node before storing them."""
+    if score > MATE_BOUND:
+        return score + ply
+    if score < -MATE_BOUND:
+        return score - ply
+    return score
+
+
+def _score_from_table(score, ply):
+    """Turn a stored mate score back into one relative to the root."""
+    if score > MATE_BOUND:
+        return score - ply
+    if score < -MATE_BOUND:
+        return score + ply
+    return score
+
+
+def best_move(position, time_limit=1.0, max_depth=64):
+    """Convenience wrapper: search a copy of position and return the best move."""
+    return Searcher().search(position.copy(), max_depth, time_limit).move
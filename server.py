@@ -0,0 +1,335 @@
+"""Many concurrent games in one process behind an asyncio line-protocol server.
+
+Each game is just a Position plus its current legal moves, so a server
+holds thousands of them cheaply.  Clients talk over TCP or a Unix socket,
+one command per line and one reply per line, in order:
+    
+    new [FEN]          ok ID
+    move ID MOVE       ok SAN STATUS   (MOVE like e2e4 or e7e8q; STATUS is -,
+                                        check, checkmate, stalemate, repetition
+                                        or fifty-move)
+    legal ID           ok MOVE ...
+    fen ID             ok FEN
+    close ID           ok
+    stats              ok games=N moves=N ticks=N largest_batch=N
+
+Failures reply "error MESSAGE".  Clients may pipeline commands.  Moves are
+not played as they arrive: they are queued and played together once per
+event-loop tick, so a busy server plays a whole batch of moves from many
+games in one pass.
+
+Usage:
+    python server.py serve [--host HOST] [--port N | --unix PATH]
+    python server.py load [--host HOST] [--port N | --unix PATH] [--spawn]
+                          [--connections N] [--games N] [--plies N] [--rounds N]
+"""
+
+import argparse
+import asyncio
+import random
+import subprocess
+import sys
+import time
+from collections import deque
+
+from pgn import san
+from position import Position, move_name, parse_move
+
+DEFAULT_PORT = 8765
+
+
+class Game:
+    """One hosted game: its position and the legal moves of the side to move."""
+    
+    __slots__ = ("position", "legal")
+    
+    def __init__(self, position):
+        self.position = position
+        self.legal = position.generate_legal_moves(position.turn)
+
+
+class GameServer:
+    """Holds the games and answers protocol commands for every connection."""
+    
+    def __init__(self):
+        self.games = {}
+        self.next_id = 1
+        self.pending = []
+        self.moves = 0
+        self.ticks = 0
+        self.largest_batch = 0
+    
+    async def handle(self, reader, writer):
+        """Serve one connection: read commands and queue their replies in order."""
+        replies = asyncio.Queue()
+        sender = asyncio.ensure_future(self._send(replies, writer))
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                replies.put_nowait(self.dispatch(line.decode("ascii", "replace").split()))
+        except ConnectionError:
+            pass
+        finally:
+            replies.put_nowait(None)
+            await sender
+            writer.close()
+    
+    async def _send(self, replies, writer):
+        """Write replies in command order, waiting for queued moves to be played."""
+        try:
+            while True:
+                reply = await replies.get()
+                if reply is None:
+                    break
+                if not isinstance(reply, str):
+                    reply = await reply
+                writer.write(reply.encode("ascii") + b"\n")
+                if replies.empty():
+                    await writer.drain()
+        except ConnectionError:
+            pass
+    
+    def dispatch(self, words):
+        """Answer one command; moves are answered with a future resolved on the next tick."""
+        if not words:
+            return "error empty command"
+        command, arguments = words[0], words[1:]
+        if command == "new":
+            try:
+                position = Position.from_fen(" ".join(arguments)) if arguments else Position.initial()
+            except ValueError as error:
+                return f"error {error}"
+            game_id = self.next_id
+            self.next_id += 1
+            self.games[game_id] = Game(position)
+            return f"ok {game_id}"
+        if command == "stats":
+            return (f"ok games={len(self.games)} moves={self.moves} ticks={self.ticks} "
+                    f"largest_batch={self.largest_batch}")
+        if command not in ("move", "legal", "fen", "close"):
+            return f"error unknown command {command!r}"
+        if len(arguments) != (2 if command == "move" else 1):
+            return f"error usage: {command} ID{' MOVE' if command == 'move' else ''}"
+        try:
+            game_id = int(arguments[0])
+        except ValueError:
+            return f"error bad game id {arguments[0]!r}"
+        if game_id not in self.games:
+            return f"error no game {game_id}"
+        if command == "move":
+            return self.submit(game_id, arguments[1])
+        if command == "legal":
+            return "ok " + " ".join(move_name(move) for move in self.games[game_id].legal)
+        if command == "fen":
+            return "ok " + self.games[game_id].position.to_fen()
+        del self.games[game_id]
+        return "ok"
+    
+    def submit(self, game_id, text):
+        """Queue a move for the next batch and return a future for its reply."""
+        loop = asyncio.get_running_loop()
+        if not self.pending:
+            loop.call_soon(self.play_batch)
+        future = loop.create_future()
+        self.pending.append((game_id, text, future))
+        return future
+    
+    def play_batch(self):
+        """Play every move queued since the last tick, in arrival order."""
+        batch, self.pending = self.pending, []
+        self.ticks += 1
+        self.largest_batch = max(self.largest_batch, len(batch))
+        for game_id, text, future in batch:
+            if not future.cancelled():
+                future.set_result(self.play(game_id, text))
+    
+    def play(self, game_id, text):
+        """Validate and play one move; return the reply line."""
+        game = self.games.get(game_id)
+        if game is None:
+            return f"error no game {game_id}"  # Closed while the move was queued
+        try:
+            move = parse_move(text)
+        except ValueError as error:
+            return f"error {error}"
+        legal = game.legal
+        if move not in legal:
+            return f"error illegal move {text}"
+        position = game.position
+        move_text = san(position, move, legal)
+        position.make_move(move)
+        game.legal = legal = position.generate_legal_moves(position.turn)
+        if legal:
+            status = position.draw_status() or ("check" if position.is_in_check(position.turn) else "-")
+        else:
+            status = "checkmate" if position.is_in_check(position.turn) else "stalemate"
+        self.moves += 1
+        return f"ok {move_text} {status}"
+
+
+async def serve(host="127.0.0.1", port=DEFAULT_PORT, unix=None, ready=None):
+    """Run a GameServer until cancelled; ready(), if given, is called once listening."""
+    game_server = GameServer()
+    if unix:
+        server = await asyncio.start_unix_server(game_server.handle, unix)
+    else:
+        server = await asyncio.start_server(game_server.handle, host, port)
+    if ready is not None:
+        ready()
+    async with server:
+        await server.serve_forever()
+
+
+class Connection:
+    """Client side of the protocol with pipelining: replies are matched to requests in order."""
+    
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+        self.waiting = deque()
+        self.receiver = asyncio.ensure_future(self._receive())
+    
+    @classmethod
+    async def open(cls, host="127.0.0.1", port=DEFAULT_PORT, unix=None):
+        """Connect to a server."""
+        if unix:
+            reader, writer = await asyncio.open_unix_connection(unix)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        return cls(reader, writer)
+    
+    async def _receive(self):
+        while True:
+            line = await self.reader.readline()
+            if not line:
+                break
+            self.waiting.popleft().set_result(line.decode("ascii").split())
+        for future in self.waiting:
+            future.set_exception(ConnectionError("server closed the connection"))
+    
+    async def request(self, line):
+        """Send one command and return the words of its reply after "ok"; raise on "error"."""
+        future = asyncio.get_running_loop().create_future()
+        self.waiting.append(future)
+        self.writer.write(line.encode("ascii") + b"\n")
+        reply = await future
+        if reply[:1] != ["ok"]:
+            raise RuntimeError(" ".join(reply))
+        return reply[1:]
+    
+    async def close(self):
+        """Close the connection."""
+        self.writer.close()
+        await self.writer.wait_closed()
+        self.receiver.cancel()
+
+
+async def _play_games(connection, rounds, plies, rng, latencies):
+    """Play rounds random games of up to plies moves each; return the moves played."""
+    moves = 0
+    for _ in range(rounds):
+        game_id = (await connection.request("new"))[0]
+        legal = await connection.request(f"legal {game_id}")
+        for _ in range(plies):
+            if not legal:
+                break
+            start = time.perf_counter()
+            _, status = await connection.request(f"move {game_id} {rng.choice(legal)}")
+            latencies.append(time.perf_counter() - start)
+            moves += 1
+            if status not in ("-", "check"):
+                break
+            legal = await connection.request(f"legal {game_id}")
+        await connection.request(f"close {game_id}")
+    return moves
+
+
+async def load(host="127.0.0.1", port=DEFAULT_PORT, unix=None, connections=50, games=1000,
+               plies=40, rounds=1, seed=0, out=sys.stdout):
+    """Play games concurrently against a server and report moves/s and move latency."""
+    rng = random.Random(seed)
+    links = [await Connection.open(host, port, unix) for _ in range(connections)]
+    latencies = []
+    start = time.perf_counter()
+    moves = await asyncio.gather(*(
+        _play_games(links[number % connections], rounds, plies, random.Random(rng.random()), latencies)
+        for number in range(games)
+    ))
+    seconds = time.perf_counter() - start
+    stats = await links[0].request("stats")
+    for link in links:
+        await link.close()
+    latencies.sort()
+    total = sum(moves)
+    print(f"{games:,} games over {connections} connections: {total:,} moves in {seconds:.2f}s "
+          f"({total / seconds:,.0f} moves/s)", file=out)
+    if latencies:
+        print(f"move latency p50 {latencies[len(latencies) // 2] * 1e3:.2f} ms, "
+              f"p99 {latencies[len(latencies) * 99 // 100] * 1e3:.2f} ms, "
+              f"max {latencies[-1] * 1e3:.2f} ms", file=out)
+    print("server " + " ".join(stats), file=out)
+    return total
+
+
+async def _wait_for_server(host, port, unix, timeout=10.0):
+    """Retry connecting until a freshly started server accepts connections."""
+    deadline = time.perf_counter() + timeout
+    while True:
+        try:
+            connection = await Connection.open(host, port, unix)
+        except OSError:
+            if time.perf_counter() > deadline:
+                raise
+            await asyncio.sleep(0.05)
+        else:
+            await connection.close()
+            return
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Host many games over a line protocol.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    for name, text in (("serve", "run the server"), ("load", "play random games against a server")):
+        command = commands.add_parser(name, help=text)
+        command.add_argument("--host", default="127.0.0.1", help="address (default: 127.0.0.1)")
+        command.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"TCP port (default: {DEFAULT_PORT})")
+        command.add_argument("--unix", metavar="PATH", help="use a Unix socket instead of TCP")
+    # The rest are for load only
+    command.add_argument("--spawn", action="store_true", help="start a server process for the run")
+    command.add_argument("--connections", type=int, default=50, help="client connections (default: 50)")
+    command.add_argument("--games", type=int, default=1000, help="concurrent games (default: 1000)")
+    command.add_argument("--plies", type=int, default=40, help="most moves per game (default: 40)")
+    command.add_argument("--rounds", type=int, default=1, help="games each player plays in turn (default: 1)")
+    command.add_argument("--seed", type=int, default=0, help="random seed (default: 0)")
+    args = parser.parse_args(argv)
+    
+    if args.command == "serve":
+        where = args.unix or f"{args.host}:{args.port}"
+        try:
+            asyncio.run(serve(args.host, args.port, args.unix,
+                              ready=lambda: print(f"serving on {where}", file=sys.stderr)))
+        except KeyboardInterrupt:
+            pass
+        return 0
+    
+    server = None
+    if args.spawn:
+        address = ["--unix", args.unix] if args.unix else ["--host", args.host, "--port", str(args.port)]
+        server = subprocess.Popen([sys.executable, __file__, "serve"] + address)
+    try:
+        if server is not None:
+            asyncio.run(_wait_for_server(args.host, args.port, args.unix))
+        asyncio.run(load(args.host, args.port, args.unix, args.connections, args.games,
+                         args.plies, args.rounds, args.seed))
+    finally:
+        if server is not None:
+            server.terminate()
+            server.wait()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
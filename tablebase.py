@@ -0,0 +1,605 @@
+"""Endgame tablebases for small material sets, built by retrograde analysis.
+
+A table covers one material set, named White's pieces then Black's with the
+stronger side first ("KQK", "KRK", "KPK", "KQKR").  Every placement of its
+pieces with either side to move has a fixed index, so a probe is a direct
+array lookup.  Each entry is a signed 16-bit value: plies to mate + 1 if the
+side to move wins, minus that if it loses, and 0 for a draw (or an
+impossible placement).  Positions with the colours reversed are probed
+through the mirrored table.
+
+Placements are folded by board symmetry before indexing: the white king is
+brought into a 10-square triangle (a1-d1-d4) by one of the eight reflections
+and rotations, or onto the a-d files by a left-right mirror when there are
+pawns.  That makes a table 2 * 10 * 64**(pieces - 1) entries without pawns
+and 2 * 32 * 64**(pieces - 1) with them.
+
+Generation works in two steps.  Worker processes share out the indices and
+generate the legal moves of each position, counting the distinct successors
+inside the table and collecting the already-known values of successors in
+smaller tables (after a capture or promotion).  The parent process then
+works backwards from the mates, one ply at a time, to give every decided
+position its distance to mate.  Predecessors are not stored: the workers
+find them for each newly decided batch by generating un-moves.  Whatever is
+left undecided is a draw.
+
+Everything is pure Python, so time goes as the number of entries: on one
+core a three-piece table takes about 4 (KQK, KRK) to 12 seconds (KPK), and
+a four-piece set such as KQKR about six minutes and a few hundred MB, less
+time with --jobs on more cores.  En passant and castling are ignored, which
+only matters for pawn-against-pawn sets.
+
+Usage:
+    python tablebase.py generate KQK KRK KPK [--dir DIR] [--jobs N]
+    python tablebase.py probe [--fen FEN] [--dir DIR]
+"""
+
+import argparse
+import os
+import struct
+import sys
+import time
+from array import array
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+from position import (
+    BISHOP, BLACK, KING, KING_TARGETS, KNIGHT, KNIGHT_TARGETS, PAWN, QUEEN, ROOK, SLIDER_RAYS, WHITE,
+    Position,
+)
+
+MAGIC = b"CHTB"
+VERSION = 2
+# magic, format version, piece count, material name (padded)
+FILE_HEADER = struct.Struct("<4sHH8s")
+MAX_PIECES = 4
+
+LETTERS = {KING: "K", QUEEN: "Q", ROOK: "R", BISHOP: "B", KNIGHT: "N", PAWN: "P"}
+PIECES = {letter: kind for kind, letter in LETTERS.items()}
+ORDER = "KQRBNP"
+LETTER_VALUES = {"K": 0, "Q": 9, "R": 5, "B": 3, "N": 3, "P": 1}
+# Material that can never deliver mate: always a draw, no table needed
+DRAWN_MATERIAL = frozenset(("KK", "KBK", "KNK"))
+
+# What the generation workers report for each index
+INVALID, NORMAL, MATED, STALEMATE = 0, 1, 2, 3
+# Batches of fewer newly decided positions are un-moved without the pool
+POOL_BATCH = 2000
+
+
+def _symmetry(flip_files, flip_ranks, swap):
+    """Square mapping of one board symmetry (swap reflects in the a1-h8 diagonal)."""
+    mapping = []
+    for sq in range(64):
+        row, col = divmod(sq, 8)
+        if swap:
+            row, col = 7 - col, 7 - row
+        if flip_files:
+            col = 7 - col
+        if flip_ranks:
+            row = 7 - row
+        mapping.append(row * 8 + col)
+    return tuple(mapping)
+
+
+# The identity and the left-right mirror come first: all that pawns allow
+SYMMETRIES = tuple(
+    _symmetry(flip_files, flip_ranks, swap)
+    for swap in (False, True) for flip_ranks in (False, True) for flip_files in (False, True)
+)
+# Where the white king is brought, without pawns (a1-d1-d4) and with them (files a-d)
+PAWNLESS_REGION = tuple(sq for sq in range(64) if 7 - sq // 8 <= sq % 8 <= 3)
+PAWN_REGION = tuple(sq for sq in range(64) if sq % 8 <= 3)
+
+
+def _strength(side):
+    """Sort key deciding which side of a material set is the stronger."""
+    return sum(LETTER_VALUES[letter] for letter in side), [-ORDER.index(letter) for letter in side]
+
+
+def split_material(name):
+    """Split a material name such as "KQKR" into its White and Black parts."""
+    second = name.find("K", 1)
+    if not name.startswith("K") or second < 0:
+        raise ValueError(f"Bad material name {name!r}")
+    return name[:second], name[second:]
+
+
+def material_of(pieces):
+    """Return (canonical material name, flipped) for a list of piece codes.
+    
+    flipped is True when Black has the stronger side, so the position must
+    be mirrored (ranks reversed, colours swapped) to index the table.
+    """
+    white = "".join(sorted((LETTERS[code & 7] for code in pieces if not code & BLACK), key=ORDER.index))
+    black = "".join(sorted((LETTERS[code & 7] for code in pieces if code & BLACK), key=ORDER.index))
+    if _strength(black) > _strength(white):
+        return black + white, True
+    return white + black, False
+
+
+def check_material(name):
+    """Validate a material name and return it, raising ValueError if it is unusable."""
+    white, black = split_material(name)
+    if "K" in white[1:] + black[1:] or any(letter not in PIECES for letter in name):
+        raise ValueError(f"Bad material name {name!r}")
+    if len(name) > MAX_PIECES:
+        raise ValueError(f"{name}: at most {MAX_PIECES} pieces are supported")
+    if "".join(sorted(white, key=ORDER.index)) != white or "".join(sorted(black, key=ORDER.index)) != black:
+        raise ValueError(f"{name}: list pieces in the order {ORDER}")
+    if _strength(black) > _strength(white):
+        raise ValueError(f"{name}: name the stronger side first ({black + white})")
+    return name
+
+
+def table_pieces(name):
+    """Piece codes of a material set in index order: White's pieces, then Black's."""
+    white, black = split_material(name)
+    return tuple(PIECES[letter] | WHITE for letter in white) + tuple(PIECES[letter] | BLACK for letter in black)
+
+
+def dependencies(name):
+    """Material sets reachable from name by one capture or promotion that need a table."""
+    white, black = split_material(name)
+    found = set()
+    for side, other, own in ((white, black, True), (black, white, False)):
+        for i, letter in enumerate(side):
+            if letter == "K":
+                continue
+            rest = side[:i] + side[i + 1:]
+            children = [rest]  # This piece captured
+            if letter == "P":
+                children += [rest + promotion for promotion in "QRBN"]
+            for child in children:
+                child = "".join(sorted(child, key=ORDER.index))
+                pieces = [PIECES[l] | (WHITE if own else BLACK) for l in child]
+                pieces += [PIECES[l] | (BLACK if own else WHITE) for l in other]
+                material, _ = material_of(pieces)
+                if material not in DRAWN_MATERIAL:
+                    found.add(material)
+    return sorted(found)
+
+
+def table_path(directory, name):
+    """Return the file path of a material set's table."""
+    return os.path.join(directory, name + ".tb")
+
+
+class Layout:
+    """How the placements of one material set map to table indices.
+    
+    An index holds the side to move, the white king's slot in the region
+    and 6 bits for each other piece, in table_pieces order.  Placements
+    related by a symmetry share an index: the one of the symmetric image
+    with the lowest index, which only differs from the first match when
+    the king is on the a1-h8 diagonal.
+    """
+    
+    __slots__ = ("pieces", "region", "slots", "transforms", "size")
+    
+    def __init__(self, name):
+        self.pieces = table_pieces(name)
+        pawns = any(code & 7 == PAWN for code in self.pieces)
+        self.region = PAWN_REGION if pawns else PAWNLESS_REGION
+        symmetries = SYMMETRIES[:2] if pawns else SYMMETRIES
+        self.slots = [self.region.index(sq) if sq in self.region else -1 for sq in range(64)]
+        # transforms[king square]: the symmetries taking the white king into the region
+        self.transforms = tuple(
+            tuple(mapping for mapping in symmetries if mapping[king] in self.region) for king in range(64)
+        )
+        self.size = 2 * len(self.region) << 6 * (len(self.pieces) - 1)
+    
+    def index(self, squares, turn):
+        """Index of the squares of the pieces (in table_pieces order) with turn to move."""
+        best = None
+        for mapping in self.transforms[squares[0]]:
+            index = (turn >> 3) * len(self.region) + self.slots[mapping[squares[0]]]
+            for i in range(1, len(squares)):
+                index = index << 6 | mapping[squares[i]]
+            if best is None or index < best:
+                best = index
+        return best
+    
+    def decode(self, index):
+        """Return (squares in table_pieces order, turn) for an index."""
+        squares = [0] * len(self.pieces)
+        for i in range(len(squares) - 1, 0, -1):
+            squares[i] = index & 63
+            index >>= 6
+        side, slot = divmod(index, len(self.region))
+        squares[0] = self.region[slot]
+        return squares, side << 3
+
+
+class Tablebase:
+    """The values of one material set, indexed by placement and side to move."""
+    
+    __slots__ = ("name", "pieces", "layout", "values")
+    
+    def __init__(self, name, values):
+        self.name = name
+        self.layout = Layout(name)
+        self.pieces = self.layout.pieces
+        self.values = values
+    
+    @classmethod
+    def load(cls, path):
+        """Read a table file."""
+        with open(path, "rb") as handle:
+            magic, version, count, name = FILE_HEADER.unpack(handle.read(FILE_HEADER.size))
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"{path} is not a version {VERSION} tablebase")
+            name = name.rstrip(b"\0").decode("ascii")
+            values = array("h")
+            values.frombytes(handle.read())
+        if sys.byteorder == "big":
+            values.byteswap()
+        table = cls(name, values)
+        if len(table.pieces) != count or len(values) != table.layout.size:
+            raise ValueError(f"{path} is truncated")
+        return table
+    
+    def save(self, path):
+        """Write the table file."""
+        values = array("h", self.values)
+        if sys.byteorder == "big":
+            values.byteswap()
+        with open(path, "wb") as handle:
+            handle.write(FILE_HEADER.pack(MAGIC, VERSION, len(self.pieces), self.name.encode("ascii")))
+            handle.write(values.tobytes())
+    
+    def index(self, placed, turn, flipped=False):
+        """Index of a placement, given as (piece code, square) pairs, with turn to move."""
+        if flipped:
+            placed = [(code ^ BLACK, sq ^ 56) for code, sq in placed]
+            turn ^= BLACK
+        remaining = list(placed)
+        squares = []
+        for code in self.pieces:
+            for i, (found, sq) in enumerate(remaining):
+                if found == code:
+                    squares.append(sq)
+                    del remaining[i]
+                    break
+        return self.layout.index(squares, turn)
+    
+    def stats(self):
+        """Return a dict counting wins, losses and draws and the longest mate."""
+        wins = losses = longest = 0
+        for value in self.values:
+            if value > 0:
+                wins += 1
+                longest = max(longest, value - 1)
+            elif value < 0:
+                losses += 1
+        return {"entries": len(self.values), "wins": wins, "losses": losses,
+                "other": len(self.values) - wins - losses, "longest_mate_plies": longest}
+
+
+def _lookup(tables, placed, turn):
+    """Stored value for a placement from tables (a dict by material name).
+    
+    Drawn material gives 0 without a table; a missing table raises KeyError.
+    """
+    name, flipped = material_of([code for code, _ in placed])
+    if name in DRAWN_MATERIAL:
+        return 0
+    table = tables[name]
+    return table.values[table.index(placed, turn, flipped)]
+
+
+def decode(value):
+    """Turn a stored value into (wdl, plies): wdl is 1, 0 or -1 for the side to move."""
+    if value > 0:
+        return 1, value - 1
+    if value < 0:
+        return -1, -value - 1
+    return 0, 0
+
+
+_worker_tables = {}
+_layouts = {}
+
+
+def _init_worker(tables):
+    """Process pool initializer: keep the smaller tables a generation needs."""
+    _worker_tables.update(tables)
+
+
+def _layout(name):
+    """The Layout of a material set, built once per process."""
+    if name not in _layouts:
+        _layouts[name] = Layout(name)
+    return _layouts[name]
+
+
+def _generate_chunk(name, start, stop):
+    """Process pool task: expand the positions with indices in [start, stop).
+    
+    Returns arrays (status, distinct successors in the table, external win,
+    external loss depth, other external moves) covering the range; see
+    generate().
+    """
+    layout = _layout(name)
+    pieces = layout.pieces
+    count = len(pieces)
+    black_king = next(i for i, code in enumerate(pieces) if code == KING | BLACK)
+    position = Position()
+    squares = position.squares
+    status = array("b")
+    child_counts = array("H")
+    external_win = array("h")
+    external_loss = array("h")
+    external_other = array("H")
+    for index in range(start, stop):
+        placed_squares, turn = layout.decode(index)
+        kind = NORMAL
+        if len(set(placed_squares)) < count or layout.index(placed_squares, turn) != index:
+            kind = INVALID  # Two pieces on a square, or the symmetric twin of another index
+        else:
+            for code, sq in zip(pieces, placed_squares):
+                if code & 7 == PAWN and sq // 8 in (0, 7):
+                    kind = INVALID
+                    break
+        moves = ()
+        if kind != INVALID:
+            for code, sq in zip(pieces, placed_squares):
+                squares[sq] = code
+            position.kings = [placed_squares[0], placed_squares[black_king]]
+            position.turn = turn
+            if position.is_in_check(turn ^ BLACK):
+                kind = INVALID
+            else:
+                moves = position.generate_legal_moves(turn)
+                if not moves:
+                    kind = MATED if position.is_in_check(turn) else STALEMATE
+            for sq in placed_squares:
+                squares[sq] = 0
+        
+        win = 0
+        loss = 0
+        other = 0
+        internal = set()
+        for move in moves:
+            from_sq = move & 63
+            to_sq = move >> 6 & 63
+            promotion = move >> 12
+            mover = placed_squares.index(from_sq)
+            if promotion or to_sq in placed_squares:
+                placed = []
+                for j, (code, sq) in enumerate(zip(pieces, placed_squares)):
+                    if sq == to_sq:
+                        continue  # Captured
+                    if j == mover:
+                        placed.append((promotion | turn if promotion else code, to_sq))
+                    else:
+                        placed.append((code, sq))
+                value = _lookup(_worker_tables, placed, turn ^ BLACK)
+                if value < 0:
+                    win = -value if not win or -value < win else win
+                elif value > 0:
+                    loss = max(loss, value - 1)
+                else:
+                    other += 1
+            else:
+                child = list(placed_squares)
+                child[mover] = to_sq
+                internal.add(layout.index(child, turn ^ BLACK))
+        status.append(kind)
+        child_counts.append(len(internal))
+        external_win.append(win)
+        external_loss.append(loss)
+        external_other.append(other)
+    return status, child_counts, external_win, external_loss, external_other
+
+
+def _predecessors(name, indices):
+    """Process pool task: the table indices one quiet move away from each index.
+    
+    Un-moves are the mover's non-capturing moves played backwards, with
+    pawns stepping back; whether the predecessor is a legal position is
+    left to the caller.  Returns one flat array, without repeats for the
+    same index.
+    """
+    layout = _layout(name)
+    pieces = layout.pieces
+    found = array("i")
+    for index in indices:
+        placed_squares, turn = layout.decode(index)
+        mover = turn ^ BLACK  # The side that has just moved
+        occupied = set(placed_squares)
+        parents = set()
+        for j, code in enumerate(pieces):
+            if code & 8 != mover:
+                continue
+            sq = placed_squares[j]
+            kind = code & 7
+            if kind == PAWN:
+                back = 8 if mover == WHITE else -8
+                origin = sq + back
+                # A pawn never stands on its own back rank, so none stepped from it
+                if origin not in occupied and 1 <= origin // 8 <= 6:
+                    origins = [origin]
+                    if sq // 8 == (4 if mover == WHITE else 3) and origin + back not in occupied:
+                        origins.append(origin + back)
+                else:
+                    origins = []
+            elif kind == KNIGHT or kind == KING:
+                table = KNIGHT_TARGETS if kind == KNIGHT else KING_TARGETS
+                origins = [origin for origin in table[sq] if origin not in occupied]
+            else:
+                origins = []
+                for ray in SLIDER_RAYS[kind][sq]:
+                    for origin in ray:
+                        if origin in occupied:
+                            break
+                        origins.append(origin)
+            for origin in origins:
+                parent = list(placed_squares)
+                parent[j] = origin
+                parents.add(layout.index(parent, mover))
+        found.extend(parents)
+    return found
+
+
+def _all_predecessors(pool, jobs, name, indices):
+    """Predecessors of a batch of indices (see _predecessors), shared over the pool when large."""
+    if len(indices) < POOL_BATCH:
+        return _predecessors(name, indices)
+    chunk = -(-len(indices) // (jobs * 4))
+    found = array("i")
+    parts = [indices[low:low + chunk] for low in range(0, len(indices), chunk)]
+    for part in pool.map(_predecessors, [name] * len(parts), parts):
+        found.extend(part)
+    return found
+
+
+def generate(name, directory=".", jobs=None, out=None):
+    """Build the table for a material set, and any smaller tables it needs, into directory.
+    
+    Tables already present are reused.  Returns the Tablebase.
+    """
+    name = check_material(name)
+    subtables = {}
+    for child in dependencies(name):
+        path = table_path(directory, child)
+        subtables[child] = Tablebase.load(path) if os.path.exists(path) else generate(
+            child, directory, jobs, out
+        )
+    
+    start = time.perf_counter()
+    size = _layout(name).size
+    jobs = jobs or os.cpu_count() or 1
+    chunk = -(-size // (jobs * 8))
+    ranges = [(name, low, min(low + chunk, size)) for low in range(0, size, chunk)]
+    status = array("b")
+    remaining = array("H")
+    external_win = array("h")
+    external_loss = array("h")
+    external_other = array("H")
+    with ProcessPoolExecutor(jobs, initializer=_init_worker, initargs=(subtables,)) as pool:
+        for result in pool.map(_generate_chunk, *zip(*ranges)):
+            for total, part in zip((status, remaining, external_win, external_loss, external_other), result):
+                total.extend(part)
+        expanded = time.perf_counter()
+        
+        # Work back from the mates one ply at a time.  buckets[plies] holds
+        # index * 2 + 1 for positions won in that many plies, index * 2 for
+        # lost; remaining counts the moves not yet known to lose
+        values = array("h", [0]) * size
+        buckets = {}
+        for index in range(size):
+            remaining[index] += external_other[index]
+            if status[index] == MATED:
+                buckets.setdefault(0, []).append(index * 2)
+            elif status[index] == NORMAL:
+                if external_win[index]:
+                    buckets.setdefault(external_win[index], []).append(index * 2 + 1)
+                elif not remaining[index]:
+                    buckets.setdefault(external_loss[index] + 1, []).append(index * 2)
+        plies = 0
+        while buckets:
+            won = []
+            lost = []
+            for entry in buckets.pop(plies, ()):
+                index = entry >> 1
+                if values[index]:
+                    continue  # Already won faster
+                if entry & 1:
+                    values[index] = plies + 1
+                    won.append(index)
+                else:
+                    values[index] = -plies - 1
+                    lost.append(index)
+            # A move into a lost position wins; a position whose every move
+            # leads to a won one is lost, as late as its slowest defence,
+            # unless a capture or promotion already wins it
+            for parent in set(_all_predecessors(pool, jobs, name, lost)):
+                if not values[parent] and status[parent] == NORMAL:
+                    buckets.setdefault(plies + 1, []).append(parent * 2 + 1)
+            for parent, moves in Counter(_all_predecessors(pool, jobs, name, won)).items():
+                if values[parent] or status[parent] != NORMAL:
+                    continue
+                remaining[parent] -= moves
+                if not remaining[parent] and not external_win[parent]:
+                    longest = max(plies, external_loss[parent]) + 1
+                    buckets.setdefault(longest, []).append(parent * 2)
+            plies += 1
+    
+    table = Tablebase(name, values)
+    os.makedirs(directory, exist_ok=True)
+    table.save(table_path(directory, name))
+    if out is not None:
+        stats = table.stats()
+        print(f"{name}: {stats['wins']:,} won, {stats['losses']:,} lost, longest mate "
+              f"{stats['longest_mate_plies']} plies; moves {expanded - start:.1f}s, "
+              f"retrograde {time.perf_counter() - expanded:.1f}s, {jobs} processes", file=out)
+    return table
+
+
+class Tablebases:
+    """Probes positions against the tables in a directory, loading each on first use."""
+    
+    def __init__(self, directory="."):
+        self.directory = directory
+        self.tables = {}
+        self.probes = 0
+        self.hits = 0
+    
+    def table(self, name):
+        """Return the table for a material set, or None if there is no file for it."""
+        if name not in self.tables:
+            path = table_path(self.directory, name)
+            self.tables[name] = Tablebase.load(path) if os.path.exists(path) else None
+        return self.tables[name]
+    
+    def probe(self, position):
+        """Return (wdl, plies to mate) for the side to move, or None if no table covers position.
+        
+        wdl is 1 for a win, -1 for a loss and 0 for a draw.
+        """
+        squares = position.squares
+        if squares.count(0) < 64 - MAX_PIECES:
+            return None
+        self.probes += 1
+        placed = [(code, sq) for sq, code in enumerate(squares) if code]
+        name, flipped = material_of([code for code, _ in placed])
+        if name in DRAWN_MATERIAL:
+            self.hits += 1
+            return 0, 0
+        table = self.table(name)
+        if table is None:
+            return None
+        self.hits += 1
+        return decode(table.values[table.index(placed, position.turn, flipped)])
+
+
+def main(argv=None):
+    """Command-line entry point."""
+    parser = argparse.ArgumentParser(description="Generate and probe endgame tablebases.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    command = commands.add_parser("generate", help="build tables for material sets")
+    command.add_argument("material", nargs="+", help="material sets such as KQK KRK KPK")
+    command.add_argument("--dir", default="tablebases", help="table directory (default: tablebases)")
+    command.add_argument("--jobs", type=int, default=0, help="processes to use (default: one per core)")
+    command = commands.add_parser("probe", help="look a position up")
+    command.add_argument("--fen", required=True, help="position to probe")
+    command.add_argument("--dir", default="tablebases", help="table directory (default: tablebases)")
+    args = parser.parse_args(argv)
+    
+    if args.command == "generate":
+        for name in args.material:
+            generate(name, args.dir, args.jobs, out=sys.stdout)
+        return 0
+    
+    result = Tablebases(args.dir).probe(Position.from_fen(args.fen))
+    if result is None:
+        print("no table covers this position")
+        return 1
+    wdl, plies = result
+    print({1: f"win, mate in {plies} plies", -1: f"loss, mated in {plies} plies", 0: "draw"}[wdl])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
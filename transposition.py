@@ -0,0 +1,189 @@
+"""Bounded transposition table keyed by Position.key (a Zobrist hash).
+
+The table is generic: it maps a key to any value together with a depth,
+so the search can store scored results while other callers (repetition
+bookkeeping, move-list caching) store depth-0 entries in the same table.
+"""
+
+
+class TranspositionTable:
+    """Fixed-size hash table with two-way buckets.
+    
+    Each bucket has a depth-preferred slot, which is only overwritten by an
+    entry searched at least as deep or by any entry once the stored one is
+    from an older generation, and an always-replace slot that takes
+    everything else.  Memory use therefore never grows past ``2 * buckets``
+    entries.
+    """
+    
+    __slots__ = (
+        "mask", "keys", "depths", "ages", "values", "generation",
+        "probes", "hits", "stores", "replacements"
+    )
+    
+    def __init__(self, size_bits=16):
+        buckets = 1 << size_bits
+        self.mask = buckets - 1
+        self.keys = [None] * (2 * buckets)
+        self.depths = [0] * (2 * buckets)
+        self.ages = [0] * (2 * buckets)
+        self.values = [None] * (2 * buckets)
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.replacements = 0
+    
+    def __len__(self):
+        return len(self.keys) - self.keys.count(None)
+    
+    @property
+    def capacity(self):
+        """Maximum number of entries the table can hold."""
+        return len(self.keys)
+    
+    def new_generation(self):
+        """Age existing entries, e.g. at the start of a new search.
+        
+        Entries from older generations lose their claim on the
+        depth-preferred slot but can still be found until overwritten.
+        """
+        self.generation += 1
+    
+    def probe(self, key):
+        """Return the (depth, value) pair stored for key, or None."""
+        self.probes += 1
+        slot = (key & self.mask) << 1
+        keys = self.keys
+        if keys[slot] != key:
+            slot += 1
+            if keys[slot] != key:
+                return None
+        self.hits += 1
+        return self.depths[slot], self.values[slot]
+    
+    def get(self, key, default=None):
+        """Return the value stored for key, or default."""
+        entry = self.probe(key)
+        return default if entry is None else entry[1]
+    
+    def put(self, key, value, depth=0):
+        """Store value for key, following the bucket replacement policy."""
+        self.stores += 1
+        slot = (key & self.mask) << 1
+        keys = self.keys
+        if keys[slot] == key or keys[slot] is None:
+            pass
+        elif depth >= self.depths[slot] or self.ages[slot] != self.generation:
+            # The displaced entry gets a second life in the always-replace slot
+            if keys[slot + 1] is not None and keys[slot + 1] != keys[slot]:
+                self.replacements += 1
+            keys[slot + 1] = keys[slot]
+            self.depths[slot + 1] = self.depths[slot]
+            self.ages[slot + 1] = self.ages[slot]
+            self.values[slot + 1] = self.values[slot]
+        else:
+            slot += 1
+            if keys[slot] is not None and keys[slot] != key:
+                self.replacements += 1
+        keys[slot] = key
+        self.depths[slot] = depth
+        self.ages[slot] = self.generation
+        self.values[slot] = value
+    
+    def clear(self):
+        """Drop every entry and reset the statistics."""
+        self.__init__(self.mask.bit_length())
+    
+    @property
+    def hit_rate(self):
+        """Fraction of probes that found their key."""
+        return self.hits / self.probes if self.probes else 0.0
+    
+    def stats(self):
+        """Return a dict of usage statistics."""
+        return {
+            "entries": len(self),
+            "capacity": self.capacity,
+            "probes": self.probes,
+            "hits": self.hits,
+            "hit_rate": self.hit_rate,
+            "stores": self.stores,
+            "replacements": self.replacements,
+        }
+
+
+class MoveCache:
+    """Legal move lists per position, so one generation pass serves every query.
+    
+    Entries are keyed by Position.key and kept in a TranspositionTable, so a
+    position seen again (after a reset, or by repetition) is not regenerated
+    either.  The entry for the position most recently looked up is also
+    held directly; ``invalidate`` drops it when the game moves on.
+    """
+    
+    def __init__(self, size_bits=12):
+        self.table = TranspositionTable(size_bits)
+        self.current = None  # (key, entry) of the last position looked up
+        self.lookups = 0
+        self.generations = 0
+        self.invalidations = 0
+    
+    def entry(self, position):
+        """Return (moves_by_square, in_check) for the side to move in position.
+        
+        moves_by_square maps each from-square to its list of (row, col)
+        targets; a promotion counts once however many pieces it may become.
+        """
+        self.lookups += 1
+        key = position.key
+        current = self.current
+        if current is not None and current[0] == key:
+            return current[1]
+        entry = self.table.get(key)
+        if entry is None:
+            self.generations += 1
+            by_square = {}
+            for move in position.generate_legal_moves(position.turn):
+                targets = by_square.setdefault(move & 63, [])
+                target = divmod(move >> 6 & 63, 8)
+                if not targets or targets[-1] != target:
+                    targets.append(target)
+            entry = (by_square, position.is_in_check(position.turn))
+            self.table.put(key, entry)
+        self.current = (key, entry)
+        return entry
+    
+    def legal_moves(self, position, row, col):
+        """Cached equivalent of Position.get_legal_moves."""
+        piece = position.squares[row * 8 + col]
+        if not piece:
+            return []
+        if piece & 8 != position.turn:
+            return position.get_legal_moves(row, col)  # Only the side to move is cached
+        return list(self.entry(position)[0].get(row * 8 + col, ()))
+    
+    def status(self, position, color):
+        """Cached equivalent of Position.status."""
+        if color != position.turn:
+            return position.status(color)
+        by_square, in_check = self.entry(position)
+        if by_square:
+            # Draws depend on the game's history, which the cached entry doesn't cover
+            return position.draw_status() or ("check" if in_check else None)
+        return "checkmate" if in_check else "stalemate"
+    
+    def invalidate(self):
+        """Forget the current position, e.g. after a move or a reset."""
+        self.current = None
+        self.invalidations += 1
+    
+    def stats(self):
+        """Return a dict of counters showing how much work was reused."""
+        return {
+            "lookups": self.lookups,
+            "generations": self.generations,
+            "reused": self.lookups - self.generations,
+            "invalidations": self.invalidations,
+            "table": self.table.stats(),
+        }
@@ -0,0 +1,317 @@
+"""UCI (Universal Chess Interface) front-end for the built-in engine.
+
+Run with no arguments (or as "python chess_game.py uci") and talk UCI on
+stdin/stdout, so chess GUIs and match runners can drive the engine.
+Supported: uci, isready, ucinewgame, setoption (BookFile, Tablebases),
+position startpos|fen ... [moves ...], go [depth N] [movetime MS]
+[wtime MS btime MS winc MS binc MS movestogo N] [infinite], stop and quit.
+
+The position is kept between commands: when a "position" command repeats
+the previous one with more moves on the end, only the new moves are
+played (and moves taken back are unmade), instead of replaying the game
+from its start.  Searches run on their own thread, so "stop" (or "quit")
+is read and acted on while a search is running.
+
+The match subcommand plays two UCI engines (by default this one against
+itself) and reports results and throughput:
+    python uci.py match [--games N] [--movetime MS] [--engine CMD] [--opponent CMD]
+"""
+
+import argparse
+import shlex
+import subprocess
+import sys
+import threading
+import time
+
+from position import STARTING_FEN, WHITE, Position, move_name, parse_move
+from search import MATE, MATE_BOUND, Searcher
+
+ENGINE_NAME = "Python Chess"
+ENGINE_AUTHOR = "chess_game contributors"
+# Share of the remaining clock one move may use when the GUI gives no movestogo
+DEFAULT_MOVES_TO_GO = 30
+
+
+def uci_score(score):
+    """Return the UCI score text ("cp 35" or "mate -3") for a search score."""
+    if score > MATE_BOUND:
+        return f"mate {(MATE - score + 1) // 2}"
+    if score < -MATE_BOUND:
+        return f"mate -{(MATE + score + 1) // 2}"
+    return f"cp {score}"
+
+
+class UciEngine:
+    """Reads UCI commands and answers them, searching on a background thread."""
+    
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self.output_lock = threading.Lock()
+        self.searcher = Searcher()
+        self.base_fen = STARTING_FEN
+        self.position = Position.initial()
+        self.moves = []  # Moves played from base_fen to reach position
+        self.thread = None
+        self.stop_event = None  # Set to stop the running search
+        self.release = threading.Event()  # Lets an infinite search report its move
+    
+    def send(self, line):
+        """Write one line to the GUI."""
+        with self.output_lock:
+            self.out.write(line + "\n")
+            self.out.flush()
+    
+    def run(self, lines=sys.stdin):
+        """Answer commands until "quit" or the end of input."""
+        for line in lines:
+            if not self.handle(line):
+                break
+        self.stop()
+    
+    def handle(self, line):
+        """Act on one command line; return False for "quit"."""
+        words = line.split()
+        if not words:
+            return True
+        command = words[0]
+        if command == "uci":
+            self.send(f"id name {ENGINE_NAME}")
+            self.send(f"id author {ENGINE_AUTHOR}")
+            self.send("option name BookFile type string default <empty>")
+            self.send("option name Tablebases type string default <empty>")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.stop()
+            self.searcher.table.clear()
+        elif command == "setoption":
+            self.set_option(words[1:])
+        elif command == "position":
+            self.stop()
+            self.set_position(words[1:])
+        elif command == "go":
+            self.go(words[1:])
+        elif command == "stop":
+            self.stop()
+        elif command == "quit":
+            return False
+        else:
+            self.send(f"info string unknown command {command}")
+        return True
+    
+    def set_option(self, words):
+        """Handle "setoption name NAME [value VALUE]"."""
+        text = " ".join(words)
+        name, _, value = text.partition(" value ")
+        name = name.removeprefix("name ").strip().lower()
+        value = value.strip()
+        if value in ("", "<empty>"):
+            value = None
+        try:
+            if name == "bookfile":
+                from book import OpeningBook
+                self.searcher.book = OpeningBook(value) if value else None
+            elif name == "tablebases":
+                from tablebase import Tablebases
+                self.searcher.tablebases = Tablebases(value) if value else None
+            else:
+                self.send(f"info string unknown option {name}")
+        except (OSError, ValueError) as error:
+            self.send(f"info string {error}")
+    
+    def set_position(self, words):
+        """Handle "position startpos|fen FEN [moves ...]", reusing the current position."""
+        if "moves" in words:
+            split = words.index("moves")
+            words, names = words[:split], words[split + 1:]
+        else:
+            names = []
+        if words[:1] == ["startpos"]:
+            fen = STARTING_FEN
+        elif words[:1] == ["fen"]:
+            fen = " ".join(words[1:])
+        else:
+            self.send("info string expected startpos or fen")
+            return
+        try:
+            moves = [parse_move(name) for name in names]
+            if fen != self.base_fen:
+                position = Position.from_fen(fen)
+                self.base_fen, self.position, self.moves = fen, position, []
+        except ValueError as error:
+            self.send(f"info string {error}")
+            return
+        
+        # Keep the moves both games share, take back the rest and play the new ones
+        common = 0
+        while common < min(len(moves), len(self.moves)) and moves[common] == self.moves[common]:
+            common += 1
+        position = self.position
+        while len(self.moves) > common:
+            position.unmake_move()
+            self.moves.pop()
+        for move in moves[common:]:
+            if move not in position.generate_legal_moves(position.turn):
+                self.send(f"info string illegal move {move_name(move)}")
+                break
+            position.make_move(move)
+            self.moves.append(move)
+    
+    def go(self, words):
+        """Handle "go": start a search on a worker thread."""
+        self.stop()
+        options = {}
+        infinite = False
+        for i, word in enumerate(words):
+            if word == "infinite":
+                infinite = True
+            elif word in ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo"):
+                try:
+                    options[word] = int(words[i + 1])
+                except (IndexError, ValueError):
+                    self.send(f"info string bad value for {word}")
+                    return
+        position = self.position
+        time_limit = None
+        if "movetime" in options:
+            time_limit = options["movetime"] / 1000
+        elif not infinite:
+            white = position.turn == WHITE
+            remaining = options.get("wtime" if white else "btime")
+            if remaining is not None:
+                increment = options.get("winc" if white else "binc", 0)
+                budget = remaining / options.get("movestogo", DEFAULT_MOVES_TO_GO) + increment / 2
+                time_limit = max(0.01, min(budget, remaining / 2) / 1000)
+        depth = options.get("depth", 64)
+        self.release.clear()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(
+            target=self._search, args=(position.copy(), depth, time_limit, infinite, self.stop_event),
+            daemon=True
+        )
+        self.thread.start()
+    
+    def _search(self, position, depth, time_limit, infinite, stop_event):
+        result = self.searcher.search(position, depth, time_limit, self._info, stop_event)
+        if infinite:
+            self.release.wait()  # UCI: no bestmove until "stop" after "go infinite"
+        self.send(f"bestmove {move_name(result.move) if result.move is not None else '0000'}")
+    
+    def _info(self, result):
+        milliseconds = int(result.seconds * 1000)
+        pv = " ".join(move_name(move) for move in result.pv)
+        self.send(f"info depth {result.depth} score {uci_score(result.score)} nodes {result.nodes} "
+                  f"nps {int(result.nps)} time {milliseconds} pv {pv}")
+    
+    def stop(self):
+        """Stop a running search and wait until it has sent its bestmove."""
+        thread = self.thread
+        if thread is None:
+            return
+        self.release.set()
+        self.stop_event.set()  # Also holds for a search that has not started yet
+        thread.join()
+        self.thread = None
+
+
+class EngineProcess:
+    """A UCI engine run as a subprocess, for matches."""
+    
+    def __init__(self, command):
+        self.process = subprocess.Popen(
+            shlex.split(command), stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True, bufsize=1
+        )
+        self.send("uci")
+        self.wait_for("uciok")
+    
+    def send(self, line):
+        self.process.stdin.write(line + "\n")
+        self.process.stdin.flush()
+    
+    def wait_for(self, prefix):
+        """Read lines until one starts with prefix and return it."""
+        while True:
+            line = self.process.stdout.readline()
+            if not line:
+                raise RuntimeError("engine exited")
+            if line.startswith(prefix):
+                return line.strip()
+    
+    def best_move(self, moves, movetime):
+        """Search the start position plus moves for movetime ms and return the move."""
+        self.send("position startpos moves " + " ".join(moves) if moves else "position startpos")
+        self.send(f"go movetime {movetime}")
+        return self.wait_for("bestmove").split()[1]
+    
+    def close(self):
+        self.send("quit")
+        self.process.wait()
+
+
+def match(engine, opponent, games, movetime, max_plies=200, out=sys.stdout):
+    """Play games between two UCI engine commands, alternating colours; return the score."""
+    players = [EngineProcess(engine), EngineProcess(opponent)]
+    points = 0.0
+    results = {"1-0": 0, "0-1": 0, "1/2-1/2": 0}
+    plies = 0
+    start = time.perf_counter()
+    try:
+        for number in range(games):
+            white_player = number % 2  # The players swap colours every game
+            for player in players:
+                player.send("ucinewgame")
+            position = Position.initial()
+            moves = []
+            result = "1/2-1/2"
+            while len(moves) < max_plies:
+                player = players[white_player ^ (position.turn != WHITE)]
+                move = parse_move(player.best_move(moves, movetime))
+                if move not in position.generate_legal_moves(position.turn):
+                    result = "0-1" if position.turn == WHITE else "1-0"  # Illegal move loses
+                    break
+                position.make_move(move)
+                moves.append(move_name(move))
+                status = position.status(position.turn)
+                if status == "checkmate":
+                    result = "0-1" if position.turn == WHITE else "1-0"
+                    break
+                if status in ("stalemate", "repetition", "fifty-move"):
+                    break
+            results[result] += 1
+            white_points = {"1-0": 1.0, "0-1": 0.0}.get(result, 0.5)
+            points += white_points if white_player == 0 else 1 - white_points
+            plies += len(moves)
+    finally:
+        for player in players:
+            player.close()
+    seconds = time.perf_counter() - start
+    print(f"{games} games, {plies:,} moves in {seconds:.1f}s ({plies / seconds:,.1f} moves/s, "
+          f"{games / seconds * 60:,.1f} games/min)", file=out)
+    print(f"engine scored {points:g}/{games}  "
+          f"(White wins {results['1-0']}, Black wins {results['0-1']}, draws {results['1/2-1/2']})",
+          file=out)
+    return points
+
+
+def main(argv=None):
+    """Command-line entry point: the UCI loop, or the match runner."""
+    argv = sys.argv[1:] if argv is None else argv
+    if argv[:1] != ["match"]:
+        UciEngine().run()
+        return 0
+    this_engine = f"{shlex.quote(sys.executable)} {shlex.quote(__file__)}"
+    parser = argparse.ArgumentParser(description="Play UCI engines against each other.")
+    parser.add_argument("--games", type=int, default=10, help="games to play (default: 10)")
+    parser.add_argument("--movetime", type=int, default=100, help="milliseconds per move (default: 100)")
+    parser.add_argument("--max-plies", type=int, default=200, help="adjudicate a draw after this many")
+    parser.add_argument("--engine", default=this_engine, help="first engine command (default: this engine)")
+    parser.add_argument("--opponent", default=this_engine, help="second engine command (default: this engine)")
+    args = parser.parse_args(argv[1:])
+    match(args.engine, args.opponent, args.games, args.movetime, args.max_plies)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
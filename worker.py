@@ -0,0 +1,155 @@
+"""Background worker that keeps move computation off the Tk event thread.
+
+Jobs run one at a time on a daemon thread.  Finished results are handed
+back on the Tk thread: the worker polls its result queue with
+``root.after`` while jobs are outstanding and calls each job's callback
+from there, so callbacks may touch widgets freely.
+
+Jobs can carry a tag; submitting a new job with the same tag cancels the
+older one, which is how stale requests (a move list for a piece the user
+has since deselected) are dropped.  A cancelled job never has its
+callback called, and a job that is already running gets its ``on_cancel``
+hook invoked so it can stop early (the engine search uses this).
+
+InlineWorker has the same interface for code running without a Tk event
+loop: it runs each job, and its callback, before submit() returns.
+"""
+
+import queue
+import threading
+
+
+class Job:
+    """A unit of work submitted to a BackgroundWorker."""
+    
+    __slots__ = ("func", "args", "callback", "tag", "on_cancel", "cancelled")
+    
+    def __init__(self, func, args, callback, tag, on_cancel):
+        self.func = func
+        self.args = args
+        self.callback = callback
+        self.tag = tag
+        self.on_cancel = on_cancel
+        self.cancelled = False
+    
+    def cancel(self):
+        """Mark the job cancelled and ask it to stop if it is already running."""
+        if not self.cancelled:
+            self.cancelled = True
+            if self.on_cancel is not None:
+                self.on_cancel()
+
+
+class BackgroundWorker:
+    """Single-thread job runner that reports back through root.after."""
+    
+    def __init__(self, root, poll_interval=15):
+        self.root = root
+        self.poll_interval = poll_interval
+        self.jobs = queue.Queue()
+        self.results = queue.Queue()
+        self.tagged = {}
+        self.outstanding = 0
+        self.polling = False
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+    
+    def submit(self, func, *args, callback=None, tag=None, on_cancel=None):
+        """Queue func(*args) to run on the worker thread and return its Job.
+        
+        callback(result) is called on the Tk thread when it finishes.
+        Any earlier job with the same tag is cancelled first.
+        """
+        if tag is not None:
+            self.cancel(tag)
+        job = Job(func, args, callback, tag, on_cancel)
+        if tag is not None:
+            self.tagged[tag] = job
+        self.outstanding += 1
+        self.jobs.put(job)
+        if not self.polling:
+            self.polling = True
+            self.root.after(self.poll_interval, self._poll)
+        return job
+    
+    def cancel(self, tag):
+        """Cancel the most recent job submitted with tag, if any."""
+        job = self.tagged.pop(tag, None)
+        if job is not None:
+            job.cancel()
+    
+    def cancel_all(self):
+        """Cancel every tagged job."""
+        for tag in list(self.tagged):
+            self.cancel(tag)
+    
+    def busy(self, tag):
+        """Check whether a job with tag is still waiting or running."""
+        return tag in self.tagged
+    
+    def shutdown(self):
+        """Cancel outstanding work and let the worker thread exit."""
+        self.cancel_all()
+        self.jobs.put(None)
+    
+    def _run(self):
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            if job.cancelled:
+                self.results.put((job, None, None))
+                continue
+            try:
+                self.results.put((job, job.func(*job.args), None))
+            except Exception as error:  # Reported on the Tk thread below
+                self.results.put((job, None, error))
+    
+    def _poll(self):
+        errors = []
+        while True:
+            try:
+                job, result, error = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.outstanding -= 1
+            if self.tagged.get(job.tag) is job:
+                del self.tagged[job.tag]
+            if job.cancelled:
+                continue
+            if error is not None:
+                errors.append(error)
+            elif job.callback is not None:
+                job.callback(result)
+        if self.outstanding:
+            self.root.after(self.poll_interval, self._poll)
+        else:
+            self.polling = False
+        if errors:
+            # Let Tk report the failure without stopping the polling loop
+            raise errors[0]
+
+
+class InlineWorker:
+    """Drop-in for BackgroundWorker that runs every job at once on the calling thread."""
+    
+    def submit(self, func, *args, callback=None, tag=None, on_cancel=None):
+        """Run func(*args), pass the result to callback and return the finished Job."""
+        job = Job(func, args, callback, tag, on_cancel)
+        result = func(*args)
+        if callback is not None:
+            callback(result)
+        return job
+    
+    def cancel(self, tag):
+        """Nothing is ever pending, so there is nothing to cancel."""
+    
+    def cancel_all(self):
+        """Nothing is ever pending, so there is nothing to cancel."""
+    
+    def busy(self, tag):
+        """Jobs finish inside submit(), so none is ever outstanding."""
+        return False
+    
+    def shutdown(self):
+        """There is no thread to stop."""